@@ -0,0 +1,60 @@
+'''Decode/encode throughput of the JSON codec backends on HKV frames.
+
+    python benchmarks/bench_codec.py [-n 50000]
+'''
+import argparse
+
+from common import frame, timeit
+
+from hkv.codec import CODECS
+from hkv.framing import HKVFramer
+
+# outbound commands as sent by HKV._write
+COMMANDS = {
+    "get_temps": dict(SRC=99, DST=6915016, TYPE="T", TTYPE="G"),
+    "set_relais": dict(SRC=99, DST=6915016, TYPE="R", RTYPE="S", CHAN=3, VAL=1),
+    "set_period": dict(SRC=99, DST=-1, TYPE="T", TTYPE="P", DELAY=2000, PERIOD=30000),
+}
+
+
+def decode(codec, views):
+    loads = codec.loads
+    for view in views:
+        loads(view)
+
+
+def encode(codec, objs):
+    dumps = codec.dumps
+    for obj in objs:
+        dumps(obj)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-n", type=int, default=50000, help="Frames per run")
+    args = parser.parse_args()
+
+    codecs = []
+    for name, cls in CODECS.items():
+        try:
+            codecs.append(cls())
+        except ImportError:
+            print(f"{name}: not installed")
+
+    for kind in ("temp", "status"):
+        stream = "".join(frame(kind, cnt=i) + "\r\n" for i in range(args.n)).encode()
+        # frames as handed out by the framer (memoryview slices)
+        views = HKVFramer(max_size=len(stream)).feed(stream)
+        for codec in codecs:
+            t = timeit(decode, codec, views)
+            print(f"decode {kind:8s} {codec.name:7s} {args.n / t:10.0f} frames/s {len(stream) / t / 1e6:7.1f} MB/s")
+
+    for kind, cmd in COMMANDS.items():
+        objs = [dict(cmd) for _ in range(args.n)]
+        for codec in codecs:
+            t = timeit(encode, codec, objs)
+            print(f"encode {kind:10s} {codec.name:7s} {args.n / t:10.0f} frames/s  {codec.dumps(cmd)!r}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+'''Throughput of the HKV frame scanner vs. the former string splitting loop.
+
+    python benchmarks/bench_framing.py [--size-mb 8] [--file capture.bin]
+'''
+import argparse
+import json
+
+from common import chunks, load_stream, make_stream, timeit
+
+from hkv.framing import HKVFramer
+
+
+def legacy_split(chunks_, decode=False):
+    """The receive loop of HKV.recv before the framer (str buffer + split)."""
+    buffer = ""
+    n = 0
+    for data in chunks_:
+        buffer += data.decode("utf-8", errors="ignore")
+        while "}\r\n" in buffer:
+            raw_line, buffer = buffer.split("}\r\n", 1)
+            line = (raw_line + "}").strip()
+            if not line or not line.startswith("{"):
+                continue
+            if decode:
+                json.loads(line)
+            n += 1
+    return n
+
+
+def framer_scan(chunks_, decode=False):
+    framer = HKVFramer()
+    n = 0
+    for data in chunks_:
+        for frame in framer.feed(data):
+            if decode:
+                json.loads(str(frame, "utf-8"))
+            n += 1
+    return n
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--size-mb", type=float, default=8, help="Size of the synthetic stream")
+    parser.add_argument("--file", default=None, help="Raw serial capture to use instead")
+    parser.add_argument("--chunk", type=int, nargs="+", default=[256, 1024, 4096, 65536], help="Read sizes")
+    args = parser.parse_args()
+
+    stream = load_stream(args.file) if args.file else make_stream(int(args.size_mb * 1024 * 1024))
+    mb = len(stream) / 1024 / 1024
+    print(f"stream: {mb:.1f} MB, {legacy_split(chunks(stream))} frames (legacy) / "
+          f"{framer_scan(chunks(stream))} frames (framer)")
+
+    # a burst after a LoRa backlog arrives in large reads: the legacy loop degrades with the buffer size
+    for size in args.chunk:
+        chunks_ = chunks(stream, size)
+        for decode in (False, True):
+            t_old = timeit(legacy_split, chunks_, decode)
+            t_new = timeit(framer_scan, chunks_, decode)
+            label = f"{size:6d} B {'split+json' if decode else 'split'}"
+            print(f"{label:20s} legacy: {mb / t_old:8.1f} MB/s   framer: {mb / t_new:8.1f} MB/s   "
+                  f"speedup: {t_old / t_new:.2f}x")
+
+if __name__ == "__main__":
+    main()
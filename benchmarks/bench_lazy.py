@@ -0,0 +1,60 @@
+'''CPU per frame with and without lazy (header only) decoding on a chatty mesh.
+
+    python benchmarks/bench_lazy.py [-n 50000]
+'''
+import argparse
+import asyncio
+import random
+
+from common import NODES, chunks, frame, timeit
+
+from hkv.codec import get_codec
+from hkv.hkv import HKV
+from hkv.packets import HKVTempDataPacket
+
+
+def make_chatty_stream(n: int, seed: int = 1) -> bytes:
+    """Debug log frames and relais pushes nobody subscribed to, some temps that are handled."""
+    rnd = random.Random(seed)
+    kinds = ["log"] * 5 + ["relais"] * 3 + ["temp"] * 2
+    return "".join(frame(rnd.choice(kinds), src=rnd.choice(NODES), cnt=i) + "\r\n" for i in range(n)).encode()
+
+
+async def run(lazy: bool, codec: str, chunks_):
+    hkv = HKV(lazy=lazy, codec=codec)
+
+    async def handler(packet):
+        pass
+
+    hkv.register_packet_handler(handler, HKVTempDataPacket)
+
+    def feed():
+        for data in chunks_:
+            hkv._data_received(data)
+        hkv._packets.clear()
+
+    t = timeit(feed)
+    await asyncio.sleep(0)  # let the handler tasks finish
+    return t
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-n", type=int, default=50000, help="Frames")
+    parser.add_argument("--codec", nargs="+", default=["json", "orjson"], help="JSON codecs")
+    args = parser.parse_args()
+
+    chunks_ = chunks(make_chatty_stream(args.n), 1024)
+    for codec in args.codec:
+        t_eager = asyncio.run(run(False, codec, chunks_))
+        if not get_codec(codec).peek_header:
+            # HKV turns lazy off: the codec parses a frame faster than the header regex
+            print(f"{codec:7s} eager: {t_eager / args.n * 1e6:6.2f} us/frame   lazy: off (no header peek)")
+            continue
+        t_lazy = asyncio.run(run(True, codec, chunks_))
+        print(f"{codec:7s} eager: {t_eager / args.n * 1e6:6.2f} us/frame   lazy: {t_lazy / args.n * 1e6:6.2f} us/frame   "
+              f"speedup: {t_eager / t_lazy:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,157 @@
+'''Packets per second and bytes per packet: table-driven slotted packets vs. the former dataclasses.
+
+    python benchmarks/bench_packets.py [-n 20000]
+'''
+import argparse
+import json
+import tracemalloc
+from dataclasses import InitVar, dataclass, field, fields
+
+from common import SAMPLE_FRAMES, frame, timeit
+
+from hkv.packets import HKVPacket
+
+
+# --- former implementation (if/elif dispatch, fields() + dict copy per packet) ---
+@dataclass
+class LegacyPacket():
+    data: InitVar[dict]
+    SRC: int = field(init=False)
+    DST: int = field(init=False)
+    TYPE: str = field(init=False)
+    EXTRA_DATA: dict = field(init=False)
+
+    def __post_init__(self, data):
+        self.EXTRA_DATA = data.copy()
+        for f in fields(self):
+            if f.name in data:
+                setattr(self, f.name, data[f.name])
+                self.EXTRA_DATA.pop(f.name)
+
+    @classmethod
+    def from_data(cls, data):
+        if data['TYPE'] in ('L', 'A', 'N', 'H'):
+            return LEGACY_SIMPLE[data['TYPE']](data)
+        elif data['TYPE'] == 'D' and data.get('DTYPE') in ['T', 'R', 'S', 'C']:
+            return LegacyDataPacket.from_data(data)
+        elif data['TYPE'] == 'R' and data.get('RTYPE') == 'A':
+            return LegacyRelaisChannelPacket(data)
+        elif data['TYPE'] == 'T' and data.get('TTYPE') == 'A':
+            return LegacyTempChannelPacket(data)
+        return cls(data)
+
+
+@dataclass
+class LegacyAckPacket(LegacyPacket):
+    pass
+
+
+@dataclass
+class LegacyHelloPacket(LegacyPacket):
+    HTYPE: str = field(init=False)
+
+
+@dataclass
+class LegacyLogPacket(LegacyPacket):
+    LTYPE: str = field(init=False)
+    MSG: str = field(init=False)
+
+
+@dataclass
+class LegacyChannelPacket(LegacyPacket):
+    CHAN: int = field(init=False)
+    VAL: float = field(init=False)
+
+
+@dataclass
+class LegacyTempChannelPacket(LegacyChannelPacket):
+    TTYPE: str = field(init=False)
+    MCNT: int = field(init=False)
+
+
+@dataclass
+class LegacyRelaisChannelPacket(LegacyChannelPacket):
+    RTYPE: str = field(init=False)
+
+
+@dataclass
+class LegacyDataPacket(LegacyPacket):
+    DTYPE: str = field(init=False)
+
+    @classmethod
+    def from_data(cls, data):
+        if data['DTYPE'] == 'S':
+            return LegacyStatusDataPacket(data)
+        elif data['DTYPE'] == 'T':
+            return LegacyTempDataPacket(data)
+        elif data['DTYPE'] == 'R':
+            return LegacyRelaisDataPacket(data)
+        elif data['DTYPE'] == 'C':
+            return LegacyConnectionDataPacket(data)
+        return cls(data)
+
+
+@dataclass
+class LegacyTempDataPacket(LegacyDataPacket):
+    MCNT: int = field(init=False, default=0)
+    SNUM: int = field(init=False, default=0)
+    TDATA: list = field(init=False, default_factory=list)
+
+
+@dataclass
+class LegacyRelaisDataPacket(LegacyDataPacket):
+    RNUM: int = field(init=False, default=0)
+    RDATA: list = field(init=False, default_factory=list)
+
+
+@dataclass
+class LegacyConnectionDataPacket(LegacyDataPacket):
+    CCNT: int = field(init=False, default=0)
+    CDATA: list = field(init=False, default_factory=list)
+
+
+@dataclass
+class LegacyStatusDataPacket(LegacyDataPacket):
+    ID: str = field(init=False, default=None)
+    MSEC: int = field(init=False, default=None)
+    SNUM: int = field(init=False, default=None)
+    MCNT: int = field(init=False, default=None)
+    RNUM: int = field(init=False, default=None)
+    CCNT: int = field(init=False, default=None)
+
+
+LEGACY_SIMPLE = {'L': LegacyLogPacket, 'A': LegacyAckPacket, 'N': LegacyAckPacket, 'H': LegacyHelloPacket}
+
+
+def decode_all(from_data, docs):
+    for data in docs:
+        from_data(data)
+
+
+def bytes_per_packet(from_data, docs):
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    keep = [from_data(data) for data in docs]
+    used = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    return used / len(keep)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-n", type=int, default=20000, help="Packets per type")
+    args = parser.parse_args()
+
+    print(f"{'type':15s} {'legacy pkt/s':>13s} {'new pkt/s':>13s} {'speedup':>8s} {'legacy B/pkt':>13s} {'new B/pkt':>10s}")
+    for kind in SAMPLE_FRAMES:
+        # decoded dicts: measure packet construction, not JSON parsing
+        docs = [json.loads(frame(kind, cnt=i)) for i in range(args.n)]
+        t_old = timeit(decode_all, LegacyPacket.from_data, docs)
+        t_new = timeit(decode_all, HKVPacket.from_data, docs)
+        b_old = bytes_per_packet(LegacyPacket.from_data, docs)
+        b_new = bytes_per_packet(HKVPacket.from_data, docs)
+        print(f"{kind:15s} {args.n / t_old:13.0f} {args.n / t_new:13.0f} {t_old / t_new:7.2f}x {b_old:13.0f} {b_new:10.0f}")
+
+
+if __name__ == "__main__":
+    main()
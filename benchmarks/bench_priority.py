@@ -0,0 +1,99 @@
+'''Relay toggle latency under polling load, with and without priority classes.
+
+    python benchmarks/bench_priority.py [-n 50] [--workers 0 4 16 32] [--seeds 1 2 3] [--toggles 20]
+
+A simulated mesh is polled by ``--workers`` concurrent get_temps loops while
+relays are toggled, once per load level and seed. The latencies of all seeds
+of a level are pooled. Also shows how many frames the outbox batched per
+write and how many superseded toggles were coalesced (first seed).
+
+The priority window only reorders requests that wait for a free slot: with
+fewer polling loops than ``--inflight`` nothing waits and both orders are
+the same, the gain shows once the window is saturated.
+'''
+import argparse
+import asyncio
+import random
+import statistics
+import time
+
+import common  # noqa: F401  (sys.path)
+
+from hkv.hkv import HKV
+from hkv.simulator import HKVSimulator
+
+
+async def run(args, prioritize: bool, workers: int, seed: int):
+    sim = HKVSimulator(HKVSimulator.make_nodes(args.nodes), latency=(0.05, 0.3), push=False, seed=seed)
+    hkv = HKV(max_inflight=args.inflight, max_inflight_per_node=1)
+    hkv.prioritize = prioritize
+    sim.attach(hkv)
+    await hkv.connect(port="sim")
+    addrs = list(sim.nodes)
+    rnd = random.Random(seed)
+    stop = False
+
+    async def poll():
+        while not stop:
+            await hkv.get_temps(dst=rnd.choice(addrs), timeout=2)
+
+    tasks = [asyncio.create_task(poll()) for _ in range(workers)]
+    await asyncio.sleep(1)  # load is up
+
+    latencies = []
+    for i in range(args.toggles):
+        dst = rnd.choice(addrs)
+        t0 = time.perf_counter()
+        res = await hkv.set_relais((1, i % 2), dst=dst, timeout=5)
+        if res[0][0]:
+            latencies.append(time.perf_counter() - t0)
+        await asyncio.sleep(0.1)
+
+    # burst: superseded toggles of one relay while its node is busy
+    dst = addrs[0]
+    await asyncio.gather(*[hkv.set_relais((2, i % 2), dst=dst, timeout=5) for i in range(10)])
+
+    stop = True
+    await asyncio.gather(*tasks)
+    stats = hkv.write_stats()
+    await hkv.disconnect()
+    return latencies, stats, sim.nodes[dst].relais[1]
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))] if values else float('nan')
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-n", "--nodes", type=int, default=50)
+    parser.add_argument("--workers", type=int, nargs="+", default=[0, 4, 16, 32],
+                        help="Load levels: concurrent polling loops")
+    parser.add_argument("--seeds", type=int, nargs="+", default=[1, 2, 3])
+    parser.add_argument("--toggles", type=int, default=20, help="Toggles per run")
+    parser.add_argument("--inflight", type=int, default=4)
+    args = parser.parse_args()
+
+    for workers in args.workers:
+        p50 = {}
+        for prioritize in (False, True):
+            latencies = []
+            for seed in args.seeds:
+                lat, stats, last = asyncio.run(run(args, prioritize, workers, seed))
+                latencies += lat
+                if seed == args.seeds[0]:
+                    first = stats, last
+            name = "priority" if prioritize else "fifo"
+            p50[name] = statistics.median(latencies) if latencies else float('nan')
+            stats, last = first
+            print(f"{workers:3d} loops {name:9s} toggle latency p50 {p50[name] * 1000:7.1f} ms"
+                  f"  p90 {percentile(latencies, .9) * 1000:7.1f} ms"
+                  f"  ({len(latencies)}/{args.toggles * len(args.seeds)} acked)"
+                  f"  {stats['frames']} frames in {stats['writes']} writes, {stats['coalesced']} coalesced,"
+                  f" burst end value {last}")
+        print(f"{workers:3d} loops fifo/priority p50 {p50['fifo'] / p50['priority']:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+'''Replay a serial capture through HKV: decode, dispatch and the node state merge of the coordinator.
+
+    python benchmarks/bench_replay.py [capture.hkvcap] [--speed 0] [--nodes 50 --duration 20]
+
+Without a capture file one is recorded from the simulator first (``--nodes``
+nodes pushing every second for ``--duration`` seconds, with some garbled frames).
+'''
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+
+import common  # noqa: F401  (sys.path)
+
+from hkv.capture import HKVReplay, read_capture
+from hkv.hkv import HKV
+from hkv.packets import HKVRelaisDataPacket, HKVStatusDataPacket, HKVTempDataPacket
+from hkv.simulator import HKVSimulator
+from state import HKVNodeState
+
+
+async def record(path: str, nodes: int, duration: float):
+    sim = HKVSimulator(HKVSimulator.make_nodes(nodes, push=1.0), latency=(0.01, 0.05), garble=0.005, seed=1)
+    hkv = HKV()
+    sim.attach(hkv)
+    await hkv.connect(port="sim")
+    hkv.start_capture(path)
+    await hkv.get_status(dst=-1, collect=True, timeout=1)
+    await asyncio.sleep(duration)
+    await hkv.disconnect()
+    sim.close()
+
+
+async def replay(path: str, speed: float):
+    hkv = HKV()
+    states = {}
+    changed = 0
+
+    # same work as HKVCoordinator._handle_data_packet
+    async def handle(packet):
+        nonlocal changed
+        state = states.get(packet.SRC)
+        if state is None:
+            state = states[packet.SRC] = HKVNodeState(packet.SRC)
+        changed += len(state.apply_packet(packet))
+
+    for cls in (HKVTempDataPacket, HKVRelaisDataPacket, HKVStatusDataPacket):
+        hkv.register_packet_handler(handle, cls, maxsize=100000)
+
+    r = HKVReplay(path, speed=speed)
+    r.attach(hkv)
+    t0 = time.perf_counter()
+    c0 = time.process_time()
+    await hkv.connect(port="replay")
+    await r.done
+    while any(sub['depth'] for sub in hkv.handler_stats()):
+        await asyncio.sleep(0)  # drain the handler queues
+    wall, cpu = time.perf_counter() - t0, time.process_time() - c0
+    await hkv.disconnect()
+    return r, hkv._framer, states, changed, wall, cpu
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("capture", nargs="?", help="Capture file (HKV.start_capture)")
+    parser.add_argument("--speed", type=float, default=0.0, help="1 recorded speed, 0 as fast as possible")
+    parser.add_argument("--nodes", type=int, default=50)
+    parser.add_argument("--duration", type=float, default=20.0)
+    args = parser.parse_args()
+
+    path = args.capture
+    if path is None:
+        path = os.path.join(tempfile.mkdtemp(), "sim.hkvcap")
+        asyncio.run(record(path, args.nodes, args.duration))
+    start, records = read_capture(path)
+    span = records[-1][0] - records[0][0] if records else 0
+    print(f"capture         {path}: {len(records)} records, {span:.1f} s, {os.path.getsize(path)} bytes")
+
+    r, framer, states, changed, wall, cpu = asyncio.run(replay(path, args.speed))
+    print(f"replayed        {r.fed} chunks -> {framer.frames} frames, {len(states)} nodes, {changed} changed keys")
+    print(f"time            wall {wall:.3f} s, cpu {cpu:.3f} s ({span / wall if wall else 0:.0f}x real time)")
+    print(f"per frame       {cpu / max(framer.frames, 1) * 1e6:.1f} us cpu")
+
+
+if __name__ == "__main__":
+    main()
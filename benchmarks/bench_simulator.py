@@ -0,0 +1,157 @@
+'''Load test of HKVHub and HKVCoordinator against the in-process mesh simulator.
+
+Sweep time, push-to-state latency and CPU per received frame for N nodes:
+
+    python benchmarks/bench_simulator.py [-n 200] [--sweeps 3] [--loss 0.02] [--garble 0.01] [--case both]
+
+``hub`` runs ``HKVHub.fetch_data`` with a plain node state merge per push,
+``coordinator`` runs the real path: ``HKVCoordinator.async_update_data`` for
+the sweeps and ``_handle_data_packet`` for the pushes (Home Assistant core
+without entities, the latency is taken in a key listener).
+
+Needs Home Assistant installed (the hub is part of the integration).
+'''
+import argparse
+import asyncio
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from custom_components.hkv.hkv.packets import HKVTempDataPacket  # noqa: E402
+from custom_components.hkv.hkv.simulator import HKVSimulator  # noqa: E402
+from custom_components.hkv.hub import HKVHub  # noqa: E402
+from custom_components.hkv.state import HKVNodeState  # noqa: E402
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))] if values else float('nan')
+
+
+def make_sim(args) -> HKVSimulator:
+    return HKVSimulator(
+        HKVSimulator.make_nodes(args.n, push=args.push),
+        latency=(args.latency_min, args.latency_max),
+        loss=args.loss, duplicate=args.duplicate, garble=args.garble, seed=1,
+    )
+
+
+async def run_hub(args):
+    sim = make_sim(args)
+    hub = HKVHub("sim", 115200, max_inflight=args.inflight)
+    sim.attach(hub.hkv)
+    loop = asyncio.get_running_loop()
+
+    # push-to-state: time from the push leaving the node to the merged node state
+    states = {}
+    latencies = []
+
+    async def on_temps(packet):
+        state = states.get(packet.SRC)
+        if state is None:
+            state = states[packet.SRC] = HKVNodeState(packet.SRC)
+        state.apply_packet(packet)
+        sent = sim.pushed.pop((packet.SRC, packet.MCNT), None)
+        if sent is not None:
+            latencies.append(loop.time() - sent)
+
+    hub.hkv.register_packet_handler(on_temps, HKVTempDataPacket, maxsize=4 * args.n)
+
+    cpu0 = time.process_time()
+    await hub.connect()
+    sweeps = []
+    for _ in range(args.sweeps):
+        t0 = time.perf_counter()
+        data = await hub.fetch_data(None)
+        sweeps.append(time.perf_counter() - t0)
+        stale = sum(1 for dev in data["devices"].values() if dev.STALE)
+        print(f"sweep {len(sweeps)}: {sweeps[-1]:6.2f} s, {len(data['devices'])} nodes, {stale} stale")
+    await asyncio.sleep(args.settle)
+    cpu = time.process_time() - cpu0
+    await hub.hkv.disconnect()
+    sim.close()
+    report("hub", args, hub.hkv, sim, sweeps, latencies, cpu)
+
+
+async def run_coordinator(args):
+    try:
+        import homeassistant.core as ha
+        from custom_components.hkv.coordinator import HKVCoordinator
+    except ImportError as e:
+        print(f"skipping the coordinator case: {e}")
+        return
+
+    hass = ha.HomeAssistant(tempfile.mkdtemp())
+    sim = make_sim(args)
+    loop = asyncio.get_running_loop()
+    cpu0 = time.process_time()
+    # the coordinator connects in a task, the simulator is attached before it runs
+    coordinator = HKVCoordinator(hass, "sim", 115200, 1.0, 60, max_inflight=args.inflight)
+    sim.attach(coordinator.hkv)
+
+    latencies = []
+
+    def listener(addr):
+        def on_change():
+            state = coordinator.data["devices"][addr]
+            sent = sim.pushed.pop((addr, state.MCNT), None)
+            if sent is not None:
+                latencies.append(loop.time() - sent)
+        return on_change
+
+    # the pushed MCNT changes with every measurement, pushes during the sweeps count as well
+    removers = [coordinator.async_add_key_listener(addr, "MCNT", listener(addr)) for addr in sim.nodes]
+    sweeps = []
+    for _ in range(args.sweeps):
+        t0 = time.perf_counter()
+        data = await coordinator.async_update_data()
+        sweeps.append(time.perf_counter() - t0)
+        stale = sum(1 for dev in data["devices"].values() if dev.STALE)
+        print(f"sweep {len(sweeps)}: {sweeps[-1]:6.2f} s, {len(data['devices'])} nodes, {stale} stale")
+    await asyncio.sleep(args.settle)
+    cpu = time.process_time() - cpu0
+    for remove in removers:
+        remove()
+    await coordinator.hkv.disconnect()
+    sim.close()
+    await hass.async_stop(force=True)
+    report("coordinator", args, coordinator.hkv, sim, sweeps, latencies, cpu)
+
+
+def report(case, args, hkv, sim, sweeps, latencies, cpu):
+    frames = hkv._framer.frames
+    print(f"--- {case}")
+    print(f"nodes             {args.n}")
+    print(f"sweep time        first {sweeps[0]:.2f} s, steady {statistics.median(sweeps[1:] or sweeps):.2f} s")
+    print(f"push-to-state     n={len(latencies)} p50 {percentile(latencies, .5) * 1000:.1f} ms"
+          f"  p99 {percentile(latencies, .99) * 1000:.1f} ms")
+    print(f"frames rx         {frames} (ignored {hkv._framer.ignored}), sim {sim.stats}")
+    print(f"cpu per frame     {cpu / max(frames, 1) * 1e6:.1f} us ({cpu:.2f} s cpu total)")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-n", type=int, default=200, help="Simulated nodes")
+    parser.add_argument("--sweeps", type=int, default=3)
+    parser.add_argument("--push", type=float, default=30.0, help="Temperature push period of the nodes (s)")
+    parser.add_argument("--latency-min", type=float, default=0.05)
+    parser.add_argument("--latency-max", type=float, default=0.3)
+    parser.add_argument("--loss", type=float, default=0.0)
+    parser.add_argument("--duplicate", type=float, default=0.0)
+    parser.add_argument("--garble", type=float, default=0.0)
+    parser.add_argument("--inflight", type=int, default=4)
+    parser.add_argument("--settle", type=float, default=5.0, help="Seconds of pushes only after the sweeps")
+    parser.add_argument("--case", choices=("hub", "coordinator", "both"), default="both")
+    args = parser.parse_args()
+    if args.case in ("hub", "both"):
+        asyncio.run(run_hub(args))
+    if args.case in ("coordinator", "both"):
+        asyncio.run(run_coordinator(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+'''Bytes per node and entity value reads: HKVNodeState vs. the former OrderedDict per node.
+
+    python benchmarks/bench_state.py [-n 2000] [--reads 200000]
+'''
+import argparse
+import tracemalloc
+from collections import OrderedDict
+
+from common import NODES, frame, timeit
+
+from hkv.packets import HKVPacket
+from state import HKVNodeState, accessor
+
+PACKETS = [HKVPacket.from_doc(frame(kind)) for kind in ("status", "temp", "relais")]
+
+
+# --- former implementation (defaultdevdata() of the hub + asdict() merge) ---
+def legacy_node():
+    dev = OrderedDict(
+        ID='UNKNOWN',
+        SNUM=0,
+        MCNT=0,
+        RNUM=0,
+        CCNT=0,
+        **{f"Temp{i+1}": 0.0 for i in range(14)},
+        **{f"Relais{i+1}": False for i in range(6)},
+        temp_transmit_interval=30000,
+        temp_measure_interval=30000,
+        STALE=True,
+    )
+    status, temps, relais = PACKETS
+    for name in ('ID', 'MSEC', 'SNUM', 'MCNT', 'RNUM', 'CCNT'):
+        dev[name] = getattr(status, name)
+    dev['TDATA'] = list(temps.TDATA)
+    for i, temp in enumerate(dev['TDATA']):
+        dev[f"Temp{i+1}"] = temp if temp else None
+    dev['RDATA'] = list(relais.RDATA)
+    for i, rel in enumerate(dev['RDATA']):
+        dev[f"Relais{i+1}"] = rel
+    dev['STALE'] = False
+    return dev
+
+
+def legacy_value_fn(data, slave, key):
+    return data['devices'][slave][key.split('_')[0]][int(key.split('_')[1])]
+
+
+def new_node():
+    state = HKVNodeState()
+    for pck in PACKETS:
+        state.apply_packet(pck)
+    state.temp_measure_interval = state.temp_transmit_interval = 30000
+    state.STALE = False
+    return state
+
+
+def bytes_per_node(make, n):
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    keep = [make() for _ in range(n)]
+    used = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    return used / len(keep)
+
+
+def read_legacy(data, keys, reads):
+    value_fn = legacy_value_fn
+    for i in range(reads):
+        slave, key = keys[i % len(keys)]
+        value_fn(data, slave, key)
+
+
+def read_new(getters, reads):
+    for i in range(reads):
+        getters[i % len(getters)]()
+
+
+def bind(devices, slave, key):
+    # same closure as HKVCoordinator.value_accessor
+    get = accessor(key)
+
+    def value():
+        state = devices.get(slave)
+        return None if state is None else get(state)
+    return value
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-n", type=int, default=2000, help="Nodes for the memory measurement")
+    parser.add_argument("--reads", type=int, default=200000, help="Entity value reads")
+    args = parser.parse_args()
+
+    b_old = bytes_per_node(legacy_node, args.n)
+    b_new = bytes_per_node(new_node, args.n)
+    print(f"bytes/node      legacy {b_old:8.0f}   new {b_new:8.0f}   {b_old / b_new:5.2f}x smaller")
+
+    keys = [(slave, f"TDATA_{i}") for slave in NODES for i in range(14)] + \
+           [(slave, f"RDATA_{i}") for slave in NODES for i in range(6)]
+    legacy = {"devices": {slave: legacy_node() for slave in NODES}}
+    devices = {slave: new_node() for slave in NODES}
+    getters = [bind(devices, slave, key) for slave, key in keys]
+    assert [legacy_value_fn(legacy, s, k) for s, k in keys] == [g() for g in getters]
+
+    t_old = timeit(read_legacy, legacy, keys, args.reads)
+    t_new = timeit(read_new, getters, args.reads)
+    print(f"reads/s         legacy {args.reads / t_old:8.0f}   new {args.reads / t_new:8.0f}   {t_old / t_new:5.2f}x faster")
+
+
+if __name__ == "__main__":
+    main()
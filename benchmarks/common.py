@@ -0,0 +1,70 @@
+'''Shared helpers for the HKV benchmarks.'''
+import random
+import sys
+import time
+from pathlib import Path
+
+# make the ``hkv`` protocol package importable without Home Assistant
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "custom_components" / "hkv"))
+
+SAMPLE_FRAMES = {
+    "temp": '{"SRC":%(src)d,"DST":99,"TYPE":"D","DTYPE":"T","ID":"HKV-EG","MCNT":%(cnt)d,"SNUM":14,'
+            '"TDATA":[21.5,21.56,22.0,35.25,34.87,19.62,0,0,20.12,20.06,45.5,44.94,18.75,18.81]}',
+    "relais": '{"SRC":%(src)d,"DST":99,"TYPE":"D","DTYPE":"R","ID":"HKV-EG","RNUM":6,"RDATA":[1,0,0,1,0,0]}',
+    "status": '{"SRC":%(src)d,"DST":99,"TYPE":"D","DTYPE":"S","ID":"HKV-EG","MSEC":%(cnt)d,"SNUM":14,'
+              '"MCNT":%(cnt)d,"RNUM":6,"CCNT":3,"DISPLAY":"Display Init .. DONE!","USB":"",'
+              '"LORA":"LoRa Init ..   DONE!","RS485":"RS485 Init ..  IGNORE!","RELAIS":"Relais Init .. DONE!",'
+              '"SENSOR":"Sensor Init .. DONE! -> 1"}',
+    "connections": '{"SRC":%(src)d,"DST":99,"TYPE":"D","DTYPE":"C","ID":"HKV-BASE","CCNT":2,'
+                   '"CDATA":[{"ADDR":6915016,"STYPE":2},{"ADDR":6915683,"STYPE":2}]}',
+    "ack": '{"SRC":%(src)d,"DST":99,"TYPE":"A"}',
+    "nack": '{"SRC":%(src)d,"DST":99,"TYPE":"N"}',
+    "hello": '{"SRC":%(src)d,"DST":99,"TYPE":"H","HTYPE":"A","ID":"HKV-EG"}',
+    "log": '{"SRC":%(src)d,"DST":99,"TYPE":"L","LTYPE":"D","MSG":"LoRa RX rssi=-97 snr=7.25"}',
+    "temp_channel": '{"SRC":%(src)d,"DST":99,"TYPE":"T","TTYPE":"A","ID":"HKV-EG","CHAN":3,"VAL":22.0,"MCNT":%(cnt)d}',
+    "relais_channel": '{"SRC":%(src)d,"DST":99,"TYPE":"R","RTYPE":"A","ID":"HKV-EG","CHAN":6,"VAL":1}',
+}
+
+NODES = [5955124, 6915016, 6915683, 6915625]
+
+
+def frame(kind: str, src: int = 5955124, cnt: int = 1) -> str:
+    return SAMPLE_FRAMES[kind] % dict(src=src, cnt=cnt)
+
+
+def make_stream(size: int, seed: int = 1) -> bytes:
+    """Synthetic capture: mostly temperature pushes, some relais/status/log frames and boot noise."""
+    rnd = random.Random(seed)
+    kinds = ["temp"] * 10 + ["relais"] * 3 + ["status", "log", "log", "ack"]
+    parts = []
+    total = 0
+    cnt = 0
+    while total < size:
+        cnt += 1
+        if rnd.random() < 0.001:
+            line = "ets Jun  8 2016 00:22:57 rst:0x1 (POWERON_RESET)\r\n"
+        else:
+            line = frame(rnd.choice(kinds), src=rnd.choice(NODES), cnt=cnt) + "\r\n"
+        parts.append(line)
+        total += len(line)
+    return "".join(parts).encode()
+
+
+def chunks(stream: bytes, size: int = 256):
+    return [stream[i:i + size] for i in range(0, len(stream), size)]
+
+
+def load_stream(path: str) -> bytes:
+    """Load a raw byte dump of the serial port."""
+    return Path(path).read_bytes()
+
+
+def timeit(fn, *args, repeat: int = 3):
+    """Best of ``repeat`` runs in seconds."""
+    best = None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn(*args)
+        dt = time.perf_counter() - t0
+        best = dt if best is None or dt < best else best
+    return best
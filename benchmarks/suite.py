@@ -0,0 +1,232 @@
+'''Benchmark suite of the receive hot paths, results as JSON for comparing versions.
+
+    python benchmarks/suite.py [-o results.json] [--compare baseline.json] [--quick]
+
+Every case is measured in isolation (best of 3 runs):
+
+* ``framing``              HKVFramer.feed on 256 byte chunks
+* ``recv``                 HKV._data_received: framing, decode and dispatch
+* ``from_doc.<type>``      HKVPacket.from_doc for every packet type
+* ``dispatch.<n>``         HKV._handle_packet with 1/10/100 handlers, queues drained
+* ``coordinator.handle``   HKVCoordinator._handle_data_packet (node state merge)
+* ``fanout.<n>``           pushed temps to n entities, ``async_write_ha_state`` stubbed
+
+The coordinator and fan-out cases need Home Assistant, they are skipped
+without it.
+'''
+import argparse
+import asyncio
+import json
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from common import NODES, SAMPLE_FRAMES, chunks, frame, make_stream, timeit
+
+from hkv.framing import HKVFramer
+from hkv.hkv import HKV
+from hkv.packets import HKVPacket, HKVTempDataPacket
+
+ROOT = Path(__file__).resolve().parents[1]
+
+
+def result(ops: int, seconds: float, **extra) -> dict:
+    return dict(ops=ops, seconds=seconds, ops_per_s=ops / seconds, us_per_op=seconds / ops * 1e6, **extra)
+
+
+# ---------------------------------------------------------------------
+#  cases
+# ---------------------------------------------------------------------
+def bench_framing(size: int) -> dict:
+    chunks_ = chunks(make_stream(size))
+
+    def run():
+        framer = HKVFramer()
+        for data in chunks_:
+            framer.feed(data)
+        return framer
+
+    frames = run().frames
+    return {"framing": result(frames, timeit(run), bytes=size)}
+
+
+def bench_recv(size: int) -> dict:
+    chunks_ = chunks(make_stream(size))
+    hkv = HKV()
+
+    def run():
+        for data in chunks_:
+            hkv._data_received(data)
+        hkv._packets.clear()
+
+    frames = hkv._framer.frames
+    t = timeit(run)
+    return {"recv": result((hkv._framer.frames - frames) // 3, t, bytes=size)}
+
+
+def bench_from_doc(n: int) -> dict:
+    results = {}
+    for kind in SAMPLE_FRAMES:
+        docs = [frame(kind, cnt=i).encode() for i in range(n)]
+
+        def run():
+            from_doc = HKVPacket.from_doc
+            for doc in docs:
+                from_doc(doc)
+
+        results[f"from_doc.{kind}"] = result(n, timeit(run))
+    return results
+
+
+async def _drain(hkv):
+    while any(sub["depth"] for sub in hkv.handler_stats()):
+        await asyncio.sleep(0)
+
+
+async def bench_dispatch(n: int) -> dict:
+    packets = [HKVPacket.from_doc(frame("temp", src=NODES[i % len(NODES)], cnt=i)) for i in range(n)]
+    results = {}
+    for handlers in (1, 10, 100):
+        hkv = HKV()
+        for _ in range(handlers):
+            async def handler(packet):
+                pass
+            hkv.register_packet_handler(handler, HKVTempDataPacket, maxsize=n)
+        best = None
+        for _ in range(3):
+            t0 = time.perf_counter()
+            for packet in packets:
+                hkv._handle_packet(packet)
+            await _drain(hkv)
+            dt = time.perf_counter() - t0
+            best = dt if best is None or dt < best else best
+            hkv._packets.clear()
+        hkv._dispatcher.close()
+        results[f"dispatch.{handlers}"] = result(n, best, handlers=handlers)
+    return results
+
+
+async def bench_coordinator(n: int) -> dict:
+    try:
+        import homeassistant.core as ha
+        sys.path.insert(0, str(ROOT))
+        from custom_components.hkv import coordinator as coordinator_mod
+        from custom_components.hkv.sensor import HKVEntityDescription, HKVSensor
+    except ImportError as e:
+        print(f"skipping coordinator/fan-out cases: {e}")
+        return {}
+
+    class OfflineHub(coordinator_mod.HKVHub):
+        async def connect(self):
+            pass
+
+    coordinator_mod.HKVHub = OfflineHub
+    hass = ha.HomeAssistant(tempfile.mkdtemp())
+    coordinator = coordinator_mod.HKVCoordinator(hass, "/dev/null", 115200, 1.0, 60)
+    coordinator.data = {"hub": {}, "devices": {}}
+    # every push changes all temperatures
+    packets = [
+        HKVPacket.from_doc(frame("temp", src=NODES[i % len(NODES)], cnt=i).replace("21.5", str(20 + i % 100 / 10)).encode())
+        for i in range(n)
+    ]
+    for i, packet in enumerate(packets):
+        packet.TDATA = [t + i % 7 / 10 for t in packet.TDATA]
+
+    async def handle_all():
+        for packet in packets:
+            await coordinator._handle_data_packet(packet)
+
+    async def timed(fn, repeat=3):
+        best = None
+        for _ in range(repeat):
+            coordinator.data["devices"].clear()
+            t0 = time.perf_counter()
+            await fn()
+            dt = time.perf_counter() - t0
+            best = dt if best is None or dt < best else best
+        return best
+
+    results = {"coordinator.handle": result(n, await timed(handle_all))}
+
+    # entity fan-out: sensors of every temperature channel, state writes are counted only
+    writes = 0
+
+    def write_stub(self):
+        nonlocal writes
+        writes += 1
+
+    HKVSensor.async_write_ha_state = write_stub
+    for per_node in (1, 14):
+        removers = []
+        for slave in NODES:
+            for i in range(per_node):
+                sensor = HKVSensor(coordinator, HKVEntityDescription(key=f"TDATA_{i}", slave=slave, deadband=0.1))
+                sensor.hass = hass
+                removers.append(coordinator.async_add_key_listener(slave, f"TDATA_{i}", sensor._handle_key_update))
+        writes = 0
+        t = await timed(handle_all)
+        entities = per_node * len(NODES)
+        results[f"fanout.{entities}"] = result(n, t, entities=entities, writes_per_packet=writes / 3 / n)
+        for remove in removers:
+            remove()
+    await hass.async_stop(force=True)
+    return results
+
+
+# ---------------------------------------------------------------------
+def metadata() -> dict:
+    try:
+        commit = subprocess.run(["git", "describe", "--always", "--dirty"], cwd=ROOT,
+                                capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    manifest = json.loads((ROOT / "custom_components" / "hkv" / "manifest.json").read_text())
+    return dict(
+        version=manifest.get("version"),
+        commit=commit,
+        python=sys.version.split()[0],
+        platform=platform.platform(),
+        time=time.strftime("%Y-%m-%dT%H:%M:%S"),
+    )
+
+
+def compare(results: dict, baseline_path: str):
+    baseline = json.loads(Path(baseline_path).read_text())["results"]
+    print(f"\n{'case':24s} {'baseline us':>12s} {'now us':>10s} {'change':>8s}")
+    for name, res in results.items():
+        old = baseline.get(name)
+        if old is None:
+            continue
+        change = res["us_per_op"] / old["us_per_op"] - 1
+        flag = "  <-- slower" if change > 0.1 else ""
+        print(f"{name:24s} {old['us_per_op']:12.2f} {res['us_per_op']:10.2f} {change:+7.0%}{flag}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-o", "--output", default="benchmark-results.json", help="JSON result file")
+    parser.add_argument("--compare", help="Result file of a previous version")
+    parser.add_argument("--quick", action="store_true", help="Smaller inputs (smoke test)")
+    args = parser.parse_args()
+    size, n = (256 * 1024, 2000) if args.quick else (4 * 1024 * 1024, 20000)
+
+    results = {}
+    results.update(bench_framing(size))
+    results.update(bench_recv(size))
+    results.update(bench_from_doc(n))
+    results.update(asyncio.run(bench_dispatch(n)))
+    results.update(asyncio.run(bench_coordinator(n // 4)))
+
+    for name, res in results.items():
+        print(f"{name:24s} {res['ops_per_s']:12.0f} ops/s {res['us_per_op']:9.2f} us/op")
+    Path(args.output).write_text(json.dumps(dict(meta=metadata(), results=results), indent=2))
+    print(f"results written to {args.output}")
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == "__main__":
+    main()
@@ -4,8 +4,10 @@ from __future__ import annotations
 from homeassistant.config_entries import ConfigEntry
 from homeassistant.const import Platform
 from homeassistant.core import HomeAssistant
+from homeassistant.helpers.storage import Store
 
-from .const import DOMAIN, CONF_DEV, CONF_BAUD, CONF_TIMEOUT, CONF_INTERVAL
+from .const import DOMAIN, CONF_DEV, CONF_BAUD, CONF_TIMEOUT, CONF_INTERVAL, \
+    CONF_MAX_INFLIGHT, CONF_MAX_INFLIGHT_NODE, DEFAULT_MAX_INFLIGHT, DEFAULT_MAX_INFLIGHT_NODE, STORAGE_VERSION
 from .coordinator import HKVCoordinator, HKVEntity
 
 # TODO List the platforms that you want to support.
@@ -20,16 +22,29 @@ async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
                                  entry.options[CONF_DEV],
                                  entry.options[CONF_BAUD],
                                  entry.options.get(CONF_TIMEOUT,1.0), 
-                                 entry.options[CONF_INTERVAL])
+                                 entry.options[CONF_INTERVAL],
+                                 entry.options.get(CONF_MAX_INFLIGHT, DEFAULT_MAX_INFLIGHT),
+                                 entry.options.get(CONF_MAX_INFLIGHT_NODE, DEFAULT_MAX_INFLIGHT_NODE),
+                                 entry_id=entry.entry_id)
     hass.data.setdefault(DOMAIN, {})
     hass.data[DOMAIN][entry.entry_id] = coordinator
+    # poll intervals and the other tuning options not passed to the constructor
+    coordinator.async_apply_options(entry.options)
+    await coordinator.async_set_capture(entry.options)
+    coordinator.async_set_radio(entry.options)
+    entry.async_on_unload(coordinator.async_stop_capture)
 
-    # Fetch initial data so we have data when entities subscribe
+    # Entities are created from the snapshot of the last run, the live data follows in the background.
+    # Without a snapshot (first setup) fetch the initial data so we have data when entities subscribe.
     # If the refresh fails, async_config_entry_first_refresh will
     # raise ConfigEntryNotReady and setup will try again later
-    await coordinator.async_config_entry_first_refresh()
+    restored = await coordinator.async_load_snapshot()
+    if not restored:
+        await coordinator.async_config_entry_first_refresh()
     entry.async_on_unload(entry.add_update_listener(update_listener))
     await hass.config_entries.async_forward_entry_setups(entry, PLATFORMS)
+    if restored:
+        entry.async_create_background_task(hass, coordinator.async_refresh(), f"{DOMAIN} refresh")
 
     return True
 
@@ -41,8 +56,23 @@ async def async_unload_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
 
     return unload_ok
 
+async def async_remove_entry(hass: HomeAssistant, entry: ConfigEntry) -> None:
+    """Remove the snapshot of a deleted entry."""
+    await Store(hass, STORAGE_VERSION, f"{DOMAIN}.{entry.entry_id}").async_remove()
+
+
 async def update_listener(hass: HomeAssistant, entry: ConfigEntry) -> None:
-    """Update listener."""
-    await hass.config_entries.async_reload(entry.entry_id)
+    """Update listener.
+
+    Only a new device or baud rate needs a new serial connection (reload),
+    everything else is applied to the running coordinator.
+    """
+    coordinator: HKVCoordinator = hass.data[DOMAIN][entry.entry_id]
+    if (entry.options[CONF_DEV], entry.options[CONF_BAUD]) != (coordinator.api.dev, coordinator.api.baud):
+        await hass.config_entries.async_reload(entry.entry_id)
+        return
+    coordinator.async_apply_options(entry.options)
+    coordinator.async_set_radio(entry.options)
+    await coordinator.async_set_capture(entry.options)
     
 
@@ -7,7 +7,13 @@ from homeassistant.helpers.entity import EntityDescription
 @dataclass
 class HKVBaseEntityDescription(EntityDescription):
     slave: int = None 
-    value_fn: Callable[[dict], StateType] = lambda data, slave, key: data['devices'][slave][key]
+    # None: the value is read through the accessor of the key (see state.accessor)
+    value_fn: Callable[[dict, int, str], StateType] | None = None
+    # numeric changes below the deadband (absolute or relative to the last written value) are not written
+    deadband: float | None = None
+    deadband_rel: float | None = None
+    # write the state at least every max_age seconds, even if unchanged
+    max_age: float | None = None
 @dataclass 
 class HKVWriteBaseEntityDescription(HKVBaseEntityDescription):
     keynum: int = None
\ No newline at end of file
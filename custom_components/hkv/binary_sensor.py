@@ -7,14 +7,13 @@ from dataclasses import dataclass
 
 from homeassistant.components.binary_sensor import BinarySensorEntity, BinarySensorEntityDescription, DOMAIN as BINARY_SENSOR_DOMAIN
 from homeassistant.config_entries import ConfigEntry
-from homeassistant.core import HomeAssistant, HassJob
+from homeassistant.core import HomeAssistant, HassJob, callback
 from homeassistant.helpers.entity_platform import AddEntitiesCallback
-from homeassistant.helpers.update_coordinator import CoordinatorEntity
 from homeassistant.helpers import entity, event
 from homeassistant.util import utcnow
 from datetime import timedelta
 
-from .coordinator import HKVCoordinator
+from .coordinator import HKVCoordinator, HKVKeyEntity
 from .const import DOMAIN
 from .base import HKVBaseEntityDescription
 
@@ -31,10 +30,11 @@ async def async_setup_entry(hass: HomeAssistant, config_entry: ConfigEntry, asyn
     _LOGGER.debug("attempting to setup switch entities")
     coordinator: HKVCoordinator = hass.data[DOMAIN][config_entry.entry_id]
     #_LOGGER.debug(coordinator.get_data()["devices"])
-    descriptions = []
     #TODO cleanup
-    devices = coordinator.get_data()["devices"]
-    for dev_addr, dev_data in devices.items():
+
+    @callback
+    def node_entities(dev_addr, dev_data):
+        descriptions = []
         # _LOGGER.error(f"{dev_addr=}")
         # _LOGGER.error(f"{dev_data=}")
         for name, val in dev_data.items():
@@ -48,22 +48,11 @@ async def async_setup_entry(hass: HomeAssistant, config_entry: ConfigEntry, asyn
                         name=name.replace('_', ' ')+' '+no,
                         slave=dev_addr,
                         entity_category=EntityCategory.DIAGNOSTIC,
-                        value_fn=lambda data, slave, key: data['devices'][slave][key.split('_')[0]][key.split('_')[1]]
                     ))
+        return [HKVBinarySensor(hass, coordinator, description) for description in descriptions]
 
-    entities = []
-    entity = {}
-    for description in descriptions:
-        entity = description
-        entities.append(
-            HKVBinarySensor(
-                hass,
-                coordinator,
-                entity
-                ))
-    _LOGGER.debug("adding switches")
-    _LOGGER.debug(entities)
-    async_add_entities(entities)
+    _LOGGER.debug("adding binary sensors")
+    coordinator.async_add_node_entities(config_entry, async_add_entities, node_entities)
 
 
 @dataclass
@@ -71,7 +60,7 @@ class HKVEntityDescription(BinarySensorEntityDescription, HKVBaseEntityDescripti
     """Describes HKV switch entity."""
     
 
-class HKVBinarySensor(CoordinatorEntity, BinarySensorEntity):
+class HKVBinarySensor(HKVKeyEntity, BinarySensorEntity):
     """Representation of an HKV switch."""
 
     def __init__(self, hass: HomeAssistant, coordinator: HKVCoordinator, description: HKVEntityDescription) -> None:
@@ -91,7 +80,7 @@ class HKVBinarySensor(CoordinatorEntity, BinarySensorEntity):
         
     @property
     def is_on(self) -> bool:
-        data =  self.description.value_fn( self.coordinator.get_data(), self.description.slave, self.description.key)
+        data = self.hkv_value
         """Return true if switch is on."""
         return cast(bool, data)
 
@@ -1,7 +1,7 @@
 """Support for Victron energy button sensors."""
 from __future__ import annotations
 
-from homeassistant.core import HomeAssistant, HassJob
+from homeassistant.core import HomeAssistant, HassJob, callback
 
 from dataclasses import dataclass
 
@@ -42,8 +42,11 @@ async def async_setup_entry(
     ))
     
     
-    devices = coordinator.get_data()["devices"]
-    for dev_addr, dev_data in devices.items():
+    async_add_entities([HKVButton(hass, coordinator, description) for description in descriptions])
+
+    @callback
+    def node_entities(dev_addr, dev_data):
+        descriptions = []
         # _LOGGER.error(f"{dev_addr=}")
         # _LOGGER.error(f"{dev_data=}")
         descriptions.append(HKVEntityDescription(
@@ -68,13 +71,9 @@ async def async_setup_entry(
         for name, val in dev_data.items():
             _LOGGER.debug(f"{name=}")
             _LOGGER.debug(f"{val=}")
-            
-
-    entities = []
-    for description in descriptions:
-        entities.append(HKVButton(hass,coordinator,description))
+        return [HKVButton(hass, coordinator, description) for description in descriptions]
 
-    async_add_entities(entities, True)
+    coordinator.async_add_node_entities(config_entry, async_add_entities, node_entities)
 
 class HKVEntityDescription(HKVBaseEntityDescription,ButtonEntityDescription):
     """Describes HKV button entity."""
@@ -15,7 +15,11 @@ from homeassistant.config_entries import ConfigEntry, OptionsFlow
 from .const import DOMAIN
 from .hub import HKVHub
 from .const import CONF_DEV, CONF_BAUD,\
-    CONF_INTERVAL, CONF_TIMEOUT, SCAN_REGISTERS
+    CONF_INTERVAL, CONF_TIMEOUT, SCAN_REGISTERS, CONF_MAX_INFLIGHT, CONF_MAX_INFLIGHT_NODE,\
+    DEFAULT_MAX_INFLIGHT, DEFAULT_MAX_INFLIGHT_NODE, CONF_TEMP_DEADBAND, CONF_MAX_AGE, CONF_CAPTURE, \
+    DEFAULT_TEMP_DEADBAND, DEFAULT_MAX_AGE, CONF_DUTY_CYCLE, CONF_LORA_SF, CONF_LORA_BW, \
+    DEFAULT_DUTY_CYCLE, DEFAULT_LORA_SF, DEFAULT_LORA_BW, CONF_POLL_TEMPS, CONF_POLL_RELAIS, CONF_POLL_STATUS, \
+    DEFAULT_POLL_INTERVALS
 
 _LOGGER = logging.getLogger(__name__)
 
@@ -26,6 +30,8 @@ STEP_USER_DATA_SCHEMA = vol.Schema(
         vol.Required(CONF_BAUD,default=115200): int,
         vol.Required(CONF_TIMEOUT,default=1.0): float,
         vol.Required(CONF_INTERVAL, default=1): int,
+        vol.Optional(CONF_MAX_INFLIGHT, default=DEFAULT_MAX_INFLIGHT): vol.All(int, vol.Range(min=1)),
+        vol.Optional(CONF_MAX_INFLIGHT_NODE, default=DEFAULT_MAX_INFLIGHT_NODE): vol.All(int, vol.Range(min=1)),
     }
 )
 
@@ -132,6 +138,17 @@ class HKVOptionFlowHandler(config_entries.OptionsFlow):
                 vol.Required(CONF_BAUD,default=self.config_entry.options.get(CONF_BAUD),): int,
                 vol.Required(CONF_TIMEOUT,default=self.config_entry.options.get(CONF_TIMEOUT),): float,
                 vol.Required(CONF_INTERVAL,default=self.config_entry.options.get(CONF_INTERVAL),): int,
+                vol.Optional(CONF_MAX_INFLIGHT,default=self.config_entry.options.get(CONF_MAX_INFLIGHT, DEFAULT_MAX_INFLIGHT),): vol.All(int, vol.Range(min=1)),
+                vol.Optional(CONF_MAX_INFLIGHT_NODE,default=self.config_entry.options.get(CONF_MAX_INFLIGHT_NODE, DEFAULT_MAX_INFLIGHT_NODE),): vol.All(int, vol.Range(min=1)),
+                vol.Optional(CONF_TEMP_DEADBAND,default=self.config_entry.options.get(CONF_TEMP_DEADBAND, DEFAULT_TEMP_DEADBAND),): vol.All(vol.Coerce(float), vol.Range(min=0)),
+                vol.Optional(CONF_MAX_AGE,default=self.config_entry.options.get(CONF_MAX_AGE, DEFAULT_MAX_AGE),): vol.All(int, vol.Range(min=0)),
+                vol.Optional(CONF_POLL_TEMPS,default=self.config_entry.options.get(CONF_POLL_TEMPS, DEFAULT_POLL_INTERVALS["temps"]),): vol.All(int, vol.Range(min=0)),
+                vol.Optional(CONF_POLL_RELAIS,default=self.config_entry.options.get(CONF_POLL_RELAIS, DEFAULT_POLL_INTERVALS["relais"]),): vol.All(int, vol.Range(min=0)),
+                vol.Optional(CONF_POLL_STATUS,default=self.config_entry.options.get(CONF_POLL_STATUS, DEFAULT_POLL_INTERVALS["status"]),): vol.All(int, vol.Range(min=0)),
+                vol.Optional(CONF_CAPTURE,default=self.config_entry.options.get(CONF_CAPTURE, False),): bool,
+                vol.Optional(CONF_DUTY_CYCLE,default=self.config_entry.options.get(CONF_DUTY_CYCLE, DEFAULT_DUTY_CYCLE),): vol.All(vol.Coerce(float), vol.Range(min=0, max=100)),
+                vol.Optional(CONF_LORA_SF,default=self.config_entry.options.get(CONF_LORA_SF, DEFAULT_LORA_SF),): vol.All(int, vol.Range(min=7, max=12)),
+                vol.Optional(CONF_LORA_BW,default=self.config_entry.options.get(CONF_LORA_BW, DEFAULT_LORA_BW),): vol.In([125, 250, 500]),
                 }
             ),
         )
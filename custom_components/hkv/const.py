@@ -9,6 +9,63 @@ CONF_BAUD = "baudrate"
 CONF_TIMEOUT = "timeout"
 SCAN_REGISTERS = "registers"
 CONF_INTERVAL = "interval"
+CONF_MAX_INFLIGHT = "max_inflight"
+CONF_MAX_INFLIGHT_NODE = "max_inflight_node"
+CONF_TEMP_DEADBAND = "temp_deadband"
+CONF_MAX_AGE = "max_age"
+# maximum age (seconds) of the temps/relais/status of a node before a sweep polls them, see DEFAULT_POLL_INTERVALS
+CONF_POLL_TEMPS = "poll_temps"
+CONF_POLL_RELAIS = "poll_relais"
+CONF_POLL_STATUS = "poll_status"
+# record the serial traffic to <config>/hkv_<entry_id>_<start time>.hkvcap (see hkv/capture.py),
+# a new file per start, each at most CAPTURE_MAX_BYTES
+CONF_CAPTURE = "capture"
+CAPTURE_MAX_BYTES = 64 * 1024 * 1024
+# LoRa radio for the airtime accounting, duty cycle in percent (0: accounting only, no budget)
+CONF_DUTY_CYCLE = "duty_cycle"
+CONF_LORA_SF = "lora_sf"
+CONF_LORA_BW = "lora_bw"
+
+# topology and last values are kept in .storage/hkv.<entry_id>, written SNAPSHOT_SAVE_DELAY seconds
+# after the first change since the last write (and on shutdown)
+STORAGE_VERSION = 1
+SNAPSHOT_SAVE_DELAY = 60
+
+DEFAULT_MAX_INFLIGHT = 4
+DEFAULT_MAX_INFLIGHT_NODE = 1
+
+# temperature changes below the deadband (°C) are not written to the state machine,
+# unchanged states are written again after max_age seconds
+DEFAULT_TEMP_DEADBAND = 0.1
+DEFAULT_MAX_AGE = 900
+
+DEFAULT_DUTY_CYCLE = 0
+DEFAULT_LORA_SF = 9
+DEFAULT_LORA_BW = 125  # kHz
+
+# time budgets of one polling sweep in seconds (the coordinator gives up after 90 s)
+DEFAULT_COMMAND_TIMEOUT = 5
+DEFAULT_NODE_BUDGET = 20
+DEFAULT_SWEEP_BUDGET = 60
+# how long a broadcast query collects the responses of the nodes
+DEFAULT_BROADCAST_WINDOW = 3
+
+# shortest coordinator tick (CONF_INTERVAL) in seconds
+MIN_INTERVAL = 10
+# maximum age of node data before it is polled again (pushed data counts, too),
+# status and connections are cached in the topology, the status is re-read
+# on a slow interval to notice reboots of nodes that push no temperatures
+DEFAULT_POLL_INTERVALS = {
+    "temps": 120,
+    "relais": 60,
+    "status": 3600,
+}
+
+# desired temperature periods of the nodes in ms (delay before the first measurement/transmission)
+DEFAULT_TEMP_MEASURE_PERIOD = 30000
+DEFAULT_TEMP_MEASURE_DELAY = 1000
+DEFAULT_TEMP_TRANSMIT_PERIOD = 30000
+DEFAULT_TEMP_TRANSMIT_DELAY = 2000
 
 
 class EntityType():
@@ -3,20 +3,26 @@
 @author: holger
 '''
 import asyncio
-from collections import OrderedDict
-from dataclasses import asdict
+from collections import OrderedDict, defaultdict
+from collections.abc import Callable
 from datetime import timedelta
 import logging
+import time
 
 from homeassistant.components.sensor import SensorEntity
-from homeassistant.core import callback
+from homeassistant.core import CALLBACK_TYPE, callback
+from homeassistant.helpers.storage import Store
 from homeassistant.helpers.update_coordinator import (
     CoordinatorEntity,
     DataUpdateCoordinator,
     UpdateFailed,
 )
 
-from .const import DOMAIN
+from .const import DOMAIN, DEFAULT_MAX_INFLIGHT, DEFAULT_MAX_INFLIGHT_NODE, MIN_INTERVAL, \
+    STORAGE_VERSION, SNAPSHOT_SAVE_DELAY, CAPTURE_MAX_BYTES, CONF_TIMEOUT, CONF_INTERVAL, CONF_MAX_INFLIGHT, CONF_MAX_INFLIGHT_NODE, \
+    CONF_POLL_TEMPS, CONF_POLL_RELAIS, CONF_POLL_STATUS, DEFAULT_POLL_INTERVALS, CONF_CAPTURE, CONF_DUTY_CYCLE, CONF_LORA_SF, CONF_LORA_BW, DEFAULT_DUTY_CYCLE, DEFAULT_LORA_SF, DEFAULT_LORA_BW
+from .hkv.airtime import HKVRadio
+from .hkv.reconciler import MEASURE, TRANSMIT
 from .hkv.packets import (
     HKVConnectionDataPacket,
     HKVRelaisDataPacket,
@@ -24,22 +30,29 @@ from .hkv.packets import (
     HKVTempDataPacket,
 )
 from .hub import HKVHub
+from .state import HKVNodeState, accessor
 
 _LOGGER = logging.getLogger(__name__)
 
+# node fields set by the sweep, not by a received packet
+_SWEEP_FIELDS = ('STALE', MEASURE, TRANSMIT)
+
 class HKVCoordinator(DataUpdateCoordinator):
     """My custom coordinator."""
 
     api: HKVHub
 
-    def __init__(self, hass, dev: str, baud: int, timeout: float, interval: int):
+    def __init__(self, hass, dev: str, baud: int, timeout: float, interval: int,
+                 max_inflight: int = DEFAULT_MAX_INFLIGHT, max_inflight_node: int = DEFAULT_MAX_INFLIGHT_NODE,
+                 entry_id: str | None = None):
         """Initialize my coordinator."""
         super().__init__(hass, _LOGGER,
                          name=DOMAIN,
-                         update_interval=timedelta(seconds=30),  # Reduziert auf 30s
+                         # a tick only polls stale data, see HKVPollScheduler
+                         update_interval=timedelta(seconds=max(interval or 0, MIN_INTERVAL)),
                          update_method=self.async_update_data,
                          )
-        self.api = HKVHub(dev, baud, timeout)
+        self.api = HKVHub(dev, baud, timeout, max_inflight, max_inflight_node)
         # async with async_timeout(10):
         #     _LOGGER.info("Connecting ...")
         #     await self.api.connect()
@@ -51,22 +64,197 @@ class HKVCoordinator(DataUpdateCoordinator):
         self.api.hkv.register_packet_handler(self._handle_data_packet, HKVStatusDataPacket)
         self.api.hkv.register_packet_handler(self._handle_data_packet, HKVConnectionDataPacket)
         self.interval = interval
+        # (node, entity key) -> update callbacks of the entities showing it
+        self._key_listeners: dict[tuple[int, str], list[CALLBACK_TYPE]] = defaultdict(list)
+        # called with the node address when a node appears or gains channels/fields
+        self._node_listeners: list[Callable[[int], None]] = []
+        # snapshot of topology and last values for a fast startup
+        self._store = Store(hass, STORAGE_VERSION, f"{DOMAIN}.{entry_id}") if entry_id else None
+        self._save_at = 0.0  # loop time of the pending snapshot write
+        # nodes updated by received packets since the running sweep began
+        self._handled: set[int] = set()
+        self._entry_id = entry_id
         _LOGGER.debug("Coordinator finished Init")
 
+    @callback
+    def async_apply_options(self, options):
+        """Apply changed timeout, interval, request windows and poll intervals in place (no reconnect)."""
+        self.interval = options[CONF_INTERVAL]
+        self.update_interval = timedelta(seconds=max(self.interval or 0, MIN_INTERVAL))
+        self.api.configure(
+            options.get(CONF_TIMEOUT, 1.0),
+            options.get(CONF_MAX_INFLIGHT, DEFAULT_MAX_INFLIGHT),
+            options.get(CONF_MAX_INFLIGHT_NODE, DEFAULT_MAX_INFLIGHT_NODE),
+            poll_intervals={
+                "temps": options.get(CONF_POLL_TEMPS, DEFAULT_POLL_INTERVALS["temps"]),
+                "relais": options.get(CONF_POLL_RELAIS, DEFAULT_POLL_INTERVALS["relais"]),
+                "status": options.get(CONF_POLL_STATUS, DEFAULT_POLL_INTERVALS["status"]),
+            },
+        )
+        if self._listeners:
+            # next tick with the new interval
+            self._schedule_refresh()
+        _LOGGER.info(f"options applied: interval={self.update_interval}, timeout={self.api.timeout}, "
+                     f"poll intervals={self.api.scheduler.intervals}")
+
+    @callback
+    def async_set_radio(self, options):
+        """LoRa parameters of the airtime accounting and the duty-cycle budget."""
+        duty_cycle = options.get(CONF_DUTY_CYCLE, DEFAULT_DUTY_CYCLE)
+        self.api.hkv.airtime.configure(
+            HKVRadio(sf=options.get(CONF_LORA_SF, DEFAULT_LORA_SF), bw=int(options.get(CONF_LORA_BW, DEFAULT_LORA_BW) * 1000)),
+            duty_cycle=duty_cycle / 100 if duty_cycle else None,
+        )
+
+    async def async_set_capture(self, options):
+        """Start or stop the capture of the serial traffic (option ``capture``)."""
+        hkv = self.api.hkv
+        if options.get(CONF_CAPTURE, False) and not hkv.capturing:
+            # one file per start, a restart or reload does not overwrite the previous capture
+            path = self.hass.config.path(f"{DOMAIN}_{self._entry_id}_{time.strftime('%Y%m%d-%H%M%S')}.hkvcap")
+            await self.hass.async_add_executor_job(hkv.start_capture, path, CAPTURE_MAX_BYTES)
+        elif not options.get(CONF_CAPTURE, False) and hkv.capturing:
+            await self.async_stop_capture()
+
+    async def async_stop_capture(self):
+        """Stop the capture, the file is written and closed outside the event loop."""
+        if (closed := self.api.hkv.stop_capture()) is not None:
+            await asyncio.wrap_future(closed)
+
     @property
     def hkv(self):
         """The HKV device."""
         return self.api.hkv
 
+    @callback
+    def async_add_key_listener(self, dev_addr: int, key: str, update_callback: CALLBACK_TYPE) -> Callable[[], None]:
+        """Call ``update_callback`` when ``key`` of node ``dev_addr`` changes. Returns the remove function."""
+        listeners = self._key_listeners[(dev_addr, key)]
+        listeners.append(update_callback)
+
+        @callback
+        def remove_listener() -> None:
+            listeners.remove(update_callback)
+            if not listeners:
+                self._key_listeners.pop((dev_addr, key), None)
+
+        return remove_listener
+
+    @callback
+    def _notify_keys(self, dev_addr: int, keys: list[str]):
+        listeners = self._key_listeners
+        for key in keys:
+            for update_callback in listeners.get((dev_addr, key), ()):
+                update_callback()
+
+    @callback
+    def async_add_node_entities(self, config_entry, async_add_entities, node_entities):
+        """Add the entities of all nodes, and later those of new nodes or new capabilities.
+
+        ``node_entities(dev_addr, dev_data)`` returns the entities of one node,
+        entities whose unique id was already added are skipped. They are added
+        without ``update_before_add``: the values are in the coordinator data
+        (snapshot or sweep) already, an update would run a whole sweep.
+        """
+        added = set()
+
+        @callback
+        def add(dev_addr: int):
+            dev_data = self.data["devices"].get(dev_addr)
+            if dev_data is None:
+                return
+            entities = [e for e in node_entities(dev_addr, dev_data) if e.unique_id not in added]
+            if entities:
+                _LOGGER.debug(f"node {dev_addr}: adding {[e.unique_id for e in entities]}")
+                added.update(e.unique_id for e in entities)
+                async_add_entities(entities)
+
+        for dev_addr in list(self.data["devices"]):
+            add(dev_addr)
+        self._node_listeners.append(add)
+        config_entry.async_on_unload(lambda: self._node_listeners.remove(add))
+
+    @callback
+    def _node_grown(self, dev_addr: int):
+        """Node ``dev_addr`` is new or has new channels/fields: the platforms add its missing entities."""
+        for listener in list(self._node_listeners):
+            listener(dev_addr)
+
+    @callback
+    def _notify_node(self, dev_addr: int):
+        """Every entity of node ``dev_addr`` (node added or removed)."""
+        self._notify_keys(dev_addr, [key for addr, key in list(self._key_listeners) if addr == dev_addr])
+
+    async def async_load_snapshot(self) -> bool:
+        """Restore the topology and last values of the previous run. True if there was a snapshot."""
+        if self._store is None:
+            return False
+        data = await self._store.async_load()
+        if not data or not data.get("devices"):
+            return False
+        devices = OrderedDict()
+        for addr, values in data["devices"].items():
+            state = devices[int(addr)] = HKVNodeState.from_dict(int(addr), values)
+            state.STALE = True  # until the first sweep
+        self.data = {
+            "hub": OrderedDict(SRC=99, ID='HKV-Hub'),
+            "devices": devices,
+        }
+        self.api.restore(data, devices)
+        _LOGGER.info(f"snapshot: restored {len(devices)} nodes")
+        return True
+
+    def _snapshot(self) -> dict:
+        return dict(
+            devices={str(addr): state.as_dict() for addr, state in self.data["devices"].items()},
+            **self.api.snapshot(),
+        )
+
+    @callback
+    def _schedule_save(self):
+        if self._store is None:
+            return
+        # throttled: async_delay_save alone moves the write on with every call, with
+        # pushes every few seconds it would never happen. The snapshot is taken when
+        # the pending write runs, changes until then are in it.
+        now = self.hass.loop.time()
+        if now < self._save_at:
+            return
+        self._save_at = now + SNAPSHOT_SAVE_DELAY
+        self._store.async_delay_save(self._snapshot, SNAPSHOT_SAVE_DELAY)
+
+    def _node(self, dev_addr: int) -> HKVNodeState:
+        devices = self.data['devices']
+        state = devices.get(dev_addr)
+        if state is None:
+            state = devices[dev_addr] = HKVNodeState(dev_addr)
+        return state
+
+    def value_accessor(self, dev_addr: int, key: str) -> Callable[[], object]:
+        """Getter of the current value of ``key`` of node ``dev_addr``, bound once."""
+        devices = self.data['devices']
+        get = accessor(key)
+
+        def value():
+            state = devices.get(dev_addr)
+            return None if state is None else get(state)
+        return value
+
     async def _handle_data_packet(self, packet):
         _LOGGER.debug(f"Handle HKV packet {packet}")
         dev_addr = packet.SRC
-        if dev_addr not in self.data['devices']:
-            self.data['devices'][dev_addr] = OrderedDict(ID='UNKNOWN')  # Default
-        data = asdict(packet)
-        self.data['devices'][dev_addr].update({k: v for k, v in data.items() if k not in ['SRC', 'DST', 'TYPE']})
-        _LOGGER.info(f"Handle HKV packet data update self.data['devices'][{dev_addr}]={self.data['devices'][dev_addr]}")
-        self.async_set_updated_data(self.data)
+        self._handled.add(dev_addr)
+        # no asdict(): the fields are read directly, only changed keys notify their entities
+        new = dev_addr not in self.data['devices']
+        state = self._node(dev_addr)
+        shape = state.shape()
+        changed = state.apply_packet(packet)
+        if new or state.shape() != shape:
+            self._node_grown(dev_addr)
+        if changed:
+            _LOGGER.debug(f"Handle HKV packet: node {dev_addr} changed {changed}")
+            self._notify_keys(dev_addr, changed)
+            self._schedule_save()
 
     async def async_update_data(self):
         """Fetch data from API endpoint."""
@@ -78,15 +266,37 @@ class HKVCoordinator(DataUpdateCoordinator):
                 "hub": hub_data,
                 "devices": OrderedDict()}
 
+        self._handled.clear()
         try:
             async with asyncio.timeout(90):
                 while not self.api.connected:
                     await asyncio.sleep(1)
                 parsed_data = await self.api.fetch_data(self.hass)
-            self.data.update(parsed_data)
         except asyncio.CancelledError as err:
             raise UpdateFailed(f"Error communicating with API: {err}")
 
+        # merge the sweep into the current data, entities are notified per changed key. Pushes and
+        # answers went through _handle_data_packet in receive order during the sweep: of the nodes
+        # updated that way only the fields of the sweep itself are taken, the rest may be older
+        devices = parsed_data.pop("devices")
+        self.data.update(parsed_data)
+        for dev_addr in [addr for addr in self.data["devices"] if addr not in devices]:
+            del self.data["devices"][dev_addr]
+            self._notify_node(dev_addr)
+        for dev_addr, dev in devices.items():
+            state = self.data["devices"].get(dev_addr)
+            if state is None:
+                self.data["devices"][dev_addr] = dev
+                self._node_grown(dev_addr)
+                self._notify_node(dev_addr)
+                continue
+            shape = state.shape()
+            if changed := state.merge_state(dev, _SWEEP_FIELDS if dev_addr in self._handled else None):
+                if state.shape() != shape:
+                    self._node_grown(dev_addr)
+                self._notify_keys(dev_addr, changed)
+        self._schedule_save()
+
         return self.data
 
     def get_data(self):
@@ -94,16 +304,87 @@ class HKVCoordinator(DataUpdateCoordinator):
 
     async def async_update_local_entry(self, dev_addr, key, value):
         data = self.data
-        key_parts = key.rsplit('_', 1)
-        if len(key_parts) == 2 and key_parts[-1].isnumeric():
-            key = key_parts[0]
-            index = int(key_parts[1]) #- 1
-            data["devices"][dev_addr][key][index] = value
-        else:
-            data["devices"][dev_addr][key] = value
+        changed = self._node(dev_addr).set_key(key, value)
         _LOGGER.info(f"async_update_local_entry: {dev_addr=}, {key=} to {value}")
         _LOGGER.debug(f"async_update_local_entry: {data=}")
-        self.async_set_updated_data(data)
+        self._notify_keys(dev_addr, changed)
+        self._schedule_save()
+
+class HKVKeyEntity(CoordinatorEntity):
+    """Entity that is only updated when the value of its (node, key) changes.
+
+    Subclasses need ``self.description`` with ``slave`` and ``key`` and
+    override ``_handle_key_update`` instead of ``_handle_coordinator_update``.
+    ``_handle_key_update`` is also called once when the entity is added, so
+    it starts with the current value. After that the state is only written
+    if it differs from the last written one by more than the deadband of the
+    description, or is older than its ``max_age``.
+    """
+
+    _written = None  # (available, value) of the last written state
+    _written_at = 0.0
+    _value = None
+
+    @property
+    def hkv_value(self):
+        """Current value of the entity key, read through an accessor bound on first use."""
+        if self._value is None:
+            value_fn = self.description.value_fn
+            if value_fn is None:
+                self._value = self.coordinator.value_accessor(self.description.slave, self.description.key)
+            else:
+                coordinator, slave, key = self.coordinator, self.description.slave, self.description.key
+                self._value = lambda: value_fn(coordinator.get_data(), slave, key)
+        return self._value()
+
+    async def async_added_to_hass(self) -> None:
+        await super().async_added_to_hass()
+        self.async_on_remove(self.coordinator.async_add_key_listener(
+            self.description.slave, self.description.key, self._handle_key_update))
+        # current value: the key listener only fires on the next change, without
+        # this write the entity stays unknown until then
+        self._handle_key_update()
+
+    @callback
+    def _handle_coordinator_update(self) -> None:
+        # sweep results arrive per key, here only availability and max_age are checked
+        self._async_write_if_changed()
+
+    @callback
+    def _handle_key_update(self) -> None:
+        self._async_write_if_changed()
+
+    def _state_value(self):
+        """The value compared with the last written state."""
+        return self.state
+
+    def _changed(self, old, new) -> bool:
+        if old == new:
+            return False
+        description = self.description
+        if isinstance(old, (int, float)) and isinstance(new, (int, float)) \
+                and not isinstance(old, bool) and not isinstance(new, bool):
+            diff = abs(new - old)
+            if description.deadband is not None and diff < description.deadband:
+                return False
+            if description.deadband_rel is not None and diff < abs(old) * description.deadband_rel:
+                return False
+        return True
+
+    @callback
+    def _async_write_if_changed(self) -> None:
+        """Write the state if it changed (beyond the deadband) or reached its max_age."""
+        state = (self.available, self._state_value())
+        now = time.monotonic()
+        if self._written is not None:
+            max_age = self.description.max_age
+            expired = max_age is not None and now - self._written_at >= max_age
+            if not expired and state[0] == self._written[0] and not self._changed(self._written[1], state[1]):
+                return
+        self._written = state
+        self._written_at = now
+        self.async_write_ha_state()
+
 
 class HKVEntity(CoordinatorEntity, SensorEntity):
     """An entity using CoordinatorEntity."""
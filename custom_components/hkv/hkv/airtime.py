@@ -0,0 +1,197 @@
+'''LoRa airtime accounting and duty-cycle budget of the gateway.
+
+The airtime of a frame follows the Semtech formula (SX127x datasheet / AN1200.13)
+with the encoded frame size as payload. Totals are kept per node (frames sent
+to it, frames it sent) and for the gateway. With a ``duty_cycle`` the gateway
+transmissions within the sliding ``window`` are limited: polling is deferred
+first, config next, user actions only at the legal limit.
+
+Frames to and from the local node (serial, ``DST=0``) are not on air and are
+not counted by ``HKV``. A request the budget does not allow within its
+timeout raises ``HKVAirtimeDeferred``.
+'''
+from collections import deque
+from dataclasses import dataclass
+import math
+import time
+
+from .outbound import CONFIG, POLL, PRIORITY_NAMES, USER
+
+
+class HKVAirtimeDeferred(TimeoutError):
+    """The duty-cycle budget does not allow a request within its timeout, it was not sent."""
+
+    def __init__(self, wait: float):
+        super().__init__(f"airtime budget used up, free in {wait:.0f} s")
+        self.wait = wait
+
+
+@dataclass(slots=True)
+class HKVRadio:
+    """LoRa modulation parameters."""
+    sf: int = 9  # spreading factor 7..12
+    bw: int = 125000  # bandwidth in Hz
+    cr: int = 1  # coding rate 4/(4+cr)
+    preamble: int = 8
+    explicit_header: bool = True
+    crc: bool = True
+    overhead: int = 0  # bytes added to the encoded frame (addressing, MIC of the firmware)
+
+    @property
+    def low_data_rate(self) -> bool:
+        # mandatory for symbol times >= 16 ms
+        return (1 << self.sf) / self.bw >= 0.016
+
+    def airtime(self, size: int) -> float:
+        """Seconds on air of a ``size`` byte payload."""
+        t_sym = (1 << self.sf) / self.bw
+        de = 1 if self.low_data_rate else 0
+        ih = 0 if self.explicit_header else 1
+        payload = 8 * (size + self.overhead) - 4 * self.sf + 28 + 16 * self.crc - 20 * ih
+        n_payload = 8 + max(math.ceil(payload / (4 * (self.sf - 2 * de))) * (self.cr + 4), 0)
+        return (self.preamble + 4.25 + n_payload) * t_sym
+
+
+@dataclass(slots=True)
+class HKVAirtimeTotals:
+    frames_tx: int = 0  # to the node (gateway transmissions)
+    frames_rx: int = 0  # from the node
+    airtime_tx: float = 0.0
+    airtime_rx: float = 0.0
+
+
+# configure(): keep the current duty cycle (None switches it off)
+_UNCHANGED = object()
+
+
+class HKVAirtime:
+    """Airtime totals and the duty-cycle budget of the gateway.
+
+    ``duty_cycle`` is a fraction (0.01 for 1 %), ``None`` only accounts.
+    ``thresholds`` is the share of the budget a priority class may use.
+    """
+
+    THRESHOLDS = {USER: 1.0, CONFIG: 0.95, POLL: 0.8}
+
+    def __init__(self, radio: HKVRadio | None = None, duty_cycle: float | None = None, window: float = 3600.0,
+                 thresholds: dict[int, float] | None = None):
+        self.radio = radio or HKVRadio()
+        self.duty_cycle = duty_cycle
+        self.window = window
+        self.thresholds = dict(thresholds or self.THRESHOLDS)
+        self.nodes: dict[int, HKVAirtimeTotals] = {}
+        self.gateway = HKVAirtimeTotals()
+        self._sent: deque[tuple[float, float]] = deque()  # (time, airtime) of the gateway in the window
+        self._used = 0.0
+        self._cache: dict[int, float] = {}
+        self.deferred = {prio: 0 for prio in PRIORITY_NAMES}
+
+    def configure(self, radio: HKVRadio | None = None, duty_cycle: float | None = _UNCHANGED,
+                  window: float | None = None):
+        if radio is not None and radio != self.radio:
+            self.radio = radio
+            self._cache.clear()
+        if duty_cycle is not _UNCHANGED:
+            self.duty_cycle = duty_cycle
+        if window is not None:
+            self.window = window
+
+    def frame_airtime(self, size: int) -> float:
+        airtime = self._cache.get(size)
+        if airtime is None:
+            airtime = self._cache[size] = self.radio.airtime(size)
+        return airtime
+
+    def _totals(self, addr: int) -> HKVAirtimeTotals:
+        totals = self.nodes.get(addr)
+        if totals is None:
+            totals = self.nodes[addr] = HKVAirtimeTotals()
+        return totals
+
+    def tx(self, dst: int, size: int) -> float:
+        """A gateway transmission to ``dst`` (-1: broadcast), booked in the window by ``reserve()``."""
+        airtime = self.frame_airtime(size)
+        self.gateway.frames_tx += 1
+        self.gateway.airtime_tx += airtime
+        totals = self._totals(dst)
+        totals.frames_tx += 1
+        totals.airtime_tx += airtime
+        return airtime
+
+    def rx(self, src: int, size: int) -> float:
+        """A frame sent by node ``src``."""
+        airtime = self.frame_airtime(size)
+        self.gateway.frames_rx += 1
+        self.gateway.airtime_rx += airtime
+        totals = self._totals(src)
+        totals.frames_rx += 1
+        totals.airtime_rx += airtime
+        return airtime
+
+    def _expire(self, now: float):
+        sent = self._sent
+        while sent and sent[0][0] <= now - self.window:
+            self._used -= sent.popleft()[1]
+        if not sent:
+            self._used = 0.0  # no float drift
+
+    def used(self, now: float | None = None) -> float:
+        """Gateway airtime (seconds) within the window."""
+        self._expire(time.monotonic() if now is None else now)
+        return self._used
+
+    def reserve(self, priority: int, size: int, now: float | None = None) -> float:
+        """Seconds until a ``size`` byte frame of ``priority`` fits into the budget.
+
+        0: it fits now and its airtime is booked in the window right away, so
+        concurrent requests cannot all pass the check before one is sent.
+        A frame that is not sent after all is given back with ``release()``.
+        """
+        now = time.monotonic() if now is None else now
+        self._expire(now)
+        airtime = self.frame_airtime(size)
+        # without a duty cycle the window is only kept for the usage
+        limit = self.duty_cycle * self.window * self.thresholds.get(priority, 1.0) if self.duty_cycle else None
+        excess = self._used + airtime - limit if limit is not None else 0
+        if excess <= 0:
+            self._sent.append((now, airtime))
+            self._used += airtime
+            return 0.0
+        self.deferred[priority] = self.deferred.get(priority, 0) + 1
+        if airtime > limit:
+            return self.window
+        # wait for the oldest transmissions to leave the window
+        for at, used in self._sent:
+            excess -= used
+            if excess <= 0:
+                return at + self.window - now
+        return self.window
+
+    def release(self, size: int):
+        """Give back the booking of a ``size`` byte frame that was not sent after all."""
+        airtime = self.frame_airtime(size)
+        sent = self._sent
+        for i in range(len(sent) - 1, -1, -1):
+            if sent[i][1] == airtime:
+                del sent[i]
+                self._used = sum(used for _, used in sent)  # rare, no float drift
+                return
+
+    def stats(self) -> dict:
+        budget = self.duty_cycle * self.window if self.duty_cycle else None
+        used = self.used()
+        return dict(
+            radio=dict(sf=self.radio.sf, bw=self.radio.bw, cr=f"4/{4 + self.radio.cr}"),
+            duty_cycle=self.duty_cycle,
+            window=self.window,
+            used=used,
+            usage=used / budget if budget else None,
+            gateway=self._as_dict(self.gateway),
+            deferred={PRIORITY_NAMES[prio]: n for prio, n in self.deferred.items()},
+            nodes={addr: self._as_dict(totals) for addr, totals in self.nodes.items()},
+        )
+
+    @staticmethod
+    def _as_dict(totals: HKVAirtimeTotals) -> dict:
+        return dict(frames_tx=totals.frames_tx, frames_rx=totals.frames_rx,
+                    airtime_tx=round(totals.airtime_tx, 3), airtime_rx=round(totals.airtime_rx, 3))
@@ -0,0 +1,203 @@
+'''Capture of the serial traffic and replay of a capture into ``HKV``.
+
+File format (little endian)::
+
+    header  b"HKVCAP" + version (u8) + reserved (u8) + start time (f64, unix seconds)
+    record  offset (f64, seconds since start) + direction (u8, 0=RX 1=TX) + length (u32) + payload
+
+RX records are the chunks as they came from the port (before framing), so a
+replay reproduces the chunking as well as the timing.
+
+The writer never blocks the event loop: records are collected in memory and
+written (and the file closed) by a thread of its own. A capture stops
+recording at ``max_bytes``.
+
+    hkv.start_capture("/config/hkv.hkvcap", max_bytes=64 * 1024 * 1024)
+    ...
+    replay = HKVReplay("/config/hkv.hkvcap", speed=10)  # 0: as fast as possible
+    replay.attach(hkv)
+    await hkv.connect()
+    await replay.done
+'''
+import asyncio
+from collections.abc import Iterator
+from concurrent.futures import Future, ThreadPoolExecutor
+import logging
+import os
+import struct
+import time
+
+_LOGGER = logging.getLogger(__name__)
+
+MAGIC = b"HKVCAP"
+VERSION = 1
+RX = 0
+TX = 1
+
+_HEADER = struct.Struct("<6sBxd")
+_RECORD = struct.Struct("<dBI")
+
+
+class HKVCaptureWriter:
+    """Appends timestamped RX/TX records to a new capture file.
+
+    ``path`` must not exist, a capture never overwrites an older one.
+    """
+
+    def __init__(self, path: str, buffering: int = 64 * 1024, max_bytes: int | None = None):
+        self.path = path
+        self.max_bytes = max_bytes
+        self._file = open(path, "xb")
+        self._t0 = time.monotonic()
+        self._buffering = buffering
+        self._buffer = bytearray(_HEADER.pack(MAGIC, VERSION, time.time()))
+        self.size = len(self._buffer)
+        # one thread: the chunks are written in order
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="hkv-capture")
+        self.records = 0
+        self.full = False
+
+    def write(self, direction: int, data: bytes):
+        if self.full:
+            return
+        size = _RECORD.size + len(data)
+        if self.max_bytes is not None and self.size + size > self.max_bytes:
+            self.full = True
+            _LOGGER.warning(f"capture {self.path}: size limit of {self.max_bytes} bytes reached, recording stopped")
+            return
+        self._buffer += _RECORD.pack(time.monotonic() - self._t0, direction, len(data))
+        self._buffer += data
+        self.size += size
+        self.records += 1
+        if len(self._buffer) >= self._buffering:
+            self._flush()
+
+    def rx(self, data: bytes):
+        self.write(RX, data)
+
+    def tx(self, data: bytes):
+        self.write(TX, data)
+
+    def _flush(self):
+        chunk, self._buffer = bytes(self._buffer), bytearray()
+        self._executor.submit(self._file.write, chunk)
+
+    def close(self) -> Future:
+        """Write the rest and close the file in the writer thread, done when the future is."""
+        if self._buffer:
+            self._flush()
+        done = self._executor.submit(self._file.close)
+        self._executor.shutdown(wait=False)
+        return done
+
+
+def read_capture(path: str) -> tuple[float, list[tuple[float, int, bytes]]]:
+    """Start time and ``(offset, direction, payload)`` records of a capture."""
+    with open(path, "rb") as f:
+        data = f.read()
+    return parse_capture(data)
+
+
+def parse_capture(data: bytes) -> tuple[float, list[tuple[float, int, bytes]]]:
+    magic, version, start = _HEADER.unpack_from(data)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError(f"not an HKV capture (version {VERSION})")
+    return start, list(_records(data, _HEADER.size))
+
+
+def _records(data: bytes, pos: int) -> Iterator[tuple[float, int, bytes]]:
+    unpack = _RECORD.unpack_from
+    size = _RECORD.size
+    end = len(data)
+    while pos + size <= end:
+        offset, direction, length = unpack(data, pos)
+        pos += size
+        if pos + length > end:
+            _LOGGER.warning(f"capture: truncated record at {pos - size}")
+            return
+        yield offset, direction, data[pos:pos + length]
+        pos += length
+
+
+class HKVReplayTransport(asyncio.Transport):
+    """Transport of a replay: written requests are counted and dropped."""
+
+    def __init__(self, replay: "HKVReplay", protocol: asyncio.Protocol):
+        super().__init__()
+        self._replay = replay
+        self._protocol = protocol
+        self._closing = False
+
+    def write(self, data):
+        self._replay.written += 1
+
+    def is_closing(self):
+        return self._closing
+
+    def close(self):
+        if self._closing:
+            return
+        self._closing = True
+        self._replay._stop()
+        asyncio.get_running_loop().call_soon(self._protocol.connection_lost, None)
+
+    def abort(self):
+        self.close()
+
+    def get_extra_info(self, name, default=None):
+        return {"peername": "hkv-replay"}.get(name, default)
+
+
+class HKVReplay:
+    """Feeds the RX records of a capture into ``HKV``.
+
+    ``speed`` 1 replays at the recorded speed, 10 ten times faster and 0 as
+    fast as possible (the loop is still yielded to between records, so the
+    handlers keep up).
+    """
+
+    def __init__(self, path_or_records, speed: float = 1.0):
+        if isinstance(path_or_records, (str, os.PathLike)):
+            _, records = read_capture(path_or_records)
+        else:
+            records = path_or_records
+        self.records = [(offset, data) for offset, direction, data in records if direction == RX]
+        self.speed = speed
+        self.written = 0
+        self.fed = 0
+        self._task = None
+        self.done: asyncio.Future | None = None
+
+    def attach(self, hkv):
+        """Replay into ``hkv`` once it connects (``hkv.connect()``)."""
+        hkv.transport_factory = self.create_connection
+
+    async def create_connection(self, loop, protocol_factory):
+        protocol = protocol_factory()
+        transport = HKVReplayTransport(self, protocol)
+        protocol.connection_made(transport)
+        self.done = loop.create_future()
+        self._task = loop.create_task(self._feed(protocol))
+        return transport, protocol
+
+    def _stop(self):
+        if self._task is not None:
+            self._task.cancel()
+
+    async def _feed(self, protocol):
+        loop = asyncio.get_running_loop()
+        t0 = loop.time()
+        first = self.records[0][0] if self.records else 0.0
+        try:
+            for offset, data in self.records:
+                if self.speed > 0:
+                    delay = (offset - first) / self.speed - (loop.time() - t0)
+                    if delay > 0:
+                        await asyncio.sleep(delay)
+                else:
+                    await asyncio.sleep(0)
+                protocol.data_received(data)
+                self.fed += 1
+        finally:
+            if not self.done.done():
+                self.done.set_result(self.fed)
@@ -0,0 +1,79 @@
+'''JSON codecs for the HKV wire protocol.
+
+``get_codec()`` picks the fastest installed backend (orjson, ujson) and falls
+back to the stdlib ``json`` module. All codecs emit compact frames.
+'''
+import json
+import logging
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class JSONCodec:
+    """stdlib ``json`` backend."""
+
+    name = "json"
+    # reading the routing header with a regex is cheaper than parsing the frame
+    peek_header = True
+
+    def loads(self, doc: str | bytes | memoryview):
+        if isinstance(doc, memoryview):
+            # stdlib json needs str: decode straight from the frame view
+            doc = str(doc, "utf-8")
+        return json.loads(doc)
+
+    def dumps(self, obj) -> bytes:
+        return json.dumps(obj, separators=(",", ":")).encode()
+
+
+class OrjsonCodec(JSONCodec):
+    """orjson backend, parses frame views without a copy."""
+
+    name = "orjson"
+    peek_header = False
+
+    def __init__(self):
+        import orjson
+        self.loads = orjson.loads
+        self.dumps = orjson.dumps
+
+
+class UjsonCodec(JSONCodec):
+    """ujson backend."""
+
+    name = "ujson"
+
+    def __init__(self):
+        import ujson
+        self._ujson = ujson
+
+    def loads(self, doc: str | bytes | memoryview):
+        if isinstance(doc, memoryview):
+            doc = doc.tobytes()
+        return self._ujson.loads(doc)
+
+    def dumps(self, obj) -> bytes:
+        return self._ujson.dumps(obj, ensure_ascii=False).encode()
+
+
+CODECS = {
+    OrjsonCodec.name: OrjsonCodec,
+    UjsonCodec.name: UjsonCodec,
+    JSONCodec.name: JSONCodec,
+}
+
+
+def get_codec(name: str | None = None) -> JSONCodec:
+    """Return the codec ``name`` or the fastest installed one."""
+    if name is not None:
+        return CODECS[name]()
+    for cls in CODECS.values():
+        try:
+            return cls()
+        except ImportError:
+            continue
+    return JSONCodec()
+
+
+DEFAULT_CODEC = get_codec()
+_LOGGER.debug(f"JSON codec: {DEFAULT_CODEC.name}")
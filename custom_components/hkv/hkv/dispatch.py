@@ -0,0 +1,224 @@
+'''Packet dispatch to registered handlers.
+
+The receive path only appends packets to bounded per-subscriber queues, every
+handler drains its queue in its own task and every stream is drained by the
+``async for`` loop reading it. A slow consumer therefore never stalls the
+serial reader, it only loses packets according to its overflow policy.
+'''
+import asyncio
+import logging
+from collections import deque
+from collections.abc import Awaitable, Callable
+
+_LOGGER = logging.getLogger(__name__)
+
+DROP_OLDEST = "drop_oldest"
+DROP_NEWEST = "drop_newest"
+RAISE = "raise"  # streams only: end the stream with HKVStreamOverflow
+
+
+class HKVStreamOverflow(Exception):
+    """A stream with policy RAISE lost packets."""
+
+
+class HKVSubscriber:
+    """Bounded packet queue of one handler, drained by its own consumer task."""
+
+    def __init__(self, handler: Callable[..., Awaitable] | None, packet_types: tuple[type, ...] = (),
+                 src: set[int] | None = None, maxsize: int = 256, policy: str = DROP_OLDEST):
+        assert policy in (DROP_OLDEST, DROP_NEWEST, RAISE)
+        self.handler = handler
+        self.packet_types = packet_types
+        self.src = src
+        self.maxsize = maxsize
+        self.policy = policy
+        self._queue = deque()
+        self._waiter = None
+        self._task = None
+        self.delivered = 0
+        self.dropped = 0
+        self.max_depth = 0
+
+    @property
+    def depth(self) -> int:
+        return len(self._queue)
+
+    def put(self, packet):
+        """Queue ``packet`` (never blocks)."""
+        queue = self._queue
+        if len(queue) >= self.maxsize:
+            self.dropped += 1
+            if self.policy != DROP_OLDEST:
+                return
+            queue.popleft()
+        queue.append(packet)
+        if len(queue) > self.max_depth:
+            self.max_depth = len(queue)
+        self._notify()
+
+    def _notify(self):
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+        elif self._waiter is not None and not self._waiter.done():
+            self._waiter.set_result(None)
+
+    async def _run(self):
+        queue = self._queue
+        loop = asyncio.get_running_loop()
+        while True:
+            while queue:
+                packet = queue.popleft()
+                try:
+                    await self.handler(packet)
+                except Exception as e:
+                    _LOGGER.error(f"packet handler {self.handler} failed: {e}", exc_info=True)
+                self.delivered += 1
+            self._waiter = loop.create_future()
+            await self._waiter
+            self._waiter = None
+
+    def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        self._queue.clear()
+
+    def stats(self) -> dict:
+        return dict(
+            handler=getattr(self.handler, "__qualname__", repr(self.handler)),
+            types=[t.__name__ for t in self.packet_types],
+            src=sorted(self.src) if self.src is not None else None,
+            depth=self.depth,
+            max_depth=self.max_depth,
+            delivered=self.delivered,
+            dropped=self.dropped,
+        )
+
+
+class HKVStream(HKVSubscriber):
+    """Filtered packet stream, read with ``async for packet in stream``.
+
+    Packets are filtered by type and source before they are queued. Leaving
+    ``async with`` or calling :meth:`close` ends the subscription.
+    """
+
+    def __init__(self, dispatcher: "HKVDispatcher", packet_types: tuple[type, ...],
+                 src: set[int] | None = None, maxsize: int = 256, policy: str = DROP_OLDEST):
+        super().__init__(None, packet_types, src=src, maxsize=maxsize, policy=policy)
+        self._dispatcher = dispatcher
+        self._closed = False
+
+    def _notify(self):
+        if self._waiter is not None and not self._waiter.done():
+            self._waiter.set_result(None)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        queue = self._queue
+        while not queue:
+            if self.policy == RAISE and self.dropped:
+                raise HKVStreamOverflow(f"{self.dropped} packets dropped")
+            if self._closed:
+                raise StopAsyncIteration
+            self._waiter = asyncio.get_running_loop().create_future()
+            try:
+                await self._waiter
+            finally:
+                self._waiter = None
+        if self.policy == RAISE and self.dropped:
+            raise HKVStreamOverflow(f"{self.dropped} packets dropped")
+        self.delivered += 1
+        return queue.popleft()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        self.close()
+
+    def close(self):
+        """End the stream, packets already queued are still delivered."""
+        if self._closed:
+            return
+        self._closed = True
+        self._dispatcher.remove(self)
+        self._notify()
+
+
+class HKVDispatcher:
+    """Routes packets to subscribers, indexed by packet class.
+
+    The subscribers of a packet class are looked up along its MRO once and
+    cached until the subscriptions change.
+    """
+
+    def __init__(self):
+        self._subscribers: list[HKVSubscriber] = []
+        self._index: dict[type, tuple[HKVSubscriber, ...]] = {}
+
+    def __bool__(self):
+        return bool(self._subscribers)
+
+    def subscribe(self, handler: Callable[..., Awaitable], packet_type: type, **kwargs) -> HKVSubscriber:
+        """Subscribe ``handler`` to ``packet_type`` (and its subclasses).
+
+        A handler registered for several types shares one queue.
+        """
+        for sub in self._subscribers:
+            if sub.handler == handler:
+                if packet_type not in sub.packet_types:
+                    sub.packet_types += (packet_type,)
+                break
+        else:
+            sub = self.add(HKVSubscriber(handler, (packet_type,), **kwargs))
+        self._index.clear()
+        return sub
+
+    def stream(self, packet_types: tuple[type, ...], **kwargs) -> HKVStream:
+        return self.add(HKVStream(self, packet_types, **kwargs))
+
+    def add(self, sub: HKVSubscriber) -> HKVSubscriber:
+        self._subscribers.append(sub)
+        self._index.clear()
+        return sub
+
+    def remove(self, sub: HKVSubscriber):
+        if sub in self._subscribers:
+            self._subscribers.remove(sub)
+            self._index.clear()
+
+    def unsubscribe(self, handler: Callable[..., Awaitable]):
+        for sub in [sub for sub in self._subscribers if sub.handler == handler]:
+            sub.close()
+            self._subscribers.remove(sub)
+        self._index.clear()
+
+    def subscribers(self, cls: type) -> tuple[HKVSubscriber, ...]:
+        subs = self._index.get(cls)
+        if subs is None:
+            mro = cls.__mro__
+            subs = self._index[cls] = tuple(
+                sub for sub in self._subscribers if any(t in mro for t in sub.packet_types)
+            )
+        return subs
+
+    def wants(self, cls: type, src: int) -> bool:
+        """Is any subscriber interested in a ``cls`` packet from ``src``?"""
+        return any(sub.src is None or src in sub.src for sub in self.subscribers(cls))
+
+    def dispatch(self, packet):
+        """Queue ``packet`` for its subscribers."""
+        src = packet.SRC
+        for sub in self.subscribers(packet.__class__):
+            if sub.src is not None and src not in sub.src:
+                continue
+            sub.put(packet)
+
+    def close(self):
+        for sub in list(self._subscribers):
+            sub.close()
+
+    def stats(self) -> list[dict]:
+        return [sub.stats() for sub in self._subscribers]
@@ -0,0 +1,99 @@
+'''Incremental frame scanner for the HKV serial stream.
+
+The gateway sends one JSON object per line, terminated by ``}\\r\\n``.
+'''
+import logging
+
+_LOGGER = logging.getLogger(__name__)
+
+FRAME_END = b"}\r\n"
+
+
+class HKVFramer:
+    """Byte level frame scanner.
+
+    Received chunks are appended to a ``bytearray``. The scan position is
+    remembered between calls, so bytes already checked for a frame end are
+    never scanned again. Frames are returned as ``memoryview`` slices of the
+    buffer (no copy); the framer never resizes a buffer that is still referenced.
+    """
+
+    def __init__(self, max_size: int = 64 * 1024):
+        self._buf = bytearray()
+        self._scan = 0
+        self.max_size = max_size
+        self.frames = 0
+        self.ignored = 0
+        self.dropped = 0
+
+    def __len__(self):
+        return len(self._buf)
+
+    def reset(self):
+        """Drop all buffered bytes (resync)."""
+        self.dropped += len(self._buf)
+        self._buf = bytearray()
+        self._scan = 0
+
+    def feed(self, data: bytes) -> list[memoryview]:
+        """Append ``data`` and return every complete frame (``{`` … ``}``)."""
+        buf = self._buf
+        buf += data
+        find = buf.find
+        end = find(FRAME_END, self._scan)
+        if end < 0:
+            # kein Frame-Ende: nur anhängen, kein View und keine Kopie
+            if len(buf) > self.max_size:
+                self._overflow(len(buf))
+                buf.clear()
+            self._scan = max(0, len(buf) - 2)
+            return []
+        start = 0
+        view = None
+        frames = []
+        while end >= 0:
+            first = start
+            start = end + 3
+            end = find(FRAME_END, start)
+            frame_end = start - 3
+            if buf[first] != 0x7B:  # '{'
+                # Nicht-JSON-Zeilen (z. B. Bootmeldungen) vor dem Frame überspringen
+                first = self._skip_noise(first, frame_end)
+                if first < 0:
+                    continue
+            if view is None:
+                view = memoryview(buf)
+            frames.append(view[first:frame_end + 1])
+        self.frames += len(frames)
+
+        if len(buf) - start > self.max_size:
+            self._overflow(len(buf) - start)
+            start = len(buf)
+        if view is not None:
+            # the frames still reference the old buffer: only the unfinished tail is copied
+            self._buf = buf[start:]
+        else:
+            # nur verworfene Zeilen, der Puffer ist nicht referenziert
+            del buf[:start]
+        # keep the last bytes unscanned, they may be the beginning of FRAME_END
+        self._scan = max(0, len(self._buf) - 2)
+        return frames
+
+    def _overflow(self, size: int):
+        _LOGGER.warning(f"framer: no frame end within {self.max_size} bytes – resyncing buffer.")
+        self.dropped += size
+
+    def _skip_noise(self, first: int, end: int) -> int:
+        buf = self._buf
+        nl = buf.rfind(b"\n", first, end)
+        if nl >= 0:
+            _LOGGER.debug(f"framer: ignored line: {bytes(buf[first:nl + 1])!r}")
+            self.ignored += 1
+            first = nl + 1
+        while first < end and buf[first] in b" \t\r":
+            first += 1
+        if buf[first] != 0x7B:
+            _LOGGER.debug(f"framer: ignored line: {bytes(buf[first:end + 1])!r}")
+            self.ignored += 1
+            return -1
+        return first
@@ -1,13 +1,20 @@
 import asyncio
-import json
 import logging
 import time
-import contextlib
 from collections import defaultdict, deque
 from collections.abc import Callable, Iterable
+from concurrent.futures import Future
 import serial_asyncio
 
+from .airtime import HKVAirtime, HKVAirtimeDeferred
+from .capture import HKVCaptureWriter
+from .codec import DEFAULT_CODEC, JSONCodec, get_codec
+from .dispatch import DROP_OLDEST, HKVDispatcher, HKVStream
+from .framing import HKVFramer
+from .outbound import CONFIG, POLL, USER, HKVCommand, HKVOutbox, HKVPriorityWindow
+from .protocol import HKVProtocol
 from .packets import (
+    HKVLazyPacket,
     HKVAckPacket,
     HKVConnectionDataPacket,
     HKVHelloPacket,
@@ -23,171 +30,327 @@ from .packets import (
 
 _LOGGER = logging.getLogger(__name__)
 
+_LOG_LEVELS = defaultdict(
+    lambda: logging.CRITICAL,
+    {
+        "D": logging.DEBUG,
+        "I": logging.INFO,
+        "W": logging.WARNING,
+        "E": logging.ERROR,
+    },
+)
+
+# (TYPE, subtype) -> priority class of a command, everything else is polling
+_PRIORITIES = {
+    ("R", "S"): USER,
+    ("B", None): USER,
+    ("T", "C"): USER,
+    ("T", "P"): CONFIG,
+    ("T", "M"): CONFIG,
+    ("C", "A"): CONFIG,
+    ("C", "R"): CONFIG,
+    ("C", "C"): CONFIG,
+}
+# commands where a newer one to the same node (and CHAN) supersedes a waiting one
+_COALESCE = frozenset({("R", "S"), ("T", "P"), ("T", "M")})
+# subtype keys of the outbound commands (STYPE is a node type in the connection commands, so it is last)
+_SUBTYPES = ("RTYPE", "TTYPE", "CTYPE", "HTYPE", "STYPE")
+
+
+class HKVCollector:
+    """Responses of one broadcast request, at most one per node (``SRC``)."""
+
+    __slots__ = ("expect", "results", "nodes", "done")
+
+    def __init__(self, expect: type[HKVPacket], nodes: Iterable[int] | None = None):
+        self.expect = expect
+        self.results: dict[int, HKVPacket] = {}
+        self.nodes = set(nodes) if nodes is not None else None
+        self.done = asyncio.get_running_loop().create_future()
+
+    def add(self, packet: HKVPacket):
+        # the first answer of a node counts, repeated frames are ignored. A NAck is routed
+        # into every collector and may answer another request: the real reply replaces it
+        # and only real replies complete the round.
+        nack = isinstance(packet, HKVNAckPacket)
+        prev = self.results.get(packet.SRC)
+        if prev is not None and (nack or not isinstance(prev, HKVNAckPacket)):
+            return
+        self.results[packet.SRC] = packet
+        if self.nodes is not None and not nack and not self.done.done() and packet.SRC in self.nodes \
+                and all(self._answered(node) for node in self.nodes):
+            self.done.set_result(None)
+
+    def _answered(self, node: int) -> bool:
+        packet = self.results.get(node)
+        return packet is not None and not isinstance(packet, HKVNAckPacket)
+
 
 class HKV:
     """HKV device interface with robust serial receive handling."""
 
-    def __init__(self, name="HKV", addr=99):
+    def __init__(self, name="HKV", addr=99, max_inflight: int = 4, max_inflight_per_node: int = 1,
+                 codec: JSONCodec | str | None = None, lazy: bool = True):
         self.name = name
-        self._reader = None
-        self._writer = None
-        self._recv_task = None
+        self._codec = get_codec(codec) if isinstance(codec, str) else codec or DEFAULT_CODEC
+        self._transport = None
+        self._protocol = None
+        self._reconnect_task = None
+        self._closing = False
         self._addr = addr
         self._port = None
         self._baud = None
         self._timeout = 1
         self._reconnect_delay = 5  # seconds
-        self._events = {
-            HKVLogPacket: asyncio.Event(),
-            HKVHelloPacket: asyncio.Event(),
-            HKVAckPacket: asyncio.Event(),
-            HKVNAckPacket: asyncio.Event(),
-            HKVTempChannelPacket: asyncio.Event(),
-            HKVRelaisChannelPacket: asyncio.Event(),
-            HKVTempDataPacket: asyncio.Event(),
-            HKVRelaisDataPacket: asyncio.Event(),
-            HKVConnectionDataPacket: asyncio.Event(),
-            HKVStatusDataPacket: asyncio.Event(),
-        }
+        # async (loop, protocol_factory) -> (transport, protocol) replacing the serial port, e.g. the simulator
+        self.transport_factory = None
+        self._capture: HKVCaptureWriter | None = None
+        self._framer = HKVFramer()
+        # lazy: frames nobody waits for are kept undecoded (header only). Nur mit Header-Peek:
+        # orjson parst den ganzen Frame schneller als die Regex, da bringt es nichts
+        self._lazy = lazy and self._codec.peek_header
+        self._src_loggers = {}
+        # pending requests: (destination node, expected response type) -> future
+        self._pending: dict[tuple[int, type], asyncio.Future] = {}
+        self._key_locks = defaultdict(asyncio.Lock)
+        # broadcast requests collecting the responses of all nodes, by response type
+        self._collectors: dict[type, list[HKVCollector]] = defaultdict(list)
+        # request window of the gateway and per node, free slots go to user actions first
+        self._window = HKVPriorityWindow(max_inflight)
+        self._node_slots = defaultdict(lambda: HKVPriorityWindow(max_inflight_per_node))
+        # False: every command is served as polling (FIFO)
+        self.prioritize = True
+        self._coalescing: dict[tuple, HKVCommand] = {}
+        self.coalesced = 0
+        self._outbox = HKVOutbox(lambda: (self._transport, self._protocol))
+        # LoRa airtime of every frame on air, with a duty_cycle low priority requests are deferred
+        self.airtime = HKVAirtime()
+        self._local_addr = None  # address of the node attached to the serial port (DST=0)
         self._packets = deque(maxlen=10000)
         self._known_addr = []
         self._plock = asyncio.Lock()
-        self._handler = {}
-        self._block_handlers = False
+        self._dispatcher = HKVDispatcher()
 
     @property
     def connected(self):
-        return self._reader is not None and self._writer is not None
+        return self._transport is not None and not self._transport.is_closing()
+
+    @property
+    def local_addr(self) -> int | None:
+        """Address of the node at the serial port, ``None`` until ``identify()`` got its hello."""
+        return self._local_addr
+
+    async def identify(self, timeout=5) -> int | None:
+        """Learn the address of the local node (DST=0) from its hello reply.
+
+        Requests to DST=0 are only matched with the responses of this address.
+        """
+        if self._local_addr is None:
+            await self.hello(dst=0, timeout=timeout)
+        return self._local_addr
 
     # ---------------------------------------------------------------------
-    #  ROBUST RECEIVER TASK
+    #  RECEIVE PATH (called by HKVProtocol)
     # ---------------------------------------------------------------------
-    async def recv(self):
-        """Asynchronous receiver coroutine with error handling and resync logic."""
-        _LOGGER.info(f"recv[{self.name}]: Task started.")
-        buffer = ""
+    def _connection_made(self, protocol: HKVProtocol, transport: asyncio.Transport):
+        self._protocol = protocol
+        self._transport = transport
+        self._framer.reset()
 
-        while True:
+    def _connection_lost(self, protocol: HKVProtocol, exc: Exception | None):
+        if protocol is not self._protocol:
+            return
+        self._transport = None
+        self._protocol = None
+        if self._closing:
+            return
+        _LOGGER.error(f"recv[{self.name}]: connection lost: {exc}, attempting reconnect…")
+        if self._reconnect_task is None or self._reconnect_task.done():
+            self._reconnect_task = asyncio.get_running_loop().create_task(self._reconnect())
+
+    def _data_received(self, data: bytes):
+        """Split received bytes into frames and handle the packets."""
+        if _LOGGER.isEnabledFor(logging.DEBUG):
+            _LOGGER.debug(f"RX: {data}")
+        if self._capture is not None:
+            self._capture.rx(data)
+        # Mehrere JSON-Objekte in einem Chunk möglich
+        for frame in self._framer.feed(data):
             try:
-                data = await self._reader.read(256)
-                _LOGGER.debug(f"RX: {data}")
-                if not data:
-                    _LOGGER.warning(f"recv[{self.name}]: no data – possible disconnect.")
-                    await asyncio.sleep(1)
-                    continue
-            except (asyncio.IncompleteReadError, asyncio.TimeoutError):
-                await asyncio.sleep(0.1)
+                if self._lazy and (lazy := HKVLazyPacket.from_doc(frame, self._codec)) is not None:
+                    if lazy.SRC != self._local_addr:
+                        self.airtime.rx(lazy.SRC, len(frame))
+                    if not self._wanted(lazy):
+                        self._skip_packet(lazy)
+                        continue
+                    packet = lazy.decode()
+                else:
+                    packet = HKVPacket.from_doc(frame, self._codec)
+                    if packet.SRC != self._local_addr:
+                        self.airtime.rx(packet.SRC, len(frame))
+            except ValueError as e:
+                # JSONDecodeError/UnicodeDecodeError: the frame end already resyncs the stream
+                _LOGGER.warning(
+                    f"recv[{self.name}]: JSONDecodeError – skipping frame. {e}: {bytes(frame)!r}"
+                )
                 continue
             except Exception as e:
-                _LOGGER.error(f"recv[{self.name}]: read error: {e}")
-                await self._handle_serial_error(e)
+                _LOGGER.error(f"recv[{self.name}]: parse error: {e}", exc_info=True)
                 continue
-
-            # Dekodiere Bytes → String
             try:
-                text = data.decode("utf-8", errors="ignore")
+                self._handle_packet(packet)
             except Exception as e:
-                _LOGGER.error(f"recv[{self.name}]: decode error: {e}")
-                continue
-
-            buffer += text
-
-            # Mehrere JSON-Objekte in einem Chunk möglich
-            while "}\r\n" in buffer:
-                raw_line, buffer = buffer.split("}\r\n", 1)
-                line = (raw_line + "}").strip()
-
-                if not line or not line.startswith("{"):
-                    # Nicht-JSON-Zeilen (z. B. Bootmeldungen) überspringen
-                    _LOGGER.debug(f"recv[{self.name}]: ignored line: {line!r}")
-                    continue
-
-                try:
-                    packet = HKVPacket.from_doc(line)
-                except json.JSONDecodeError as e:
-                    _LOGGER.warning(
-                        f"recv[{self.name}]: JSONDecodeError – resyncing buffer. {e}: {line!r}"
-                    )
-                    buffer = ""
-                    break
-                except Exception as e:
-                    _LOGGER.error(f"recv[{self.name}]: parse error: {e}", exc_info=True)
-                    continue
-
-                await self._handle_packet(packet)
-            await asyncio.sleep(0)
+                _LOGGER.error(f"recv[{self.name}]: handle error: {e}", exc_info=True)
+
+    def _wanted(self, lazy: HKVLazyPacket) -> bool:
+        """Does a waiter, handler or enabled logger need the body of this frame?"""
+        src = lazy.SRC
+        if lazy.TYPE == 'L':
+            return self._src_logger(src).isEnabledFor(_LOG_LEVELS[lazy.SUBTYPE])
+        if _LOGGER.isEnabledFor(logging.DEBUG):
+            return True
+        pcls = lazy.packet_class
+        if self._collectors and (pcls in self._collectors or pcls is HKVNAckPacket):
+            return True
+        if self._pending:
+            nodes = self._pending_nodes(src, pcls)
+            if any(node in nodes and (cls is pcls or pcls is HKVNAckPacket) for node, cls in self._pending):
+                return True
+        return self._dispatcher.wants(pcls, src)
+
+    def _src_logger(self, src: int) -> logging.Logger:
+        logger = self._src_loggers.get(src)
+        if logger is None:
+            logger = self._src_loggers[src] = logging.getLogger(f"{__name__}.SRC{src}")
+        return logger
+
+    def _skip_packet(self, lazy: HKVLazyPacket):
+        # the body is not checked yet: the node is recorded when packets_pop decodes it
+        if lazy.TYPE != 'L':
+            self._packets.append(lazy.keep())
 
     # ---------------------------------------------------------------------
-    async def _handle_packet(self, packet: HKVPacket):
+    def _handle_packet(self, packet: HKVPacket):
         """Verarbeitet erfolgreich empfangene Pakete."""
         if packet.SRC not in self._known_addr:
             self._known_addr.append(packet.SRC)
 
         if isinstance(packet, HKVLogPacket):
-            levels = defaultdict(lambda: logging.CRITICAL)
-            levels.update(
-                {
-                    "D": logging.DEBUG,
-                    "I": logging.INFO,
-                    "W": logging.WARNING,
-                    "E": logging.ERROR,
-                }
-            )
-            logging.getLogger(f"{__name__}.SRC{packet.SRC}").log(
-                levels[packet.LTYPE], f"{packet.MSG}"
+            self._src_logger(packet.SRC).log(
+                _LOG_LEVELS[packet.LTYPE], f"{packet.MSG}"
             )
             return
 
-        _LOGGER.debug(f"HKV[{self.name}]: {packet}")
-        event = self._events.get(packet.__class__)
-        if event:
-            event.param = packet
-            event.set()
-
-        async with self._plock:
-            self._packets.append(packet)
-
-        if not self._block_handlers and self._handler:
-            await asyncio.gather(
-                *[
-                    asyncio.create_task(h(packet))
-                    for pt, handlers in self._handler.items()
-                    if isinstance(packet, pt)
-                    for h in handlers.copy()
-                ]
-            )
+        if _LOGGER.isEnabledFor(logging.DEBUG):
+            _LOGGER.debug(f"HKV[{self.name}]: {packet}")
+        if self._collectors:
+            self._collect(packet)
+        if self._pending:
+            self._resolve_pending(packet)
+
+        self._packets.append(packet)
+
+        # only queues the packet, handlers and streams are drained elsewhere
+        self._dispatcher.dispatch(packet)
+
+    def _pending_nodes(self, src: int, pcls: type) -> list[int]:
+        """Request destinations a packet of type ``pcls`` from ``src`` may answer."""
+        nodes = [src]
+        if src == self._local_addr or (self._local_addr is None and pcls is HKVHelloPacket):
+            # the local address is only learned from the hello reply of DST=0 (see identify),
+            # nodes push data packets but never a hello on their own
+            nodes.append(0)
+        nodes.append(-1)
+        return nodes
+
+    def _resolve_pending(self, packet: HKVPacket):
+        """Hand a response to the request waiting for it (matched by SRC)."""
+        src = packet.SRC
+        nodes = self._pending_nodes(src, packet.__class__)
+        if isinstance(packet, HKVNAckPacket):
+            keys = [key for key in self._pending if key[0] in nodes]
+        else:
+            keys = [(node, packet.__class__) for node in nodes]
+        for key in keys:
+            fut = self._pending.get(key)
+            if fut is not None and not fut.done():
+                if key[0] == 0 and self._local_addr is None and isinstance(packet, HKVHelloPacket):
+                    self._local_addr = src
+                    _LOGGER.info(f"HKV[{self.name}]: local node is {src}")
+                fut.set_result(packet)
+                return
+
+    def _collect(self, packet: HKVPacket):
+        """Add a response to the broadcast requests waiting for its type."""
+        if isinstance(packet, HKVNAckPacket):
+            collectors = [c for cs in self._collectors.values() for c in cs]
+        else:
+            collectors = self._collectors.get(packet.__class__, ())
+        for collector in collectors:
+            collector.add(packet)
 
     # ---------------------------------------------------------------------
-    async def _handle_serial_error(self, error: Exception):
-        """Bei schwerem Fehler serielle Schnittstelle neu öffnen."""
-        _LOGGER.error(f"recv[{self.name}]: Serial error: {error}, attempting reconnect…")
-        await self._reconnect()
+    async def _open(self):
+        loop = asyncio.get_running_loop()
+        if self.transport_factory is not None:
+            await self.transport_factory(loop, lambda: HKVProtocol(self))
+            return
+        await serial_asyncio.create_serial_connection(
+            loop, lambda: HKVProtocol(self), self._port, baudrate=self._baud, timeout=self._timeout
+        )
 
     async def _reconnect(self):
-        """Schließt und öffnet den Port neu."""
+        """Öffnet den Port neu, bis es klappt."""
         if not self._port:
             _LOGGER.warning(f"recv[{self.name}]: no port info, cannot reconnect.")
             return
-        with contextlib.suppress(Exception):
-            if self._writer:
-                self._writer.close()
-        await asyncio.sleep(self._reconnect_delay)
-        try:
-            self._reader, self._writer = await serial_asyncio.open_serial_connection(
-                url=self._port, baudrate=self._baud, timeout=1
-            )
-            _LOGGER.info(f"recv[{self.name}]: reconnected to {self._port}")
-        except Exception as e:
-            _LOGGER.error(f"recv[{self.name}]: reconnect failed: {e}")
+        while not self._closing and not self.connected:
             await asyncio.sleep(self._reconnect_delay)
-
-
-    def register_packet_handler(self, handler: Callable, packet_type: HKVPacket):
-        """Register handlers for spezific paket types."""
-        handlers = self._handler.get(packet_type, [])
-        if handler in handlers: return
-        handlers.append(handler)
-        self._handler[packet_type] = handlers
+            try:
+                await self._open()
+                _LOGGER.info(f"recv[{self.name}]: reconnected to {self._port}")
+            except Exception as e:
+                _LOGGER.error(f"recv[{self.name}]: reconnect failed: {e}")
+
+    def register_packet_handler(self, handler: Callable, packet_type: HKVPacket, maxsize: int = 256, policy: str = DROP_OLDEST):
+        """Register handlers for spezific paket types.
+
+        Every handler gets a queue of ``maxsize`` packets, ``policy`` decides
+        which packet is dropped if the handler does not keep up.
+        """
+        self._dispatcher.subscribe(handler, packet_type, maxsize=maxsize, policy=policy)
+
+    def unregister_packet_handler(self, handler: Callable):
+        self._dispatcher.unsubscribe(handler)
+
+    def subscribe(self, types: type | Iterable[type] | None = None, src: int | Iterable[int] | None = None,
+                  maxsize: int = 256, policy: str = DROP_OLDEST) -> HKVStream:
+        """Live packet stream filtered by packet ``types`` and source node(s) ``src``.
+
+            async with hkv.subscribe(types=HKVTempDataPacket, src=6915016) as stream:
+                async for packet in stream:
+                    ...
+        """
+        if types is None:
+            types = (HKVPacket,)
+        elif isinstance(types, type):
+            types = (types,)
+        if src is not None:
+            src = {int(src)} if isinstance(src, int) else {int(s) for s in src}
+        return self._dispatcher.stream(tuple(types), src=src, maxsize=maxsize, policy=policy)
+
+    def handler_stats(self) -> list[dict]:
+        """Queue depth, delivered and dropped packets of every handler and stream."""
+        return self._dispatcher.stats()
+
+    def write_stats(self) -> dict:
+        """Frames and write() calls of the outbox, coalesced commands."""
+        return dict(writes=self._outbox.writes, frames=self._outbox.frames, queued=len(self._outbox),
+                    coalesced=self.coalesced)
+
+    def airtime_stats(self) -> dict:
+        """Airtime totals of the gateway and per node, duty-cycle usage."""
+        return self.airtime.stats()
 
     async def packets_pop(self):
         """Remove all received packets from internal list and return them."""
@@ -197,86 +360,129 @@ class HKV:
             self._packets.clear()
         finally:
             self._plock.release()
-        return packets
+        result = []
+        for p in packets:
+            if isinstance(p, HKVLazyPacket):
+                try:
+                    p = p.decode()
+                except ValueError as e:
+                    _LOGGER.warning(
+                        f"recv[{self.name}]: JSONDecodeError – skipping frame. {e}: {p._doc!r}"
+                    )
+                    continue
+                except Exception as e:
+                    _LOGGER.error(f"recv[{self.name}]: parse error: {e}", exc_info=True)
+                    continue
+                if p.SRC not in self._known_addr:
+                    self._known_addr.append(p.SRC)
+            result.append(p)
+        return result
+
+    def configure(self, timeout: float | None = None, max_inflight: int | None = None,
+                  max_inflight_per_node: int | None = None):
+        """Change the serial timeout and the request windows without reconnecting.
+
+        The timeout is used from the next (re)connect on: the transport of an
+        open port needs a non-blocking serial (``timeout=0``), a timeout on it
+        would block the event loop in every read. Requests already holding a
+        slot release it on the old semaphore.
+        """
+        if timeout is not None:
+            self._timeout = timeout
+        if max_inflight is not None:
+            self._window = HKVPriorityWindow(max_inflight)
+        if max_inflight_per_node is not None:
+            # keep the known nodes, see _pending_nodes
+            self._node_slots = defaultdict(lambda: HKVPriorityWindow(max_inflight_per_node),
+                                           {addr: HKVPriorityWindow(max_inflight_per_node) for addr in self._node_slots})
+        _LOGGER.info(f"[{self.name}] configured: {timeout=}, {max_inflight=}, {max_inflight_per_node=}")
+
+    def start_capture(self, path: str, max_bytes: int | None = None):
+        """Record all RX/TX bytes to the new file ``path`` (see capture.py), replaces a running capture.
+
+        Opens the file, so call it from an executor in an event loop.
+        """
+        self.stop_capture()
+        self._capture = HKVCaptureWriter(path, max_bytes=max_bytes)
+        _LOGGER.info(f"[{self.name}] capturing serial traffic to {path}")
+
+    def stop_capture(self) -> Future | None:
+        """Stop the capture, the file is closed in the writer thread (done with the returned future)."""
+        capture, self._capture = self._capture, None
+        if capture is None:
+            return None
+        _LOGGER.info(f"[{self.name}] capture {capture.path} closed ({capture.records} records, {capture.size} bytes)")
+        return capture.close()
+
+    @property
+    def capturing(self) -> bool:
+        return self._capture is not None
 
     # ---------------------------------------------------------------------
     async def connect(self, port: str = "/dev/ttyUSB0", baud: int = 115200, timeout: float = 0.5):
-        """Connect to HKV device via serial port and start receiver task."""
+        """Connect to HKV device via serial port."""
         self._port = port
         self._baud = baud
         self._timeout = timeout
-        self._reader, self._writer = await serial_asyncio.open_serial_connection(
-            url=port, baudrate=baud, timeout=timeout
-        )
-        self._recv_task = asyncio.create_task(self.recv())
+        self._closing = False
+        await self._open()
         _LOGGER.info(f"[{self.name}] Connected to {port} @ {baud} baud. (timeout={timeout})")
 
     async def disconnect(self):
-        """Stop receiver and close port."""
-        if self._recv_task:
-            with contextlib.suppress(asyncio.CancelledError):
-                self._recv_task.cancel()
-        if self._writer:
-            self._writer.close()
+        """Close port."""
+        self._closing = True
+        capture_closed = self.stop_capture()
+        self._outbox.close()
+        self._dispatcher.close()
+        if self._reconnect_task:
+            self._reconnect_task.cancel()
+        if self._transport:
+            self._transport.close()
+        if capture_closed is not None:
+            await asyncio.wrap_future(capture_closed)
         _LOGGER.info(f"[{self.name}] Disconnected.")
 
     async def reboot(self, dst: int = 0, timeout=10):
         """Reboot command."""
-        evt = self._events[HKVAckPacket]
-        evt_err = self._events[HKVNAckPacket]
-        return await self._write(evt, evt_err, SRC=self._addr, DST=int(dst), TYPE="B", timeout=timeout)
+        return await self._write(HKVAckPacket, SRC=self._addr, DST=int(dst), TYPE="B", timeout=timeout)
 
-    async def hello(self, dst: int = 0, timeout=10):
+    async def hello(self, dst: int = 0, timeout=10, collect: bool = False, nodes: Iterable[int] | None = None):
         """Hello command."""
-        evt = self._events[HKVHelloPacket]
-        evt_err = self._events[HKVNAckPacket]
-        return await self._write(evt, evt_err, SRC=self._addr, DST=int(dst), TYPE="H", HTYPE="R", timeout=timeout)
+        return await self._write(HKVHelloPacket, SRC=self._addr, DST=int(dst), TYPE="H", HTYPE="R", timeout=timeout,
+                                 collect=collect, nodes=nodes)
 
-    async def get_status(self, dst: int = 0, timeout=5):
+    async def get_status(self, dst: int = 0, timeout=5, collect: bool = False, nodes: Iterable[int] | None = None):
         """Get status command."""
-        evt = self._events[HKVStatusDataPacket]
-        evt_err = self._events[HKVNAckPacket]
-        return await self._write(evt, evt_err, SRC=self._addr, DST=int(dst), TYPE="S", STYPE="G", timeout=timeout)
+        return await self._write(HKVStatusDataPacket, SRC=self._addr, DST=int(dst), TYPE="S", STYPE="G", timeout=timeout,
+                                 collect=collect, nodes=nodes)
 
     async def get_connections(self, dst: int = 0, timeout=5):
         """Get connections command."""
-        evt = self._events[HKVConnectionDataPacket]
-        evt_err = self._events[HKVNAckPacket]
-        return await self._write(evt, evt_err, SRC=self._addr, DST=int(dst), TYPE="C", CTYPE="G", timeout=timeout)
+        return await self._write(HKVConnectionDataPacket, SRC=self._addr, DST=int(dst), TYPE="C", CTYPE="G", timeout=timeout)
 
     async def add_connection(self, addr: int, stype: int, dst: int = 0, timeout=5):
-        evt = self._events[HKVAckPacket]
-        evt_err = self._events[HKVNAckPacket]
-        return await self._write(evt, evt_err, SRC=self._addr, DST=int(dst), TYPE="C", CTYPE="A", ADDR=int(addr), STYPE=int(stype), timeout=timeout)
+        return await self._write(HKVAckPacket, SRC=self._addr, DST=int(dst), TYPE="C", CTYPE="A", ADDR=int(addr), STYPE=int(stype), timeout=timeout)
 
     async def remove_connection(self, addr: int, stype: int, dst: int = 0, timeout=5):
-        evt = self._events[HKVAckPacket]
-        evt_err = self._events[HKVNAckPacket]
-        return await self._write(evt, evt_err, SRC=self._addr, DST=int(dst), TYPE="C", CTYPE="R", ADDR=int(addr), STYPE=int(stype), timeout=timeout)
+        return await self._write(HKVAckPacket, SRC=self._addr, DST=int(dst), TYPE="C", CTYPE="R", ADDR=int(addr), STYPE=int(stype), timeout=timeout)
 
     async def clear_connections(self, dst: int = 0, timeout=5):
-        evt = self._events[HKVAckPacket]
-        evt_err = self._events[HKVNAckPacket]
-        return await self._write(evt, evt_err, SRC=self._addr, DST=int(dst), TYPE="C", CTYPE="C", timeout=timeout)
+        return await self._write(HKVAckPacket, SRC=self._addr, DST=int(dst), TYPE="C", CTYPE="C", timeout=timeout)
 
-    async def get_relais(self, *chan, dst: int = 0, timeout=5):
-        evt_err = self._events[HKVNAckPacket]
+    async def get_relais(self, *chan, dst: int = 0, timeout=5, collect: bool = False, nodes: Iterable[int] | None = None):
         if len(chan):
-            evt = self._events[HKVRelaisChannelPacket]
             res = []
             for c in chan:
-                res.append(await self._write(evt, evt_err, SRC=self._addr, DST=int(dst), TYPE="R", RTYPE="G", CHAN=c, timeout=timeout))
+                res.append(await self._write(HKVRelaisChannelPacket, SRC=self._addr, DST=int(dst), TYPE="R", RTYPE="G", CHAN=c, timeout=timeout))
             return res if len(res) > 1 else res[0]
         else:
-            evt = self._events[HKVRelaisDataPacket]
-            return await self._write(evt, evt_err, SRC=self._addr, DST=int(dst), TYPE="R", RTYPE="G", timeout=timeout)
+            return await self._write(HKVRelaisDataPacket, SRC=self._addr, DST=int(dst), TYPE="R", RTYPE="G", timeout=timeout,
+                                     collect=collect, nodes=nodes)
 
     async def set_relais(self, *vals, dst: int = 0, timeout=5):
         assert len(vals) > 0
-        evt = self._events[HKVAckPacket]
-        evt_err = self._events[HKVNAckPacket]
         if len(vals) == 1 and not isinstance(vals[0], Iterable):
-            return await self._write(evt, evt_err, SRC=self._addr, DST=int(dst), TYPE="R", RTYPE="S", VAL=vals[0], timeout=timeout)
+            return await self._write(HKVAckPacket, SRC=self._addr, DST=int(dst), TYPE="R", RTYPE="S", VAL=vals[0], timeout=timeout)
         else:
             res = []
             chan = 0
@@ -286,78 +492,201 @@ class HKV:
                 else:
                     chan += 1
                     val = v
-                res.append(await self._write(evt, evt_err, SRC=self._addr, DST=int(dst), TYPE="R", RTYPE="S", CHAN=chan, VAL=val, timeout=timeout))
+                res.append(await self._write(HKVAckPacket, SRC=self._addr, DST=int(dst), TYPE="R", RTYPE="S", CHAN=chan, VAL=val, timeout=timeout))
             return res
 
     async def calibrate_temps(self, dst: int = 0, timeout=5):
-        evt = self._events[HKVAckPacket]
-        evt_err = self._events[HKVNAckPacket]
-        return await self._write(evt, evt_err, SRC=self._addr, DST=int(dst), TYPE="T", TTYPE="C", timeout=timeout)
+        return await self._write(HKVAckPacket, SRC=self._addr, DST=int(dst), TYPE="T", TTYPE="C", timeout=timeout)
 
-    async def get_temps(self, *chan, dst: int = 0, timeout=5):
-        evt_err = self._events[HKVNAckPacket]
+    async def get_temps(self, *chan, dst: int = 0, timeout=5, collect: bool = False, nodes: Iterable[int] | None = None):
         if len(chan):
-            evt = self._events[HKVTempChannelPacket]
             res = []
             for c in chan:
-                res.append(await self._write(evt, evt_err, SRC=self._addr, DST=int(dst), TYPE="T", TTYPE="G", CHAN=int(c), timeout=timeout))
+                res.append(await self._write(HKVTempChannelPacket, SRC=self._addr, DST=int(dst), TYPE="T", TTYPE="G", CHAN=int(c), timeout=timeout))
             return res if len(res) > 1 else res[0]
         else:
-            evt = self._events[HKVTempDataPacket]
-            return await self._write(evt, evt_err, SRC=self._addr, DST=int(dst), TYPE="T", TTYPE="G", timeout=timeout)
+            return await self._write(HKVTempDataPacket, SRC=self._addr, DST=int(dst), TYPE="T", TTYPE="G", timeout=timeout,
+                                     collect=collect, nodes=nodes)
 
-    async def set_temps_transmit_period(self, delay=None, period=None, dst: int = 0, timeout=5):
+    async def set_temps_transmit_period(self, delay=None, period=None, dst: int = 0, timeout=5,
+                                        collect: bool = False, nodes: Iterable[int] | None = None):
         kargs = {}
         if delay is not None: kargs['DELAY'] = int(delay)
         if period is not None: kargs['PERIOD'] = int(period)
-        evt = self._events[HKVAckPacket]
-        evt_err = self._events[HKVNAckPacket]
-        return await self._write(evt, evt_err, SRC=self._addr, DST=int(dst), TYPE="T", TTYPE="P", timeout=timeout, **kargs)
+        return await self._write(HKVAckPacket, SRC=self._addr, DST=int(dst), TYPE="T", TTYPE="P", timeout=timeout,
+                                 collect=collect, nodes=nodes, **kargs)
 
-    async def set_temps_measure_period(self, delay=None, period=None, dst: int = 0, timeout=5):
+    async def set_temps_measure_period(self, delay=None, period=None, dst: int = 0, timeout=5,
+                                       collect: bool = False, nodes: Iterable[int] | None = None):
         kargs = {}
         if delay is not None: kargs['DELAY'] = int(delay)
         if period is not None: kargs['PERIOD'] = int(period)
-        evt = self._events[HKVAckPacket]
-        evt_err = self._events[HKVNAckPacket]
-        return await self._write(evt, evt_err, SRC=self._addr, DST=int(dst), TYPE="T", TTYPE="M", timeout=timeout, **kargs)
+        return await self._write(HKVAckPacket, SRC=self._addr, DST=int(dst), TYPE="T", TTYPE="M", timeout=timeout,
+                                 collect=collect, nodes=nodes, **kargs)
+
+    async def _write(self, expect: type[HKVPacket] | None = None, timeout=5, collect: bool = False,
+                     nodes: Iterable[int] | None = None, **kw):
+        op = (kw.get('TYPE'), next((kw[k] for k in _SUBTYPES if k in kw), None))
+        priority = _PRIORITIES.get(op, POLL) if self.prioritize else POLL
+        data = self._codec.dumps(kw) + b'\n'
+        dst = kw.get('DST', 0)
+        booked = 0
+        if self._on_air(dst):
+            # duty-cycle budget nearly used up: wait for it within the timeout, else the request
+            # is not sent. Checked again after the wait, requests deferred together wake together.
+            # The booking is given back if the frame is not sent after all (coalesced, send error).
+            deadline = time.monotonic() + timeout
+            while wait := self.airtime.reserve(priority, len(data)):
+                if wait > deadline - time.monotonic():
+                    _LOGGER.debug(f"airtime budget used up, deferred {kw} (free in {wait:.0f} s)")
+                    raise HKVAirtimeDeferred(wait)
+                await asyncio.sleep(wait)
+            booked = len(data)
+        if collect:
+            return await self._broadcast_raw(data, expect=expect, window=timeout, nodes=nodes, priority=priority,
+                                             booked=booked)
+        if op in _COALESCE:
+            return await self._write_coalesced((dst, *op, kw.get('CHAN')), data, expect, timeout, priority, booked)
+        return await self._write_raw(data, dst=dst, expect=expect, timeout=timeout, priority=priority, booked=booked)
+
+    def _on_air(self, dst: int) -> bool:
+        """Is a frame to ``dst`` sent over LoRa (not only to the node at the serial port)?"""
+        return dst != 0 and dst != self._local_addr
+
+    async def _write_coalesced(self, key: tuple, data, expect, timeout, priority, booked: int = 0):
+        """Send a command that supersedes older ones to the same node/channel.
+
+        If such a command is still waiting for its slot, only its payload is
+        replaced and both callers get the result of the one request. The
+        request runs in a task of its own: it is only cancelled when every
+        caller waiting for it was cancelled, so a cancelled first caller does
+        not drop the newer value of another one.
+        """
+        command = self._coalescing.get(key)
+        if command is not None:
+            command.data = data
+            self.coalesced += 1
+            if booked:
+                # one frame for both: the waiting command holds the airtime already
+                self.airtime.release(booked)
+            _LOGGER.debug(f"coalesced {data} into a waiting command")
+        else:
+            command = self._coalescing[key] = HKVCommand(data)
+            command.result = asyncio.get_running_loop().create_task(
+                self._send_coalesced(key, command, expect, timeout, priority, booked))
+        command.waiters += 1
+        try:
+            return await asyncio.shield(command.result)
+        finally:
+            command.waiters -= 1
+            if not command.waiters and not command.result.done():
+                command.result.cancel()
 
-    async def _write(self, evt=None, evt_err=None, timeout=5, **kw):
-        data = json.dumps(kw) + '\n'
-        return await self._write_raw(data, evt=evt, evt_err=evt_err, timeout=timeout)
+    async def _send_coalesced(self, key: tuple, command: HKVCommand, expect, timeout, priority, booked: int = 0):
+        try:
+            return await self._write_raw(command.data, dst=key[0], expect=expect, timeout=timeout, priority=priority,
+                                         coalesce=key, booked=booked)
+        finally:
+            if self._coalescing.get(key) is command:
+                del self._coalescing[key]
+
+    async def _broadcast_raw(self, data, expect: type[HKVPacket], window=5, nodes: Iterable[int] | None = None,
+                             priority: int = POLL, booked: int = 0):
+        """Send a broadcast (DST=-1) and collect the responses of all nodes for ``window`` seconds.
+
+        Collecting stops early once every node in ``nodes`` has answered.
+        Returns ``(success, {src: packet})``, success if any node answered
+        without NAck. ``booked``: size of the frame reserved in the airtime
+        budget, given back if it is not sent.
+        """
+        key = (-1, expect)
+        sent = False
+        try:
+            async with self._key_locks[key], self._node_slots[-1].slot(priority), self._window.slot(priority):
+                collector = HKVCollector(expect, nodes)
+                self._collectors[expect].append(collector)
+                try:
+                    if not (sent := await self._send(data, priority, dst=-1)):
+                        return False, {}
+                    try:
+                        async with asyncio.timeout(window):
+                            await collector.done
+                    except TimeoutError:
+                        if collector.nodes is not None:
+                            missing = sorted(collector.nodes - collector.results.keys())
+                            _LOGGER.info(f"broadcast {expect.__name__}: no response from {missing} within {window} seconds")
+                finally:
+                    collectors = self._collectors[expect]
+                    collectors.remove(collector)
+                    if not collectors:
+                        del self._collectors[expect]
+                results = collector.results
+                return any(not isinstance(p, HKVNAckPacket) for p in results.values()), results
+        finally:
+            if booked and not sent:
+                self.airtime.release(booked)
+
+    async def _write_raw(self, data, dst: int = 0, expect: type[HKVPacket] | None = None, timeout=5,
+                         priority: int = POLL, coalesce: tuple | None = None, booked: int = 0):
+        """Send ``data`` to ``dst`` and wait for the response of type ``expect`` from that node.
+
+        At most ``max_inflight_per_node`` requests per node and
+        ``max_inflight`` requests in total are on the air at a time.
+        Returns ``(success, packet)``. ``booked``: size of the frame reserved
+        in the airtime budget, given back if it is not sent.
+        """
+        key = (dst, expect)
+        sent = False
+        try:
+            async with self._key_locks[key], self._node_slots[dst].slot(priority), self._window.slot(priority):
+                if coalesce is not None:
+                    # from here on newer commands queue a new request, send the latest payload
+                    data = self._coalescing.pop(coalesce).data
+                fut = None
+                if expect is not None:
+                    fut = asyncio.get_running_loop().create_future()
+                    self._pending[key] = fut
+                try:
+                    if not (sent := await self._send(data, priority, dst=dst)):
+                        return False, None
+                    if fut is None:
+                        return False, None
+                    starttime = time.time()
+                    try:
+                        async with asyncio.timeout(timeout):
+                            packet = await fut
+                    except TimeoutError:
+                        _LOGGER.warning(f"Write timeout of {timeout} seconds reached! (measured; {time.time()-starttime} seconds, {dst=}, {expect.__name__})")
+                        return False, None
+                    return not isinstance(packet, HKVNAckPacket), packet
+                finally:
+                    if fut is not None and self._pending.get(key) is fut:
+                        del self._pending[key]
+        finally:
+            if booked and not sent:
+                # the frame never went out (send error, cancelled while waiting for its slot)
+                self.airtime.release(booked)
 
-    async def _write_raw(self, data, evt=None, evt_err=None, timeout=5):
+    async def _send(self, data, priority: int = POLL, dst: int | None = None):
+        """Queue ``data`` in the outbox, returns once it was written (batched with other frames)."""
         retry = 3
         while retry > 0:
             try:
-                self._writer.write(data.encode())
-                await self._writer.drain()
+                if not self.connected:
+                    raise ConnectionError("not connected")
+                data = data.encode() if isinstance(data, str) else data
+                await self._outbox.send(data, priority)
+                if self._capture is not None:
+                    self._capture.tx(data)
+                if dst is not None and self._on_air(dst):
+                    self.airtime.tx(dst, len(data))
                 _LOGGER.info(f"{len(data)} bytes written. (data: {data}")
-                if evt:
-                    evt.clear()
-                    if evt_err is None:
-                        evt_err = self._events[HKVNAckPacket]
-                    evt_err.clear()
-                    starttime = time.time()
-                    done, pending = await asyncio.wait([
-                        asyncio.create_task(evt.wait()), 
-                        asyncio.create_task(evt_err.wait())],
-                        timeout=timeout, return_when=asyncio.FIRST_COMPLETED
-                    )
-                    _LOGGER.debug(f"{len(done)=}, {len(pending)=}")
-                    for p in pending:
-                        p.cancel()
-                    if evt.is_set():
-                        return True, evt.param
-                    if evt_err.is_set():
-                        return False, evt_err.param
-                    _LOGGER.warning(f"Write timeout of {timeout} seconds reached! (measured; {time.time()-starttime} seconds)")
-                return False, None
+                return True
             except Exception as e:
                 _LOGGER.error(f"Write error: {e}")
                 retry -= 1
                 await asyncio.sleep(2 ** (3 - retry))  # Exponential backoff
-        return False, None
+        return False
 
 # Rest des Codes (if __name__ == '__main__': ...) bleibt gleich
 
@@ -0,0 +1,160 @@
+'''Outbound scheduling of the HKV write path.
+
+* Priority classes: user actions (relay toggles, reboot, ...) before config
+  (periods, connection table) before polling. Request slots (the gateway
+  window and the per node slots) are handed to waiters by priority.
+* Coalescing: a command that supersedes a waiting one to the same node and
+  channel replaces its payload, only the newest value is sent.
+* One writer: frames queued while the transport drains are written with a
+  single ``write()`` and ``drain()``.
+'''
+import asyncio
+from collections.abc import Callable
+import heapq
+from itertools import count
+import logging
+
+_LOGGER = logging.getLogger(__name__)
+
+# priority classes, lower is served first
+USER = 0
+CONFIG = 1
+POLL = 2
+
+PRIORITY_NAMES = {USER: "user", CONFIG: "config", POLL: "poll"}
+
+
+class HKVPriorityWindow:
+    """Semaphore whose waiters get a free slot by priority, FIFO within a priority."""
+
+    def __init__(self, size: int):
+        self.size = size
+        self._free = size
+        self._waiters: list[tuple[int, int, asyncio.Future]] = []
+        self._seq = count()
+
+    def locked(self) -> bool:
+        return self._free == 0
+
+    async def acquire(self, priority: int = POLL):
+        if self._free > 0 and not self._waiters:
+            self._free -= 1
+            return
+        fut = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._seq), fut))
+        try:
+            await fut
+        except asyncio.CancelledError:
+            if fut.done() and not fut.cancelled():
+                # the slot was handed over just before the cancellation
+                self.release()
+            raise
+
+    def release(self):
+        while self._waiters:
+            fut = heapq.heappop(self._waiters)[2]
+            if not fut.done():
+                fut.set_result(None)  # the slot goes straight to the waiter
+                return
+        self._free += 1
+
+    def slot(self, priority: int = POLL) -> "_Slot":
+        """``async with window.slot(USER): ...``"""
+        return _Slot(self, priority)
+
+    # plain ``async with window`` takes a polling slot
+    async def __aenter__(self):
+        await self.acquire()
+
+    async def __aexit__(self, *exc):
+        self.release()
+
+
+class _Slot:
+    __slots__ = ("window", "priority")
+
+    def __init__(self, window: HKVPriorityWindow, priority: int):
+        self.window = window
+        self.priority = priority
+
+    async def __aenter__(self):
+        await self.window.acquire(self.priority)
+
+    async def __aexit__(self, *exc):
+        self.window.release()
+
+
+class HKVCommand:
+    """A coalescable command waiting for its slot: ``data`` is replaced by newer commands.
+
+    ``result`` is the task sending it, shared by the ``waiters`` callers.
+    """
+
+    __slots__ = ("data", "result", "waiters")
+
+    def __init__(self, data: bytes, result: asyncio.Future | None = None):
+        self.data = data
+        self.result = result
+        self.waiters = 0
+
+
+class HKVOutbox:
+    """Single writer of the transport.
+
+    ``send()`` queues a frame and returns once the batch containing it was
+    written and drained. ``connection()`` returns ``(transport, protocol)``.
+    """
+
+    def __init__(self, connection: Callable[[], tuple]):
+        self._connection = connection
+        self._queue: list[tuple[int, int, bytes, asyncio.Future]] = []
+        self._seq = count()
+        self._task = None
+        self._batch: list = []  # written, draining
+        self.writes = 0
+        self.frames = 0
+
+    def __len__(self):
+        return len(self._queue)
+
+    def send(self, data: bytes, priority: int = POLL) -> asyncio.Future:
+        loop = asyncio.get_running_loop()
+        fut = loop.create_future()
+        heapq.heappush(self._queue, (priority, next(self._seq), data, fut))
+        if self._task is None or self._task.done():
+            # started on the next loop iteration: frames queued until then go out together
+            self._task = loop.create_task(self._run())
+        return fut
+
+    async def _run(self):
+        while self._queue:
+            queue, self._queue = self._queue, []
+            batch = self._batch = [heapq.heappop(queue) for _ in range(len(queue))]
+            try:
+                transport, protocol = self._connection()
+                if transport is None or transport.is_closing():
+                    raise ConnectionError("not connected")
+                transport.write(b"".join(item[2] for item in batch))
+                self.writes += 1
+                self.frames += len(batch)
+                await protocol.drain()
+            except Exception as e:
+                for item in batch:
+                    if not item[3].done():
+                        item[3].set_exception(e)
+            else:
+                for item in batch:
+                    if not item[3].done():
+                        item[3].set_result(None)
+            finally:
+                self._batch = []
+
+    def close(self):
+        """Stop writing, the senders of queued and draining frames get a ``ConnectionError``."""
+        if self._task is not None:
+            self._task.cancel()
+        for item in self._batch + self._queue:
+            if not item[3].done():
+                item[3].set_exception(ConnectionError("outbox closed"))
+        self._batch = []
+        self._queue = []
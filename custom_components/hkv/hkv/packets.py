@@ -1,11 +1,83 @@
-import json
 import logging
+import re
 from dataclasses import dataclass, InitVar, fields, field
 
+from .codec import DEFAULT_CODEC, JSONCodec
+
 
 _LOGGER = logging.getLogger(__name__)
 
-@dataclass
+# (TYPE, subtype) -> packet class, subtype None matches any subtype
+_PACKET_TYPES: dict[tuple[str, str | None], type["HKVPacket"]] = {}
+# TYPE -> name of the subtype key, e.g. 'D' -> 'DTYPE'
+_SUBTYPE_KEYS: dict[str, str] = {}
+
+
+def _cache_fields(cls):
+    """Precompute the field names used by ``__post_init__`` and ``__repr__``."""
+    cls._FIELDS = frozenset(f.name for f in fields(cls)) - {'EXTRA_DATA'}
+    cls._REPR_FIELDS = tuple(f.name for f in fields(cls))
+    return cls
+
+
+def register_packet(ptype: str, subtype: str | None = None):
+    """Class decorator registering a packet class for ``TYPE``/subtype in the lookup table."""
+    def deco(cls):
+        _cache_fields(cls)
+        _PACKET_TYPES[(ptype, subtype)] = cls
+        if subtype is not None:
+            _SUBTYPE_KEYS[ptype] = f"{ptype}TYPE"
+        return cls
+    return deco
+
+
+def packet_class(data: dict) -> type["HKVPacket"] | None:
+    """Lookup the packet class for the decoded frame ``data``."""
+    ptype = data['TYPE']
+    subkey = _SUBTYPE_KEYS.get(ptype)
+    return lookup_packet_class(ptype, data.get(subkey) if subkey is not None else None)
+
+
+def lookup_packet_class(ptype: str, subtype: str | None) -> type["HKVPacket"] | None:
+    """Lookup the packet class for ``TYPE``/subtype."""
+    if subtype is not None:
+        pcls = _PACKET_TYPES.get((ptype, subtype))
+        if pcls is not None:
+            return pcls
+    return _PACKET_TYPES.get((ptype, None))
+
+
+# routing header as sent by the firmware: {"SRC":1,"DST":99,"TYPE":"D","DTYPE":"T",...
+_HEADER = re.compile(
+    rb'\{\s*"SRC"\s*:\s*(-?\d+)\s*,\s*"DST"\s*:\s*(-?\d+)\s*,\s*"TYPE"\s*:\s*"(\w)"'
+    rb'(?:\s*,\s*"(\w)TYPE"\s*:\s*"(\w)")?'
+)
+
+
+def peek_header(doc: bytes | memoryview) -> tuple[int, int, str, str | None] | None:
+    """Read ``(SRC, DST, TYPE, subtype)`` from a raw frame without decoding it.
+
+    Returns None if the frame does not start with the usual header layout.
+    """
+    m = _HEADER.match(doc)
+    if m is None:
+        return None
+    src, dst, btype, subkey, subtype = m.groups()
+    ptype = _ASCII[btype]
+    if subkey == btype:
+        subtype = _ASCII[subtype]
+    elif ptype in _SUBTYPE_KEYS:
+        # subtype key missing or not directly behind TYPE: decode to be sure
+        return None
+    return int(src), int(dst), ptype, subtype
+
+
+# single ASCII character (bytes) -> str, faster than bytes.decode() for the header fields
+_ASCII = {bytes([c]): chr(c) for c in range(128)}
+
+
+@_cache_fields
+@dataclass(slots=True, repr=False)
 class HKVPacket():
     data: InitVar[dict]
     SRC: int = field(init=False)
@@ -14,150 +86,102 @@ class HKVPacket():
     EXTRA_DATA: dict = field(init=False)
 
     def __post_init__(self, data):
-        self.EXTRA_DATA = data.copy()
-        for f in fields(self):
-            if f.name in data:
-                setattr(self, f.name, data[f.name])
-                self.EXTRA_DATA.pop(f.name)
+        names = self._FIELDS
+        extra = {}
+        for k, v in data.items():
+            if k in names:
+                setattr(self, k, v)
+            else:
+                extra[k] = v
+        self.EXTRA_DATA = extra
 
     @staticmethod
-    def from_doc(doc: str):
-        data = json.loads(doc)
+    def from_doc(doc: str | bytes | memoryview, codec: JSONCodec = DEFAULT_CODEC):
+        data = codec.loads(doc)
         return HKVPacket.from_data(data)
 
     @classmethod
     def from_data(cls, data):
         try:
-            if data['TYPE'] == 'L':
-                return HKVLogPacket.from_data(data)
-            elif data['TYPE'] == 'A':
-                return HKVAckPacket.from_data(data)
-            elif data['TYPE'] == 'N':
-                return HKVNAckPacket.from_data(data)
-            elif data['TYPE'] == 'H':
-                return HKVHelloPacket.from_data(data)
-            elif data['TYPE'] == 'D' and data.get('DTYPE') in ['T', 'R', 'S', 'C']:
-                return HKVDataPacket.from_data(data)
-            elif data['TYPE'] == 'R' and data.get('RTYPE') == 'A':
-                return HKVRelaisChannelPacket.from_data(data)
-            elif data['TYPE'] == 'T' and data.get('TTYPE') == 'A':
-                return HKVTempChannelPacket.from_data(data)
-            else:
-                return cls(data)
+            pcls = packet_class(data)
         except KeyError as e:
             _LOGGER.error(f"Missing key in data: {e}")
             return cls(data)
+        return (pcls or cls)(data)
 
     def __repr__(self):
-        return f"{self.__class__.__name__}({', '.join([f'{f.name}={getattr(self, f.name)}' for f in fields(self) if getattr(self, f.name) is not None])})"
+        return f"{self.__class__.__name__}({', '.join([f'{name}={value}' for name in self._REPR_FIELDS if (value := getattr(self, name, None)) is not None])})"
 
-# Rest der Klassen (HKVAckPacket, etc.) bleibt gleich, nur __repr__ angepasst wo nötig.
-    
-@dataclass
+@register_packet('A')
+@dataclass(slots=True, repr=False)
 class HKVAckPacket(HKVPacket):
-    @classmethod
-    def from_data(cls,data):
-        return cls(data)
-    
-@dataclass
+    pass
+
+@register_packet('N')
+@dataclass(slots=True, repr=False)
 class HKVNAckPacket(HKVPacket):
-    @classmethod
-    def from_data(cls,data):
-        return cls(data)
-    
-@dataclass
+    pass
+
+@register_packet('H')
+@dataclass(slots=True, repr=False)
 class HKVHelloPacket(HKVPacket):
     #ID:str=field(init=False)
     HTYPE:str=field(init=False)
-    @classmethod
-    def from_data(cls,data):
-        return cls(data)
-    
-@dataclass
+
+@register_packet('L')
+@dataclass(slots=True, repr=False)
 class HKVLogPacket(HKVPacket):
     LTYPE:str=field(init=False)
     MSG:str=field(init=False)
-    @classmethod
-    def from_data(cls,data):
-        return cls(data)
     def __str__(self):
         return f"{self.LTYPE}::{self.SRC}: {self.MSG}"
-    
-@dataclass
+
+@_cache_fields
+@dataclass(slots=True, repr=False)
 class HKVChannelPacket(HKVPacket):
     # ID:str=field(init=False)
     CHAN:int=field(init=False)
     VAL:float=field(init=False)
-    @classmethod
-    def from_data(cls,data):
-        return cls(data)
-    
-@dataclass
+
+@register_packet('T', 'A')
+@dataclass(slots=True, repr=False)
 class HKVTempChannelPacket(HKVChannelPacket):
     TTYPE:str=field(init=False)
     MCNT:int=field(init=False)
-    @classmethod
-    def from_data(cls,data):
-        return cls(data)
-        
+
 #'{"SRC":5955124,"DST":99,"TYPE":"R","RTYPE":"A","ID":"HKV-EG","CHAN":6,"VAL":1}'
-@dataclass
+@register_packet('R', 'A')
+@dataclass(slots=True, repr=False)
 class HKVRelaisChannelPacket(HKVChannelPacket):
     RTYPE:str=field(init=False)
-    @classmethod
-    def from_data(cls,data):
-        return cls(data)
-    
-@dataclass
+
+@_cache_fields
+@dataclass(slots=True, repr=False)
 class HKVDataPacket(HKVPacket):
     DTYPE:str=field(init=False)
     # ID:str=field(init=False)
-    @classmethod
-    def from_data(cls,data):
-        if data['DTYPE']=='S':
-            return HKVStatusDataPacket.from_data(data)
-        elif data['DTYPE']=='T':
-            return HKVTempDataPacket.from_data(data)
-        elif data['DTYPE']=='R':
-            return HKVRelaisDataPacket.from_data(data)
-        elif data['DTYPE']=='C':
-            return HKVConnectionDataPacket.from_data(data)
-        else:
-            return cls(data)
-        
-@dataclass
+
+@register_packet('D', 'T')
+@dataclass(slots=True, repr=False)
 class HKVTempDataPacket(HKVDataPacket):
     MCNT:int=field(init=False,default=0)
     SNUM:int=field(init=False,default=0)
     TDATA:list[float]=field(init=False,default_factory=list)
-    @classmethod
-    def from_data(cls,data):
-        return cls(data)
-        
-    def __repr__(self):
-        return f"{self.__class__.__name__}({', '.join([f.name+'='+str(getattr(self,f.name)) for f in fields(self) if not getattr(self,f.name) is None])})"
-@dataclass
+
+@register_packet('D', 'R')
+@dataclass(slots=True, repr=False)
 class HKVRelaisDataPacket(HKVDataPacket):
     RNUM:int=field(init=False,default=0)
     RDATA:list[bool]=field(init=False,default_factory=list)
-    @classmethod
-    def from_data(cls,data):
-        return cls(data)
-      
-    def __repr__(self):
-        return f"{self.__class__.__name__}({', '.join([f.name+'='+str(getattr(self,f.name)) for f in fields(self) if not getattr(self,f.name) is None])})"
-@dataclass
+
+@register_packet('D', 'C')
+@dataclass(slots=True, repr=False)
 class HKVConnectionDataPacket(HKVDataPacket):
     CCNT:int=field(init=False,default=0)
     CDATA:list[dict]=field(init=False,default_factory=list)
-    @classmethod
-    def from_data(cls,data):
-        return cls(data)
-        
-    def __repr__(self):
-        return f"{self.__class__.__name__}({', '.join([f.name+'='+str(getattr(self,f.name)) for f in fields(self) if not getattr(self,f.name) is None])})"
 
-@dataclass
+@register_packet('D', 'S')
+@dataclass(slots=True, repr=False)
 class HKVStatusDataPacket(HKVDataPacket):
     ID:str=field(init=False,default=None)
     MSEC:int=field(init=False,default=None)
@@ -171,12 +195,58 @@ class HKVStatusDataPacket(HKVDataPacket):
     # RS485:str=field(init=False,default=None)
     # RELAIS:str=field(init=False,default=None)
     # SENSOR:str=field(init=False,default=None)
+
+class HKVLazyPacket:
+    """Routing header of a frame, the packet is only built on demand.
+
+    With a codec that parses slower than the header regex (stdlib json) only
+    the header is read and the raw frame is kept. Fast codecs (orjson) parse
+    the frame, then only the packet construction is deferred.
+    """
+
+    __slots__ = ('SRC', 'DST', 'TYPE', 'SUBTYPE', '_doc', '_data', '_codec')
+
+    def __init__(self, src: int, dst: int, ptype: str, subtype: str | None,
+                 doc: bytes | memoryview | None = None, data: dict | None = None, codec: JSONCodec = DEFAULT_CODEC):
+        self.SRC = src
+        self.DST = dst
+        self.TYPE = ptype
+        self.SUBTYPE = subtype
+        self._doc = doc
+        self._data = data
+        self._codec = codec
+
     @classmethod
-    def from_data(cls,data):
-        return cls(data)
-        
+    def from_doc(cls, doc: bytes | memoryview, codec: JSONCodec = DEFAULT_CODEC):
+        """Read the header of ``doc``, None if that is not possible without a full decode."""
+        if codec.peek_header:
+            header = peek_header(doc)
+            if header is None:
+                return None
+            return cls(*header, doc=doc, codec=codec)
+        data = codec.loads(doc)
+        ptype = data.get('TYPE')
+        if ptype is None:
+            return None
+        return cls(data.get('SRC'), data.get('DST'), ptype, data.get(f"{ptype}TYPE"), data=data, codec=codec)
+
+    @property
+    def packet_class(self) -> type[HKVPacket]:
+        return lookup_packet_class(self.TYPE, self.SUBTYPE) or HKVPacket
+
+    def keep(self) -> "HKVLazyPacket":
+        """Copy the frame out of the receive buffer before storing the packet."""
+        if isinstance(self._doc, memoryview):
+            self._doc = self._doc.tobytes()
+        return self
+
+    def decode(self) -> HKVPacket:
+        if self._data is not None:
+            return HKVPacket.from_data(self._data)
+        return HKVPacket.from_doc(self._doc, self._codec)
+
     def __repr__(self):
-        return f"{self.__class__.__name__}({', '.join([f.name+'='+str(getattr(self,f.name)) for f in fields(self) if not getattr(self,f.name) is None])})"
+        return f"{self.__class__.__name__}(SRC={self.SRC}, DST={self.DST}, TYPE={self.TYPE}, SUBTYPE={self.SUBTYPE})"
 
 if __name__=='__main__':
     import time
@@ -0,0 +1,84 @@
+'''Freshness tracking of node data for the polling sweep.
+
+Every data packet received from a node, pushed or polled, is recorded with
+its receive time. A sweep only polls the (node, data type) pairs whose last
+packet is older than the interval of that data type.
+'''
+import logging
+import time
+from collections.abc import Iterable
+
+from .packets import (
+    HKVConnectionDataPacket,
+    HKVPacket,
+    HKVRelaisDataPacket,
+    HKVStatusDataPacket,
+    HKVTempDataPacket,
+)
+
+_LOGGER = logging.getLogger(__name__)
+
+KINDS = {
+    HKVStatusDataPacket: "status",
+    HKVTempDataPacket: "temps",
+    HKVRelaisDataPacket: "relais",
+    HKVConnectionDataPacket: "connections",
+}
+
+
+class HKVPollScheduler:
+    """Last received packet per node and data type.
+
+    ``intervals`` maps a data type (``status``, ``temps``, ``relais``,
+    ``connections``) to the maximum age in seconds before it is polled
+    again. Data types without an interval are polled every sweep.
+    """
+
+    def __init__(self, intervals: dict[str, float]):
+        self.intervals = dict(intervals)
+        self._seen: dict[tuple[int, str], tuple[float, HKVPacket]] = {}
+        self.polls = 0
+        self.skipped = 0
+
+    def seen(self, packet: HKVPacket, now: float | None = None):
+        """Record a received data packet."""
+        kind = KINDS.get(packet.__class__)
+        if kind is not None:
+            self._seen[(packet.SRC, kind)] = (time.monotonic() if now is None else now, packet)
+
+    def last(self, addr: int, kind: str) -> HKVPacket | None:
+        entry = self._seen.get((addr, kind))
+        return entry[1] if entry else None
+
+    def age(self, addr: int, kind: str, now: float | None = None) -> float | None:
+        entry = self._seen.get((addr, kind))
+        if entry is None:
+            return None
+        return (time.monotonic() if now is None else now) - entry[0]
+
+    def fresh(self, addr: int, kind: str, now: float | None = None) -> HKVPacket | None:
+        """The last packet of ``addr``, if it is younger than the interval of ``kind``."""
+        entry = self._seen.get((addr, kind))
+        if entry is None:
+            return None
+        if (time.monotonic() if now is None else now) - entry[0] >= self.intervals.get(kind, 0):
+            return None
+        return entry[1]
+
+    def due(self, kind: str, addrs: Iterable[int], now: float | None = None) -> list[int]:
+        """Nodes of ``addrs`` whose ``kind`` data has to be polled."""
+        if now is None:
+            now = time.monotonic()
+        addrs = list(addrs)
+        due = [addr for addr in addrs if self.fresh(addr, kind, now) is None]
+        self.polls += len(due)
+        self.skipped += len(addrs) - len(due)
+        return due
+
+    def forget(self, addr: int):
+        """Drop everything known about node ``addr``."""
+        for key in [key for key in self._seen if key[0] == addr]:
+            del self._seen[key]
+
+    def stats(self) -> dict:
+        return dict(polls=self.polls, skipped=self.skipped, tracked=len(self._seen))
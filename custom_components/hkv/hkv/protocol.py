@@ -0,0 +1,59 @@
+'''asyncio protocol connecting a (serial) transport to an HKV instance.'''
+import asyncio
+import logging
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class HKVProtocol(asyncio.Protocol):
+    """Feeds received bytes straight into the HKV framer.
+
+    ``data_received`` is called by the event loop as soon as the port is
+    readable, so there is no reader task and no polling.
+    """
+
+    def __init__(self, hkv):
+        self._hkv = hkv
+        self.transport = None
+        self._paused = False
+        self._drain_waiters = []
+
+    def connection_made(self, transport):
+        self.transport = transport
+        self._hkv._connection_made(self, transport)
+
+    def data_received(self, data):
+        self._hkv._data_received(data)
+
+    def connection_lost(self, exc):
+        self._paused = False
+        self._wakeup_writers(exc or ConnectionResetError("Connection lost"))
+        self.transport = None
+        self._hkv._connection_lost(self, exc)
+
+    def pause_writing(self):
+        self._paused = True
+
+    def resume_writing(self):
+        self._paused = False
+        self._wakeup_writers()
+
+    def _wakeup_writers(self, exc=None):
+        waiters, self._drain_waiters = self._drain_waiters, []
+        for waiter in waiters:
+            if waiter.done():
+                continue
+            if exc is None:
+                waiter.set_result(None)
+            else:
+                waiter.set_exception(exc)
+
+    async def drain(self):
+        """Wait until the transport write buffer has been flushed below its high-water mark."""
+        if self.transport is None:
+            raise ConnectionResetError("Connection lost")
+        if not self._paused:
+            return
+        waiter = asyncio.get_running_loop().create_future()
+        self._drain_waiters.append(waiter)
+        await waiter
@@ -0,0 +1,119 @@
+'''Desired-state reconciler for the temperature periods of the nodes.
+
+The reconciler keeps the desired and the last acknowledged period of every
+node. Commands are only sent for nodes where both differ, e.g. after a user
+change, for new nodes or after a reboot (``invalidate``).
+'''
+import asyncio
+from collections.abc import Iterable
+import logging
+
+from .airtime import HKVAirtimeDeferred
+from .packets import HKVAckPacket
+
+_LOGGER = logging.getLogger(__name__)
+
+MEASURE = "temp_measure_interval"
+TRANSMIT = "temp_transmit_interval"
+
+# config key -> HKV command
+_COMMANDS = {
+    MEASURE: "set_temps_measure_period",
+    TRANSMIT: "set_temps_transmit_period",
+}
+
+
+class HKVReconciler:
+    """Desired vs. acknowledged config (``period`` in ms) per node and key."""
+
+    def __init__(self, hkv, defaults: dict[str, int], delays: dict[str, int] | None = None):
+        self.hkv = hkv
+        self.defaults = dict(defaults)
+        self.delays = dict(delays or {})
+        self._desired: dict[tuple[int, str], int] = {}
+        self._acked: dict[tuple[int, str], int] = {}
+        self.sent = 0
+
+    def desired(self, addr: int, key: str) -> int:
+        return self._desired.get((addr, key), self.defaults[key])
+
+    def acked(self, addr: int, key: str) -> int | None:
+        return self._acked.get((addr, key))
+
+    def set_desired(self, addr: int, key: str, period: int):
+        self._desired[(addr, key)] = int(period)
+
+    def as_dict(self) -> dict:
+        """Desired values set per node (the acknowledged ones are not kept over a restart)."""
+        return {key: {str(addr): period for (addr, k), period in self._desired.items() if k == key} for key in _COMMANDS}
+
+    def load(self, data: dict):
+        for key, periods in data.items():
+            if key in _COMMANDS:
+                for addr, period in periods.items():
+                    self.set_desired(int(addr), key, period)
+
+    def invalidate(self, addr: int):
+        """The node lost its config (reboot): send it again."""
+        for key in [key for key in self._acked if key[0] == addr]:
+            del self._acked[key]
+
+    def forget(self, addr: int):
+        self.invalidate(addr)
+        for key in [key for key in self._desired if key[0] == addr]:
+            del self._desired[key]
+
+    def pending(self, nodes: Iterable[int]) -> dict[str, list[int]]:
+        """Nodes whose acknowledged config differs from the desired one, per key."""
+        nodes = list(nodes)
+        return {
+            key: diff for key in _COMMANDS
+            if (diff := [addr for addr in nodes if self.acked(addr, key) != self.desired(addr, key)])
+        }
+
+    async def reconcile(self, nodes: Iterable[int], timeout=5) -> bool:
+        """Send the config differences of ``nodes``. Returns True if all nodes are in sync.
+
+        ``nodes`` are the nodes that are alive. If all of them want the same
+        value, one broadcast replaces the unicasts. Only acks of ``nodes``
+        are expected and recorded, a node that is not alive is reconciled
+        once it answers again.
+        """
+        nodes = list(nodes)
+        pending = self.pending(nodes)
+        results = await asyncio.gather(*[self._apply(key, diff, nodes, timeout) for key, diff in pending.items()])
+        return all(results)
+
+    async def _apply(self, key: str, diff: list[int], nodes: list[int], timeout) -> bool:
+        command = getattr(self.hkv, _COMMANDS[key])
+        delay = self.delays.get(key)
+        # alive nodes only: the others neither answer nor block the broadcast
+        values = {self.desired(addr, key) for addr in nodes}
+        if len(diff) > 1 and len(values) == 1:
+            period = values.pop()
+            _LOGGER.info(f"reconcile: {key}={period} for {diff} (broadcast)")
+            self.sent += 1
+            try:
+                success, acks = await command(delay=delay, period=period, dst=-1, timeout=timeout, collect=True, nodes=diff)
+            except HKVAirtimeDeferred as e:
+                _LOGGER.info(f"reconcile: {key} not sent: {e}")
+                return False
+            for addr, pck in acks.items():
+                if addr in nodes and isinstance(pck, HKVAckPacket):
+                    self._acked[(addr, key)] = period
+            return all(isinstance(acks.get(addr), HKVAckPacket) for addr in diff)
+
+        async def unicast(addr):
+            period = self.desired(addr, key)
+            _LOGGER.info(f"reconcile: {key}={period} for {addr}")
+            self.sent += 1
+            try:
+                success, pck = await command(delay=delay, period=period, dst=addr, timeout=timeout)
+            except HKVAirtimeDeferred as e:
+                _LOGGER.info(f"reconcile: {key} for {addr} not sent: {e}")
+                return False
+            if success:
+                self._acked[(addr, key)] = period
+            return success
+
+        return all(await asyncio.gather(*[unicast(addr) for addr in diff]))
@@ -0,0 +1,327 @@
+'''In-process simulator of an HKV gateway and its LoRa mesh.
+
+Speaks the JSON frame protocol of the gateway: requests are read line by
+line, responses and pushes are sent as ``{...}\\r\\n`` frames. The simulated
+nodes answer status, temps, relais, connection, hello and config requests
+and push their temperatures every transmit period. The radio link is modelled
+with a per frame latency, loss, duplicates and garbled frames.
+
+In memory (no serial port)::
+
+    sim = HKVSimulator(HKVSimulator.make_nodes(200), latency=(0.05, 0.4), loss=0.02)
+    sim.attach(hub.hkv)
+    await hub.connect()
+
+Over a pty pair, for the unmodified serial path::
+
+    dev = sim.open_pty()
+    hub = HKVHub(dev, 115200)
+'''
+import asyncio
+from dataclasses import dataclass, field
+import heapq
+import json
+import logging
+import os
+import random
+import time
+
+_LOGGER = logging.getLogger(__name__)
+
+HUB_ADDR = 99
+BASE_ADDR = 5000
+
+
+@dataclass(slots=True)
+class HKVSimNode:
+    """One simulated node."""
+    addr: int
+    SNUM: int = 14
+    RNUM: int = 6
+    ID: str = ""
+    transmit_period: int = 30000  # ms, 0 disables the temperature push
+    measure_period: int = 30000
+    temps: list[float] = field(default_factory=list)
+    relais: list[int] = field(default_factory=list)
+    MCNT: int = 0
+    booted: float = field(default_factory=time.monotonic)
+
+    def __post_init__(self):
+        self.ID = self.ID or f"SIM-{self.addr}"
+        if not self.temps:
+            self.temps = [round(18 + (self.addr * 7 + i * 3) % 50 / 10, 2) for i in range(self.SNUM)]
+        if not self.relais:
+            self.relais = [0] * self.RNUM
+
+    @property
+    def MSEC(self) -> int:
+        return int((time.monotonic() - self.booted) * 1000)
+
+    def measure(self, rnd: random.Random):
+        """Random walk of the temperatures."""
+        self.MCNT += 1
+        self.temps = [round(t + rnd.uniform(-0.1, 0.1), 2) for t in self.temps]
+
+
+class HKVSimTransport(asyncio.Transport):
+    """In-memory transport between an ``HKVProtocol`` and the simulator."""
+
+    def __init__(self, sim: "HKVSimulator", protocol: asyncio.Protocol):
+        super().__init__()
+        self._sim = sim
+        self._protocol = protocol
+        self._closing = False
+
+    def write(self, data):
+        if not self._closing:
+            self._sim._received(data)
+
+    def is_closing(self):
+        return self._closing
+
+    def close(self):
+        if self._closing:
+            return
+        self._closing = True
+        self._sim._detach(self)
+        asyncio.get_running_loop().call_soon(self._protocol.connection_lost, None)
+
+    def abort(self):
+        self.close()
+
+    def get_extra_info(self, name, default=None):
+        return {"peername": "hkv-sim"}.get(name, default)
+
+    def deliver(self, frame: bytes):
+        if not self._closing:
+            self._protocol.data_received(frame)
+
+
+class HKVSimulator:
+    """Gateway (base node, ``DST=0``) and ``nodes`` of the mesh.
+
+    ``latency`` is the (min, max) delay of one frame over the air in seconds,
+    the base node answers after ``local_latency``. ``loss``, ``duplicate`` and
+    ``garble`` are probabilities per frame (requests and responses).
+    """
+
+    def __init__(self, nodes: list[HKVSimNode], base: int = BASE_ADDR,
+                 latency: tuple[float, float] = (0.05, 0.3), local_latency: float = 0.005,
+                 loss: float = 0.0, duplicate: float = 0.0, garble: float = 0.0,
+                 push: bool = True, seed: int | None = None):
+        self.base = HKVSimNode(base, SNUM=0, RNUM=0, ID="SIM-BASE", transmit_period=0)
+        self.nodes = {node.addr: node for node in nodes}
+        self.latency = latency
+        self.local_latency = local_latency
+        self.loss = loss
+        self.duplicate = duplicate
+        self.garble = garble
+        self.push = push
+        self._rnd = random.Random(seed)
+        self._buf = bytearray()
+        self._outputs = []  # transports / pty writers
+        self._push_task = None
+        # (addr, MCNT) -> loop time the push left the node, for latency measurements
+        self.pushed: dict[tuple[int, int], float] = {}
+        self.stats = dict(requests=0, responses=0, pushes=0, lost=0, duplicated=0, garbled=0, bytes=0)
+
+    @staticmethod
+    def make_nodes(count: int, first: int = 6900000, snum: int = 14, rnum: int = 6,
+                   push: float = 30.0) -> list[HKVSimNode]:
+        """``count`` nodes with ``snum`` temperature and ``rnum`` relay channels, pushing every ``push`` seconds."""
+        return [HKVSimNode(first + i, SNUM=snum, RNUM=rnum, transmit_period=int(push * 1000)) for i in range(count)]
+
+    # ---------------------------------------------------------------------
+    #  connections
+    # ---------------------------------------------------------------------
+    def attach(self, hkv):
+        """Connect ``hkv`` through the in-memory transport (used by ``hkv.connect()``)."""
+        hkv.transport_factory = self.create_connection
+
+    async def create_connection(self, loop, protocol_factory):
+        protocol = protocol_factory()
+        transport = HKVSimTransport(self, protocol)
+        self._outputs.append(transport.deliver)
+        protocol.connection_made(transport)
+        self._start()
+        return transport, protocol
+
+    def _detach(self, transport):
+        if transport.deliver in self._outputs:
+            self._outputs.remove(transport.deliver)
+
+    def open_pty(self) -> str:
+        """Serve a pty pair, returns the device path for the serial port."""
+        import tty
+        master, slave = os.openpty()
+        tty.setraw(slave)
+        os.set_blocking(master, False)
+        loop = asyncio.get_running_loop()
+
+        def readable():
+            try:
+                data = os.read(master, 65536)
+            except (BlockingIOError, OSError):
+                return
+            self._received(data)
+
+        loop.add_reader(master, readable)
+        self._outputs.append(lambda frame: os.write(master, frame))
+        self._start()
+        return os.ttyname(slave)
+
+    def _start(self):
+        if self.push and (self._push_task is None or self._push_task.done()):
+            self._push_task = asyncio.get_running_loop().create_task(self._push_loop())
+
+    def close(self):
+        if self._push_task is not None:
+            self._push_task.cancel()
+            self._push_task = None
+
+    # ---------------------------------------------------------------------
+    #  radio link
+    # ---------------------------------------------------------------------
+    def _send(self, node: HKVSimNode, doc: dict, delay: float):
+        """Send ``doc`` from ``node`` after ``delay`` seconds, subject to loss/duplicates/garbling."""
+        if self._rnd.random() < self.loss:
+            self.stats['lost'] += 1
+            return
+        frame = json.dumps(doc, separators=(",", ":")).encode() + b"\r\n"
+        if self._rnd.random() < self.garble:
+            self.stats['garbled'] += 1
+            frame = self._garbled(frame)
+        loop = asyncio.get_running_loop()
+        loop.call_later(delay, self._deliver, frame)
+        if self._rnd.random() < self.duplicate:
+            self.stats['duplicated'] += 1
+            loop.call_later(delay + self._air(node), self._deliver, frame)
+
+    def _garbled(self, frame: bytes) -> bytes:
+        frame = bytearray(frame)
+        if self._rnd.random() < 0.5:
+            # cut off, the next frame end resyncs
+            del frame[self._rnd.randrange(1, len(frame) - 3):-3]
+        else:
+            for _ in range(3):
+                frame[self._rnd.randrange(1, len(frame) - 3)] = self._rnd.choice(b'{}":,x\xff')
+        return bytes(frame)
+
+    def _deliver(self, frame: bytes):
+        self.stats['bytes'] += len(frame)
+        for output in list(self._outputs):
+            try:
+                output(frame)
+            except OSError as e:
+                _LOGGER.debug(f"sim: output failed: {e}")
+
+    def _air(self, node: HKVSimNode) -> float:
+        if node is self.base:
+            return self.local_latency
+        return self._rnd.uniform(*self.latency)
+
+    # ---------------------------------------------------------------------
+    #  requests
+    # ---------------------------------------------------------------------
+    def _received(self, data: bytes):
+        self._buf += data
+        *lines, rest = self._buf.split(b"\n")
+        self._buf = bytearray(rest)
+        for line in lines:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                request = json.loads(line)
+            except ValueError:
+                _LOGGER.debug(f"sim: bad request {line!r}")
+                continue
+            self.stats['requests'] += 1
+            self._handle(request)
+
+    def _targets(self, dst: int) -> list[HKVSimNode]:
+        if dst == -1:
+            return [self.base, *self.nodes.values()]
+        if dst in (0, self.base.addr):
+            return [self.base]
+        node = self.nodes.get(dst)
+        return [node] if node is not None else []
+
+    def _handle(self, request: dict):
+        for node in self._targets(request.get('DST', 0)):
+            if node is not self.base and self._rnd.random() < self.loss:
+                # request lost on the way to the node
+                self.stats['lost'] += 1
+                continue
+            response = self._respond(node, request)
+            if response is not None:
+                self.stats['responses'] += 1
+                # request and response each cross the air once
+                self._send(node, response, self._air(node) + (self._air(node) if node is not self.base else 0))
+
+    def _respond(self, node: HKVSimNode, q: dict) -> dict | None:
+        head = dict(SRC=node.addr, DST=q.get('SRC', HUB_ADDR))
+        kind, sub = q.get('TYPE'), q.get('STYPE') or q.get('TTYPE') or q.get('RTYPE') or q.get('CTYPE') or q.get('HTYPE')
+        if kind == 'S':
+            return self.status(node, head)
+        if kind == 'T' and sub == 'G':
+            return self.temps(node, head)
+        if kind == 'T' and sub in ('P', 'M'):
+            if 'PERIOD' in q:
+                setattr(node, 'transmit_period' if sub == 'P' else 'measure_period', int(q['PERIOD']))
+            return dict(head, TYPE='A')
+        if kind == 'R' and sub == 'G':
+            return dict(head, TYPE='D', DTYPE='R', RNUM=node.RNUM, RDATA=list(node.relais))
+        if kind == 'R' and sub == 'S':
+            if 'CHAN' in q and 0 < q['CHAN'] <= node.RNUM:
+                node.relais[q['CHAN'] - 1] = int(q['VAL'])
+            elif 'VAL' in q:
+                node.relais = [int(q['VAL'])] * node.RNUM
+            return dict(head, TYPE='A')
+        if kind == 'C' and sub == 'G':
+            if node is not self.base:
+                return dict(head, TYPE='D', DTYPE='C', CCNT=0, CDATA=[])
+            return dict(head, TYPE='D', DTYPE='C', CCNT=len(self.nodes),
+                        CDATA=[dict(ADDR=addr, STYPE=2) for addr in self.nodes])
+        if kind == 'H':
+            return dict(head, TYPE='H', HTYPE='A', ID=node.ID)
+        if kind == 'B':
+            node.booted = time.monotonic()
+            return dict(head, TYPE='A')
+        return dict(head, TYPE='A')
+
+    def status(self, node: HKVSimNode, head: dict) -> dict:
+        return dict(head, TYPE='D', DTYPE='S', ID=node.ID, MSEC=node.MSEC, SNUM=node.SNUM, MCNT=node.MCNT,
+                    RNUM=node.RNUM, CCNT=len(self.nodes) if node is self.base else 1,
+                    DISPLAY=dict(USED=False, READY=False), LORA=dict(USED=True, READY=True))
+
+    def temps(self, node: HKVSimNode, head: dict) -> dict:
+        return dict(head, TYPE='D', DTYPE='T', SNUM=node.SNUM, MCNT=node.MCNT, TDATA=list(node.temps))
+
+    # ---------------------------------------------------------------------
+    #  pushes
+    # ---------------------------------------------------------------------
+    async def _push_loop(self):
+        """One timer heap for all nodes, so hundreds of nodes do not need hundreds of tasks."""
+        loop = asyncio.get_running_loop()
+        now = loop.time()
+        heap = [
+            (now + self._rnd.uniform(0, node.transmit_period / 1000), node.addr)
+            for node in self.nodes.values() if node.transmit_period > 0
+        ]
+        heapq.heapify(heap)
+        while heap:
+            at, addr = heap[0]
+            delay = at - loop.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+                continue
+            heapq.heappop(heap)
+            node = self.nodes.get(addr)
+            if node is None or node.transmit_period <= 0:
+                continue
+            node.measure(self._rnd)
+            self.pushed[(addr, node.MCNT)] = loop.time()
+            self.stats['pushes'] += 1
+            self._send(node, self.temps(node, dict(SRC=addr, DST=HUB_ADDR)), self._air(node))
+            heapq.heappush(heap, (at + node.transmit_period / 1000, addr))
@@ -0,0 +1,201 @@
+'''Cached mesh topology: the nodes and their static capabilities.
+
+The connection table of the base node and the status (``ID``, ``SNUM``,
+``RNUM``, ...) of every node are read once and only refreshed when a packet
+reveals a change:
+
+* a status with a different ``CCNT`` of the base node -> connection table
+* a status with a smaller ``MSEC`` (reboot) or changed capabilities
+* a hello from a node -> its status, from an unknown node -> connection table
+* temps/relais with a different ``SNUM``/``RNUM`` -> status
+* temps or status with a smaller measurement counter ``MCNT`` (reboot) -> status
+
+Steady-state sweeps do not poll the status, so a silent reboot is seen in
+the ``MCNT`` of the temperature pushes (and the hub re-reads the status of
+every node on a slow interval, see ``DEFAULT_POLL_INTERVALS``).
+'''
+from collections.abc import Callable
+from dataclasses import dataclass
+import logging
+
+from .packets import (
+    HKVConnectionDataPacket,
+    HKVDataPacket,
+    HKVHelloPacket,
+    HKVPacket,
+    HKVRelaisDataPacket,
+    HKVStatusDataPacket,
+    HKVTempDataPacket,
+)
+
+_LOGGER = logging.getLogger(__name__)
+
+# topology events passed to the listeners
+NODE_ADDED = "added"
+NODE_REMOVED = "removed"
+NODE_CHANGED = "changed"
+NODE_REBOOTED = "rebooted"
+
+
+@dataclass(slots=True)
+class HKVNode:
+    """One node of the mesh."""
+    addr: int
+    STYPE: int | None = None
+    status: HKVStatusDataPacket | None = None  # last status (capabilities)
+    refresh: bool = True  # status has to be (re)read
+    reboots: int = 0
+    mcnt: int | None = None  # last measurement counter, it only drops on a reboot
+
+
+class HKVTopology:
+    """Nodes of the mesh, updated as a diff of the connection table."""
+
+    def __init__(self):
+        self.base: int | None = None
+        self.nodes: dict[int, HKVNode] = {}
+        self.refresh_connections = True
+        self._listeners: list[Callable[[str, int], None]] = []
+
+    def __contains__(self, addr):
+        return addr in self.nodes
+
+    def __iter__(self):
+        return iter(self.nodes)
+
+    def __len__(self):
+        return len(self.nodes)
+
+    def node(self, addr: int) -> HKVNode | None:
+        return self.nodes.get(addr)
+
+    def add_listener(self, listener: Callable[[str, int], None]) -> Callable[[], None]:
+        """Call ``listener(event, addr)`` on topology changes. Returns the remove function."""
+        self._listeners.append(listener)
+        return lambda: self._listeners.remove(listener)
+
+    def _notify(self, event: str, addr: int):
+        _LOGGER.info(f"topology: node {addr} {event}")
+        for listener in list(self._listeners):
+            try:
+                listener(event, addr)
+            except Exception as e:
+                _LOGGER.error(f"topology listener {listener} failed: {e}", exc_info=True)
+
+    def as_dict(self) -> dict:
+        """JSON compatible snapshot of the topology."""
+        return dict(
+            base=self.base,
+            nodes=[
+                dict(
+                    addr=node.addr,
+                    STYPE=node.STYPE,
+                    reboots=node.reboots,
+                    status={name: getattr(node.status, name) for name in node.status._FIELDS} if node.status else None,
+                )
+                for node in self.nodes.values()
+            ],
+        )
+
+    def load(self, data: dict):
+        """Restore a snapshot. The connection table is read again on the next sweep."""
+        self.base = data.get('base')
+        self.nodes = {}
+        for item in data.get('nodes', ()):
+            node = self.nodes[item['addr']] = HKVNode(item['addr'], item.get('STYPE'), reboots=item.get('reboots', 0))
+            if item.get('status'):
+                status = HKVDataPacket.from_data(item['status'])
+                if isinstance(status, HKVStatusDataPacket):
+                    node.status, node.refresh = status, False
+        self.refresh_connections = True
+
+    def needs_status(self) -> list[int]:
+        """Nodes whose capabilities have to be (re)read."""
+        return [addr for addr, node in self.nodes.items() if node.refresh]
+
+    def observe(self, packet: HKVPacket):
+        """Update the topology from any received packet."""
+        if isinstance(packet, HKVStatusDataPacket):
+            self.apply_status(packet)
+        elif isinstance(packet, HKVConnectionDataPacket):
+            if packet.SRC == self.base:
+                self.apply_connections(packet)
+        elif isinstance(packet, HKVHelloPacket):
+            self.apply_hello(packet)
+        elif isinstance(packet, HKVTempDataPacket):
+            self._check_caps(packet.SRC, "SNUM", packet.SNUM)
+            node = self.nodes.get(packet.SRC)
+            if node is not None and self._counter_dropped(node, packet.MCNT):
+                node.refresh = True
+                self._rebooted(node)
+        elif isinstance(packet, HKVRelaisDataPacket):
+            self._check_caps(packet.SRC, "RNUM", packet.RNUM)
+
+    def apply_connections(self, packet: HKVConnectionDataPacket) -> tuple[list[int], list[int]]:
+        """Apply the connection table of the base node. Returns the added and removed nodes."""
+        self.base = packet.SRC
+        table = {self.base: None}
+        for conn in packet.CDATA[:packet.CCNT]:
+            if conn['ADDR'] not in (0, 99, self.base):
+                table[conn['ADDR']] = conn.get('STYPE')
+        added = [addr for addr in table if addr not in self.nodes]
+        removed = [addr for addr in self.nodes if addr not in table]
+        for addr in removed:
+            del self.nodes[addr]
+        for addr, stype in table.items():
+            node = self.nodes.get(addr)
+            if node is None:
+                node = self.nodes[addr] = HKVNode(addr)
+            node.STYPE = stype
+        self.refresh_connections = False
+        for addr in removed:
+            self._notify(NODE_REMOVED, addr)
+        for addr in added:
+            self._notify(NODE_ADDED, addr)
+        return added, removed
+
+    def apply_status(self, packet: HKVStatusDataPacket):
+        node = self.nodes.get(packet.SRC)
+        if node is None:
+            # a node that is not in the connection table
+            self.refresh_connections = True
+            return
+        prev, node.status, node.refresh = node.status, packet, False
+        dropped = self._counter_dropped(node, packet.MCNT)
+        if prev is None:
+            return
+        if dropped or (packet.MSEC is not None and prev.MSEC is not None and packet.MSEC < prev.MSEC):
+            self._rebooted(node)
+        if node.addr == self.base and packet.CCNT != prev.CCNT:
+            self.refresh_connections = True
+        if (packet.ID, packet.SNUM, packet.RNUM) != (prev.ID, prev.SNUM, prev.RNUM):
+            self._notify(NODE_CHANGED, node.addr)
+
+    @staticmethod
+    def _counter_dropped(node: HKVNode, mcnt: int | None) -> bool:
+        if mcnt is None:
+            return False
+        prev = node.mcnt
+        # a reply may overtake a push by one measurement, a reboot restarts the counter
+        if prev is not None and mcnt + 1 < prev:
+            node.mcnt = mcnt
+            return True
+        if prev is None or mcnt > prev:
+            node.mcnt = mcnt
+        return False
+
+    def _rebooted(self, node: HKVNode):
+        node.reboots += 1
+        self._notify(NODE_REBOOTED, node.addr)
+
+    def apply_hello(self, packet: HKVHelloPacket):
+        node = self.nodes.get(packet.SRC)
+        if node is None:
+            self.refresh_connections = True
+        else:
+            node.refresh = True
+
+    def _check_caps(self, addr: int, key: str, value):
+        node = self.nodes.get(addr)
+        if node is not None and node.status is not None and getattr(node.status, key) != value:
+            node.refresh = True
@@ -6,8 +6,19 @@ import asyncio
 from collections import OrderedDict
 import logging
 import threading
+import time
 
+from .const import DEFAULT_MAX_INFLIGHT, DEFAULT_MAX_INFLIGHT_NODE, \
+    DEFAULT_COMMAND_TIMEOUT, DEFAULT_NODE_BUDGET, DEFAULT_SWEEP_BUDGET, DEFAULT_BROADCAST_WINDOW, \
+    DEFAULT_POLL_INTERVALS, DEFAULT_TEMP_MEASURE_PERIOD, DEFAULT_TEMP_MEASURE_DELAY, \
+    DEFAULT_TEMP_TRANSMIT_PERIOD, DEFAULT_TEMP_TRANSMIT_DELAY
+from .hkv.airtime import HKVAirtimeDeferred
 from .hkv.hkv import HKV
+from .hkv.packets import HKVDataPacket, HKVHelloPacket, HKVNAckPacket
+from .hkv.polling import HKVPollScheduler
+from .hkv.reconciler import MEASURE, TRANSMIT, HKVReconciler
+from .hkv.topology import NODE_REBOOTED, NODE_REMOVED, HKVTopology
+from .state import HKVNodeState
 
 _LOGGER = logging.getLogger(__name__)
 
@@ -18,13 +29,45 @@ class HKVHub:
     TODO Remove this placeholder class and replace with things from your PyPI package.
     """
 
-    def __init__(self, dev: str, baud: int, timeout: float = 1.0) -> None:
+    def __init__(self, dev: str, baud: int, timeout: float = 1.0,
+                 max_inflight: int = DEFAULT_MAX_INFLIGHT, max_inflight_node: int = DEFAULT_MAX_INFLIGHT_NODE) -> None:
         """Initialize."""
         self.dev = dev
         self.baud = baud
         self.timeout = timeout
+        self.max_inflight = max_inflight
         self._lock = threading.Lock()
-        self.hkv = HKV()
+        # max_inflight=1 polls one request after the other
+        self.hkv = HKV(max_inflight=max_inflight, max_inflight_per_node=max_inflight_node)
+        self.sweep_time = None
+        # time budgets of one sweep (seconds)
+        self.command_timeout = DEFAULT_COMMAND_TIMEOUT
+        self.node_budget = DEFAULT_NODE_BUDGET
+        self.sweep_budget = DEFAULT_SWEEP_BUDGET
+        # 0 disables the broadcast rounds (unicast polling only)
+        self.broadcast_window = DEFAULT_BROADCAST_WINDOW
+        self._devices = OrderedDict()  # results of the last sweep
+        # nodes and capabilities, only refreshed when a packet reveals a change
+        self.topology = HKVTopology()
+        self.topology.add_listener(self._topology_changed)
+        # temperature periods are only sent when they differ from the acknowledged ones
+        self.reconciler = HKVReconciler(
+            self.hkv,
+            defaults={MEASURE: DEFAULT_TEMP_MEASURE_PERIOD, TRANSMIT: DEFAULT_TEMP_TRANSMIT_PERIOD},
+            delays={MEASURE: DEFAULT_TEMP_MEASURE_DELAY, TRANSMIT: DEFAULT_TEMP_TRANSMIT_DELAY},
+        )
+        # pushed and polled data packets, only stale data is polled
+        self.scheduler = HKVPollScheduler(DEFAULT_POLL_INTERVALS)
+        self._track_task = None
+
+    def configure(self, timeout: float, max_inflight: int, max_inflight_node: int,
+                  poll_intervals: dict[str, float] | None = None):
+        """Apply changed options to the open connection."""
+        self.timeout = timeout
+        self.max_inflight = max_inflight
+        if poll_intervals:
+            self.scheduler.intervals.update(poll_intervals)
+        self.hkv.configure(timeout=timeout, max_inflight=max_inflight, max_inflight_per_node=max_inflight_node)
 
     @property
     def connected(self):
@@ -36,15 +79,42 @@ class HKVHub:
             return
 
         await self.hkv.connect(port=self.dev, baud=self.baud, timeout=self.timeout)
+        if self._track_task is None or self._track_task.done():
+            self._track_task = asyncio.get_running_loop().create_task(self._track())
 
         await asyncio.sleep(2)
 
+        # before anything else is on air, so no other node can answer the hello to DST=0
+        _LOGGER.info(f"local node: {await self.hkv.identify()}")
         _LOGGER.info(f"hello: {await self.hkv.hello(dst=-1, timeout=20)}")
-        # TODO: register temps handler
-
-        # Set intervals only on startup
-        await self.hkv.set_temps_measure_period(delay=0, period=0, dst=-1, timeout=10)
-        await self.hkv.set_temps_transmit_period(delay=0, period=0, dst=-1, timeout=10)
+        # the temperature periods are sent by the reconciler after the first sweep
+
+    async def _track(self):
+        """Record every data packet (pushed or polled) and hello."""
+        async with self.hkv.subscribe(types=(HKVDataPacket, HKVHelloPacket), maxsize=1024) as stream:
+            async for pck in stream:
+                self._seen(pck)
+
+    def _topology_changed(self, event, addr):
+        if event == NODE_REBOOTED:
+            self.reconciler.invalidate(addr)
+        elif event == NODE_REMOVED:
+            self.reconciler.forget(addr)
+            self.scheduler.forget(addr)
+
+    def _seen(self, pck):
+        self.scheduler.seen(pck)
+        self.topology.observe(pck)
+
+    def snapshot(self) -> dict:
+        """Topology and desired config for the startup snapshot."""
+        return dict(topology=self.topology.as_dict(), desired=self.reconciler.as_dict())
+
+    def restore(self, data: dict, devices):
+        """Restore a snapshot, ``devices`` are the last known node states."""
+        self.topology.load(data.get('topology') or {})
+        self.reconciler.load(data.get('desired') or {})
+        self._devices = OrderedDict((addr, state.copy()) for addr, state in devices.items())
 
     async def scan_connected_devices(self):
         _LOGGER.error("scan_connected_devices: ...")
@@ -52,146 +122,160 @@ class HKVHub:
         return {"devices": devices}
 
     async def fetch_data(self, hass):
-
-        self.hkv._block_handlers = True
+        """Query all nodes within the sweep budget.
+
+        The connection table and the node capabilities (status) are cached
+        in the topology and only requested again after a change, so a steady
+        state sweep sends data queries only. Only data older than its poll
+        interval is requested, data pushed by the nodes counts as fresh.
+        Temps and relais of all nodes are collected with one broadcast each,
+        only nodes missing in a broadcast round are polled one by one.
+        Every command and node has its own deadline. Whatever arrived in time
+        is committed, nodes that missed their budget keep their last values and
+        are marked ``STALE``.
+        """
         devices = OrderedDict()
 
-        def defaultdevdata():
-            return OrderedDict(
-                ID='UNKNOWN',
-                SNUM=0,
-                MCNT=0,
-                RNUM=0,
-                CCNT=0,
-                **{f"Temp{i+1}": 0.0 for i in range(14)},
-                **{f"Relais{i+1}": False for i in range(6)},
-                temp_transmit_interval=30000,
-                temp_measure_interval=30000,
-            )
+        def devdata(addr):
+            prev = self._devices.get(addr)
+            return prev.copy() if prev else HKVNodeState(addr)
 
+        topo = self.topology
+        sched = self.scheduler
+        starttime = time.monotonic()
+        deadline = starttime + self.sweep_budget
         try:
-            dev = defaultdevdata()
-            # # Parallel queries for base device (dst=0)
-            # tasks = [
-            #     self.hkv.get_status(dst=0, timeout=5),
-            #     self.hkv.get_temps(dst=0, timeout=5),
-            #     self.hkv.get_relais(dst=0, timeout=5),
-            #     self.hkv.get_connections(dst=0, timeout=5)
-            # ]
-            # results = await asyncio.gather(*tasks, return_exceptions=True)
-
-            # state_pck = results[0][1] if isinstance(results[0], tuple) and results[0][0] else None
-            # temps_pck = results[1][1] if isinstance(results[1], tuple) and results[1][0] else None
-            # relais_pck = results[2][1] if isinstance(results[2], tuple) and results[2][0] else None
-            # conn_pck = results[3][1] if isinstance(results[3], tuple) and results[3][0] else None
-
-            success = False
-            while not success:
-                success, state_pck = await self.hkv.get_status(dst=0, timeout=10)
-
-            if state_pck:
-                devices[state_pck.SRC] = dev
-                dev['ID'] = state_pck.ID
-                dev['MSEC'] = state_pck.MSEC
-                dev['SNUM'] = state_pck.SNUM
-                dev['MCNT'] = state_pck.MCNT
-                dev['RNUM'] = state_pck.RNUM
-                dev['CCNT'] = state_pck.CCNT
-
-            success = False
-            while not success:
-                success, temps_pck = await self.hkv.get_temps(dst=0, timeout=10)
-
-            if temps_pck:
-                dev['SNUM'] = temps_pck.SNUM
-                dev['MCNT'] = temps_pck.MCNT
-                dev['TDATA'] = temps_pck.TDATA
-                for ii in range(dev['SNUM']):
-                    tempi = f"Temp{ii+1}"
-                    temp = dev['TDATA'][ii]
-                    dev[tempi] = temp if temp else None
-
-            success = False
-            while not success:
-                success, relais_pck = await self.hkv.get_relais(dst=0, timeout=10)
-
-            if relais_pck:
-                dev['RNUM'] = relais_pck.RNUM
-                dev['RDATA'] = relais_pck.RDATA
-                for ii in range(dev['RNUM']):
-                    reli = f"Relais{ii+1}"
-                    rel = dev['RDATA'][ii]
-                    dev[reli] = rel if rel is not None else None
-
-            success = False
-            while not success:
-                success, conn_pck = await self.hkv.get_connections(dst=0, timeout=10)
-
-            # Handle connections
-            if conn_pck:
-                for i in range(conn_pck.CCNT):
-                    addr = conn_pck.CDATA[i]['ADDR']
-                    if addr and addr not in [0, 99]:
-                        dev = defaultdevdata()
-                        devices[addr] = dev
-                        await self._query_device(addr, dev)
+            if self.hkv.local_addr is None:
+                # the hello at connect got no reply, DST=0 requests cannot be matched without it
+                await self.hkv.identify(timeout=self.command_timeout)
+            node_deadline = min(deadline, starttime + self.node_budget)
+            # the connection table of the base device (dst=0) lists the other nodes
+            if topo.refresh_connections:
+                conn_pck = await self._query(self.hkv.get_connections, 0, node_deadline)
+                if conn_pck:
+                    topo.apply_connections(conn_pck)
+            if topo:
+                addrs = list(topo)
+            else:
+                # no connection table yet: use the nodes of the last sweep
+                addrs = list(self._devices)
+
+            # capabilities of new, changed and rebooted nodes (and of every node on a slow
+            # interval, a silent reboot shows in it), then one broadcast round per data
+            # type for the stale data
+            status_due = sorted(set(topo.needs_status()) | set(sched.due("status", addrs)))
+            answered = await self._broadcast(self.hkv.get_status, status_due)
+            status = {addr: node.status for addr, node in topo.nodes.items()
+                      if not node.refresh and (addr not in status_due or addr in answered)}
+            temps = self._with_fresh("temps", addrs, await self._broadcast(self.hkv.get_temps, sched.due("temps", addrs)))
+            relais = self._with_fresh("relais", addrs, await self._broadcast(self.hkv.get_relais, sched.due("relais", addrs)))
+
+            # base device unknown (no connection table yet): poll it as dst=0
+            targets = addrs if topo.base is not None else [0] + [addr for addr in addrs if addr != 0]
+            for addr in targets:
+                devices[addr] = dev = devdata(addr)
+                dev[MEASURE] = self.reconciler.desired(addr, MEASURE)
+                dev[TRANSMIT] = self.reconciler.desired(addr, TRANSMIT)
+            # nodes missing in a broadcast round are polled in parallel, as many
+            # at a time as the request window of the HKV takes
+            turns = asyncio.Semaphore(self.max_inflight)
+            found = await asyncio.gather(*[
+                self._query_device(addr, devices[addr], deadline, turns,
+                                   status.get(addr), temps.get(addr), relais.get(addr))
+                for addr in targets
+            ])
+            if 0 in devices:
+                dev = devices.pop(0)
+                if found[0] != 0:
+                    topo.base = found[0]
+                    dev.addr = found[0]
+                    devices[found[0]] = dev
 
         except Exception as e:
             _LOGGER.critical(e, exc_info=True)
 
-        self.hkv._block_handlers = False
-
-        # Set intervals less frequently
-        await self.hkv.set_temps_measure_period(delay=1000, period=30000, dst=-1, timeout=10)
-        await self.hkv.set_temps_transmit_period(delay=2000, period=30000, dst=-1, timeout=10)
-
-        return {"devices": devices}
-
-    async def _query_device(self, addr, dev):
-        # tasks = [
-        #     self.hkv.get_status(dst=addr, timeout=5),
-        #     self.hkv.get_temps(dst=addr, timeout=5),
-        #     self.hkv.get_relais(dst=addr, timeout=5)
-        # ]
-        # results = await asyncio.gather(*tasks, return_exceptions=True)
-
-        # state_pck = results[0][1] if isinstance(results[0], tuple) and results[0][0] else None
-        # temps_pck = results[1][1] if isinstance(results[1], tuple) and results[1][0] else None
-        # relais_pck = results[2][1] if isinstance(results[2], tuple) and results[2][0] else None
-
-        success = False
-        while not success:
-            success, state_pck = await self.hkv.get_status(dst=addr, timeout=10)
+        self._devices = devices
+        self.sweep_time = time.monotonic() - starttime
+        stale = [addr for addr, dev in devices.items() if dev.STALE]
+        _LOGGER.info(f"fetch_data: sweep of {len(devices)} nodes took {self.sweep_time:.1f} seconds, stale: {stale}, "
+                     f"polling: {sched.stats()}")
+
+        # send only config the nodes have not acknowledged yet (new, changed, rebooted)
+        alive = [addr for addr, dev in devices.items() if not dev.STALE]
+        if not await self.reconciler.reconcile(alive, timeout=self.command_timeout):
+            _LOGGER.warning(f"fetch_data: config not acknowledged: {self.reconciler.pending(alive)}")
+
+        airtime = self.hkv.airtime_stats()
+        _LOGGER.debug(f"airtime: gateway {airtime['gateway']}, usage {airtime['usage']}, deferred {airtime['deferred']}")
+        return {"devices": devices, "sweep_time": self.sweep_time, "airtime": airtime}
+
+    async def _query(self, fn, addr, deadline):
+        """Repeat ``fn`` until it succeeds or the deadline has passed."""
+        while (remaining := deadline - time.monotonic()) > 0:
+            try:
+                # the deadline includes the wait for a free request slot (short, see _query_device)
+                async with asyncio.timeout(remaining):
+                    success, pck = await fn(dst=addr, timeout=min(self.command_timeout, remaining))
+            except HKVAirtimeDeferred as e:
+                # no retry: the budget is not free before the deadline either
+                _LOGGER.info(f"{fn.__name__}(dst={addr}) not sent: {e}")
+                return None
+            except TimeoutError:
+                break
+            if success:
+                self._seen(pck)
+                return pck
+        _LOGGER.warning(f"{fn.__name__}(dst={addr}) missed its deadline")
+        return None
+
+    async def _broadcast(self, fn, nodes):
+        """Broadcast ``fn`` and return the answers of the nodes as ``{addr: packet}``."""
+        if not self.broadcast_window or nodes == []:
+            return {}
+        try:
+            success, results = await fn(dst=-1, timeout=self.broadcast_window, collect=True, nodes=nodes)
+        except HKVAirtimeDeferred as e:
+            _LOGGER.info(f"{fn.__name__}(dst=-1) not sent: {e}")
+            return {}
+        results = {src: pck for src, pck in results.items() if not isinstance(pck, HKVNAckPacket)}
+        for pck in results.values():
+            self._seen(pck)
+        return results
+
+    def _with_fresh(self, kind, addrs, results):
+        """``results`` completed by the still fresh ``kind`` packets of ``addrs``."""
+        for addr in addrs:
+            if addr not in results and (pck := self.scheduler.fresh(addr, kind)) is not None:
+                results[addr] = pck
+        return results
+
+    async def _query_missing(self, pck, fn, addr, deadline):
+        """``pck`` if already known, else query it."""
+        return pck if pck is not None else await self._query(fn, addr, deadline)
+
+    async def _query_device(self, addr, dev, deadline, turns, state_pck=None, temps_pck=None, relais_pck=None):
+        """Query status, temps and relais of one node. Returns the node address.
+
+        Packets already received (broadcast) are not requested again. The
+        node budget starts with the turn of the node (``turns``), so nodes
+        queued behind others are not marked stale without being asked.
+        ``deadline`` is the one of the sweep.
+        """
+        if not (state_pck and temps_pck and relais_pck):
+            async with turns:
+                deadline = min(deadline, time.monotonic() + self.node_budget)
+                state_pck = await self._query_missing(state_pck, self.hkv.get_status, addr, deadline)
+                if state_pck:
+                    temps_pck, relais_pck = await asyncio.gather(
+                        self._query_missing(temps_pck, self.hkv.get_temps, addr, deadline),
+                        self._query_missing(relais_pck, self.hkv.get_relais, addr, deadline),
+                    )
+                # else: node does not answer, do not waste the budget of the others on it
+        dev.STALE = not (state_pck and temps_pck and relais_pck)
 
         if state_pck:
-            dev['ID'] = state_pck.ID
-            dev['MSEC'] = state_pck.MSEC
-            dev['SNUM'] = state_pck.SNUM
-            dev['MCNT'] = state_pck.MCNT
-            dev['RNUM'] = state_pck.RNUM
-            dev['CCNT'] = state_pck.CCNT
-
-        success = False
-        while not success:
-            success, temps_pck = await self.hkv.get_temps(dst=addr, timeout=10)
-
-        if temps_pck:
-            dev['SNUM'] = temps_pck.SNUM
-            dev['MCNT'] = temps_pck.MCNT
-            dev['TDATA'] = temps_pck.TDATA
-            for ii in range(dev['SNUM']):
-                tempi = f"Temp{ii+1}"
-                temp = dev['TDATA'][ii]
-                dev[tempi] = temp if temp else None
-
-        success = False
-        while not success:
-            success, relais_pck = await self.hkv.get_relais(dst=addr, timeout=10)
-
-        if relais_pck:
-            dev['RNUM'] = relais_pck.RNUM
-            dev['RDATA'] = relais_pck.RDATA
-            for ii in range(dev['RNUM']):
-                reli = f"Relais{ii+1}"
-                rel = dev['RDATA'][ii]
-                dev[reli] = rel if rel is not None else None
+            addr = state_pck.SRC
+        for pck in (state_pck, temps_pck, relais_pck):
+            if pck:
+                dev.apply_packet(pck)
+        return addr
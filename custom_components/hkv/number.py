@@ -15,11 +15,10 @@ from homeassistant.core import HomeAssistant, callback
 from homeassistant.helpers import entity
 from homeassistant.helpers.entity import EntityCategory
 from homeassistant.helpers.entity_platform import AddEntitiesCallback
-from homeassistant.helpers.update_coordinator import CoordinatorEntity
 
 from .base import HKVBaseEntityDescription
 from .const import DOMAIN
-from .coordinator import HKVCoordinator
+from .coordinator import HKVCoordinator, HKVKeyEntity
 
 _LOGGER = logging.getLogger(__name__)
 
@@ -31,9 +30,10 @@ async def async_setup_entry(
     """Set up victron switch devices."""
     _LOGGER.debug("attempting to setup number entities")
     coordinator: HKVCoordinator = hass.data[DOMAIN][config_entry.entry_id]
-    descriptions = []
-    devices = coordinator.get_data()["devices"]
-    for dev_addr, dev_data in devices.items():
+
+    @callback
+    def node_entities(dev_addr, dev_data):
+        descriptions = []
         descriptions.append(HKVEntityDescription(
             key='temp_measure_interval',
             name='Temp. Mess-Interval',
@@ -54,18 +54,16 @@ async def async_setup_entry(
             native_step=1000,
             entity_category=EntityCategory.CONFIG,
         ))
+        return [HKVNumber(coordinator, description) for description in descriptions]
 
-    entities = []
-    for description in descriptions:
-        entities.append(HKVNumber(coordinator, description))
     _LOGGER.debug("adding number entities")
-    async_add_entities(entities)
+    coordinator.async_add_node_entities(config_entry, async_add_entities, node_entities)
 
 @dataclass
 class HKVEntityDescription(NumberEntityDescription, HKVBaseEntityDescription):
     """Describes HKV number entity."""
 
-class HKVNumber(CoordinatorEntity, NumberEntity):
+class HKVNumber(HKVKeyEntity, NumberEntity):
     """HKV number."""
 
     description: HKVEntityDescription
@@ -90,24 +88,14 @@ class HKVNumber(CoordinatorEntity, NumberEntity):
         self._attr_mode = NumberMode.BOX  # SLIDER
 
     async def async_set_native_value(self, value: float) -> None:
-        """Update the current value."""
-        success = False
-        retry = 3
-        while retry > 0:
-            try:
-                if self.description.key == 'temp_measure_interval':
-                    res = await self.coordinator.hkv.set_temps_measure_period(delay=1000, period=int(value), dst=self.description.slave)
-                elif self.description.key == 'temp_transmit_interval':
-                    res = await self.coordinator.hkv.set_temps_transmit_period(delay=1000, period=int(value), dst=self.description.slave)
-                success = res[0] if res else False  # Assuming res is (success, packet)
-                if success:
-                    break
-            except Exception as e:
-                _LOGGER.error(f"Set value error: {e}")
-            retry -= 1
-            await asyncio.sleep(2 ** (3 - retry))  # Exponential backoff
-        if success:
-            await self.coordinator.async_update_local_entry(dev_addr=self.description.slave, key=self.description.key, value=value)
+        """Update the desired value, the reconciler sends it until the node acknowledges it."""
+        reconciler = self.coordinator.api.reconciler
+        reconciler.set_desired(self.description.slave, self.description.key, int(value))
+        try:
+            await reconciler.reconcile([self.description.slave])
+        except Exception as e:
+            _LOGGER.error(f"Set value error: {e}")
+        await self.coordinator.async_update_local_entry(dev_addr=self.description.slave, key=self.description.key, value=int(value))
 
     @property
     def native_value(self) -> int:
@@ -136,11 +124,6 @@ class HKVNumber(CoordinatorEntity, NumberEntity):
             _LOGGER.info(self.coordinator.get_data())
             return False
 
-    @callback
-    def _handle_coordinator_update(self) -> None:
-        """Handle updated data from the coordinator."""
-        self.async_write_ha_state()
-
     @property
     def device_info(self) -> entity.DeviceInfo:
         """Return the device info."""
@@ -1,6 +1,6 @@
 """Support for Victron energy sensors."""
 
-from dataclasses import dataclass
+from dataclasses import dataclass, replace
 import logging
 
 from homeassistant.components.sensor import (
@@ -14,11 +14,11 @@ from homeassistant.config_entries import ConfigEntry
 from homeassistant.core import HomeAssistant, callback
 from homeassistant.helpers import entity
 from homeassistant.helpers.entity_platform import AddEntitiesCallback
-from homeassistant.helpers.update_coordinator import CoordinatorEntity
 
 from .base import HKVBaseEntityDescription
-from .const import DOMAIN, ReadEntityType, TextReadEntityType
-from .coordinator import HKVCoordinator
+from .const import DOMAIN, ReadEntityType, TextReadEntityType, CONF_TEMP_DEADBAND, CONF_MAX_AGE, \
+    DEFAULT_TEMP_DEADBAND, DEFAULT_MAX_AGE
+from .coordinator import HKVCoordinator, HKVKeyEntity
 
 _LOGGER = logging.getLogger(__name__)
 
@@ -26,9 +26,13 @@ async def async_setup_entry(hass: HomeAssistant, config_entry: ConfigEntry, asyn
     """Set up HKV energy sensor entries."""
     _LOGGER.debug("attempting to setup sensor entities")
     coordinator: HKVCoordinator = hass.data[DOMAIN][config_entry.entry_id]
-    descriptions = []
-    devices = coordinator.get_data()["devices"]
-    for dev_addr, dev_data in devices.items():
+    deadband = config_entry.options.get(CONF_TEMP_DEADBAND, DEFAULT_TEMP_DEADBAND)
+    max_age = config_entry.options.get(CONF_MAX_AGE, DEFAULT_MAX_AGE)
+    sensors: list[HKVSensor] = []
+
+    @callback
+    def node_entities(dev_addr, dev_data):
+        descriptions = []
         for name, val in dev_data.items():
             _LOGGER.debug(f"{name=}")
             _LOGGER.debug(f"{val=}")
@@ -43,7 +47,8 @@ async def async_setup_entry(hass: HomeAssistant, config_entry: ConfigEntry, asyn
                         slave=dev_addr,
                         device_class=SensorDeviceClass.TEMPERATURE,
                         entity_type=None,
-                        value_fn=lambda data, slave, key: data['devices'][slave][key.split('_')[0]][int(key.split('_')[1])],
+                        deadband=deadband or None,
+                        max_age=max_age or None,
                     ))
             elif name in ['MCNT', 'SNUM', 'RNUM', 'CCNT']:
                 descriptions.append(HKVEntityDescription(
@@ -54,20 +59,36 @@ async def async_setup_entry(hass: HomeAssistant, config_entry: ConfigEntry, asyn
                     slave=dev_addr,
                     device_class=None,
                     entity_type=None,
+                    max_age=max_age or None,
                 ))
-
-    entities = []
-    for description in descriptions:
-        entities.append(HKVSensor(coordinator, description))
-
-    async_add_entities(entities, True)
+        entities = [HKVSensor(coordinator, description) for description in descriptions]
+        sensors.extend(entities)
+        return entities
+
+    async def options_updated(hass: HomeAssistant, entry: ConfigEntry) -> None:
+        """Apply a changed deadband/max_age to the existing sensors."""
+        nonlocal deadband, max_age
+        deadband = entry.options.get(CONF_TEMP_DEADBAND, DEFAULT_TEMP_DEADBAND)
+        max_age = entry.options.get(CONF_MAX_AGE, DEFAULT_MAX_AGE)
+        for sensor in sensors:
+            description = sensor.description
+            sensor.description = replace(
+                description,
+                deadband=(deadband or None) if description.device_class == SensorDeviceClass.TEMPERATURE else None,
+                max_age=max_age or None,
+            )
+
+    config_entry.async_on_unload(config_entry.add_update_listener(options_updated))
+
+    # new nodes and channels are added while running, see HKVCoordinator.async_add_node_entities
+    coordinator.async_add_node_entities(config_entry, async_add_entities, node_entities)
 
 @dataclass
 class HKVEntityDescription(SensorEntityDescription, HKVBaseEntityDescription):
     """Describes victron sensor entity."""
     entity_type: ReadEntityType = None
 
-class HKVSensor(CoordinatorEntity, SensorEntity):
+class HKVSensor(HKVKeyEntity, SensorEntity):
     """Representation of a Victron energy sensor."""
 
     def __init__(self, coordinator: HKVCoordinator, description: HKVEntityDescription) -> None:
@@ -86,10 +107,10 @@ class HKVSensor(CoordinatorEntity, SensorEntity):
         self.entity_id = f"{SENSOR_DOMAIN}.{DOMAIN}_{actual_id}_{self.description.key}"
 
     @callback
-    def _handle_coordinator_update(self) -> None:
-        """Handle updated data from the coordinator."""
+    def _handle_key_update(self) -> None:
+        """Handle a changed value of this entity."""
         try:
-            value = self.description.value_fn(self.coordinator.get_data(), self.description.slave, self.description.key)
+            value = self.hkv_value
             _LOGGER.debug(f"update: {self.description.slave=}, {self.description.key=}, {value=}")
             if self.entity_type is not None and isinstance(self.entity_type, TextReadEntityType):
                 self._attr_native_value = self.entity_type.decodeEnum(value).name.split("_DUPLICATE")[0]
@@ -98,12 +119,15 @@ class HKVSensor(CoordinatorEntity, SensorEntity):
         except (TypeError, IndexError):
             _LOGGER.error("failed to retrieve value")
             self._attr_native_value = None
-        self.async_write_ha_state()
+        self._async_write_if_changed()
+
+    def _state_value(self):
+        return self._attr_native_value
 
     @property
     def available(self) -> bool:
         try:
-            return bool(self.description.value_fn(self.coordinator.get_data(), self.description.slave, self.description.key))
+            return bool(self.hkv_value)
         except Exception as e:
             _LOGGER.critical(e)
             _LOGGER.info(self.coordinator.get_data())
@@ -0,0 +1,234 @@
+'''Compact per-node device state.
+
+One ``HKVNodeState`` per node with fixed slots. Temperature and relay
+channels are typed arrays (``NaN``/``-1`` for a missing value). Entities
+read their value through an accessor that is bound to its field and
+channel once at setup, see :func:`accessor`.
+
+The mapping methods (``state['ID']``, ``get``, ``in``, ``items``) keep the
+old dict style access working.
+'''
+from array import array
+from collections.abc import Callable, Iterable
+from math import isnan
+from operator import attrgetter
+
+NAN = float('nan')
+
+# packet fields that are not node data
+_HEADER_FIELDS = frozenset(('SRC', 'DST', 'TYPE', 'DTYPE'))
+
+
+def _temps(values) -> array:
+    return array('d', [NAN if v is None else v for v in values])
+
+
+def _relais(values) -> array:
+    return array('b', [-1 if v is None else int(v) for v in values])
+
+
+def _temp(value):
+    return None if isnan(value) else value
+
+
+def _rel(value):
+    return None if value < 0 else value
+
+
+# array fields: (converter from a list, converter of one element for the entities)
+_ARRAYS = {
+    'TDATA': (_temps, _temp),
+    'RDATA': (_relais, _rel),
+}
+
+
+class HKVNodeState:
+    """State of one node."""
+
+    __slots__ = (
+        'addr', 'ID', 'MSEC', 'SNUM', 'MCNT', 'RNUM', 'CCNT',
+        'TDATA', 'RDATA', 'CDATA',
+        'temp_measure_interval', 'temp_transmit_interval',
+        'STALE', 'EXTRA_DATA',
+    )
+    _FIELDS = frozenset(__slots__) - {'addr', 'EXTRA_DATA'}
+
+    def __init__(self, addr: int | None = None):
+        self.addr = addr
+        self.ID = 'UNKNOWN'
+        self.MSEC = None
+        self.SNUM = 0
+        self.MCNT = 0
+        self.RNUM = 0
+        self.CCNT = 0
+        self.TDATA = array('d')
+        self.RDATA = array('b')
+        self.CDATA = None
+        self.temp_measure_interval = None
+        self.temp_transmit_interval = None
+        self.STALE = True
+        self.EXTRA_DATA = None
+
+    def __repr__(self):
+        return f"HKVNodeState({self.addr}, {dict(self.items())})"
+
+    def as_dict(self) -> dict:
+        """JSON compatible values (snapshot)."""
+        return {
+            name: [_ARRAYS[name][1](v) for v in value] if name in _ARRAYS else value
+            for name, value in self.items()
+        }
+
+    @classmethod
+    def from_dict(cls, addr: int, data: dict) -> "HKVNodeState":
+        state = cls(addr)
+        state.merge(data.items())
+        return state
+
+    def shape(self) -> tuple[int, int, int]:
+        """Channel and extra field counts, the entities a node needs depend on it."""
+        return len(self.TDATA), len(self.RDATA), len(self.EXTRA_DATA or ())
+
+    def copy(self) -> "HKVNodeState":
+        state = HKVNodeState.__new__(HKVNodeState)
+        for name in self.__slots__:
+            value = getattr(self, name)
+            setattr(state, name, value[:] if isinstance(value, array) else value)
+        if self.EXTRA_DATA is not None:
+            state.EXTRA_DATA = dict(self.EXTRA_DATA)
+        return state
+
+    # -----------------------------------------------------------------
+    #  updates, all return the changed entity keys (``TDATA_3`` for channel 3)
+    # -----------------------------------------------------------------
+    def set(self, name: str, value) -> list[str]:
+        if name in _ARRAYS:
+            return self._set_array(name, value)
+        if name in self._FIELDS:
+            if getattr(self, name) == value:
+                return []
+            setattr(self, name, value)
+            return [name]
+        extra = self.EXTRA_DATA
+        if extra is None:
+            extra = self.EXTRA_DATA = {}
+        old = extra.get(name)
+        if old == value:
+            return []
+        extra[name] = value
+        changed = [name]
+        if isinstance(value, dict):
+            old = old if isinstance(old, dict) else {}
+            changed += [f"{name}_{k}" for k in value.keys() | old.keys() if old.get(k) != value.get(k)]
+        return changed
+
+    def _set_array(self, name: str, values) -> list[str]:
+        old = getattr(self, name)
+        new = values if isinstance(values, array) else _ARRAYS[name][0](values)
+        if old.tobytes() == new.tobytes():
+            return []
+        setattr(self, name, new)
+        changed = [name]
+        for i in range(max(len(old), len(new))):
+            if i >= len(old) or i >= len(new) or old[i] != new[i] and not (old[i] != old[i] and new[i] != new[i]):
+                changed.append(f"{name}_{i}")
+        return changed
+
+    def set_key(self, key: str, value) -> list[str]:
+        """Set an entity key, ``RDATA_0`` sets channel 0 of ``RDATA``."""
+        name, _, index = key.rpartition('_')
+        if name in _ARRAYS and index.isdigit():
+            convert = _ARRAYS[name][0]
+            values = getattr(self, name)[:]
+            index = int(index)
+            if index >= len(values):
+                values.extend(convert([None] * (index + 1 - len(values))))
+            values[index] = convert([value])[0]
+            return self._set_array(name, values)
+        return self.set(key, value)
+
+    def merge(self, pairs: Iterable[tuple[str, object]]) -> list[str]:
+        changed = []
+        for name, value in pairs:
+            changed += self.set(name, value)
+        return changed
+
+    def apply_packet(self, packet) -> list[str]:
+        """Merge the data fields of a received packet."""
+        changed = self.merge(
+            (name, getattr(packet, name)) for name in packet._FIELDS if name not in _HEADER_FIELDS
+        )
+        if packet.EXTRA_DATA:
+            changed += self.merge(packet.EXTRA_DATA.items())
+        return changed
+
+    def merge_state(self, other: "HKVNodeState", fields: Iterable[str] | None = None) -> list[str]:
+        """Take the values of ``other``, only ``fields`` if given (without the extra data then)."""
+        if fields is not None:
+            return self.merge((name, getattr(other, name)) for name in fields)
+        changed = self.merge((name, getattr(other, name)) for name in self._FIELDS)
+        if other.EXTRA_DATA:
+            changed += self.merge(other.EXTRA_DATA.items())
+        return changed
+
+    # -----------------------------------------------------------------
+    #  dict style access
+    # -----------------------------------------------------------------
+    def __getitem__(self, name):
+        if name in self._FIELDS:
+            return getattr(self, name)
+        if self.EXTRA_DATA is not None and name in self.EXTRA_DATA:
+            return self.EXTRA_DATA[name]
+        raise KeyError(name)
+
+    def __setitem__(self, name, value):
+        self.set(name, value)
+
+    def __contains__(self, name):
+        if name in _ARRAYS:
+            # like a dict of the received fields: no channels, no key
+            return len(getattr(self, name)) > 0
+        if name in self._FIELDS:
+            return getattr(self, name) is not None
+        return self.EXTRA_DATA is not None and name in self.EXTRA_DATA
+
+    def get(self, name, default=None):
+        try:
+            value = self[name]
+        except KeyError:
+            return default
+        return default if value is None else value
+
+    def keys(self):
+        return [name for name, _ in self.items()]
+
+    def items(self):
+        items = [(name, value) for name in self.__slots__[1:-1]
+                 if (value := getattr(self, name)) is not None and (name not in _ARRAYS or len(value))]
+        if self.EXTRA_DATA:
+            items += self.EXTRA_DATA.items()
+        return items
+
+
+def accessor(key: str) -> Callable[[HKVNodeState], object]:
+    """Getter of entity ``key`` (``ID``, ``TDATA_3``, ``DISPLAY_USED``), bound once."""
+    if key in HKVNodeState._FIELDS:
+        return attrgetter(key)
+    name, _, index = key.rpartition('_')
+    if name in _ARRAYS and index.isdigit():
+        get = attrgetter(name)
+        convert = _ARRAYS[name][1]
+        i = int(index)
+
+        def channel(state):
+            values = get(state)
+            return convert(values[i]) if i < len(values) else None
+        return channel
+
+    def extra(state):
+        value = state.get(key)
+        if value is None and name:
+            # nested value of a dict field, e.g. DISPLAY_USED
+            value = (state.get(name) or {}).get(index)
+        return value
+    return extra
@@ -14,11 +14,10 @@ from homeassistant.config_entries import ConfigEntry
 from homeassistant.core import HomeAssistant, callback
 from homeassistant.helpers import entity
 from homeassistant.helpers.entity_platform import AddEntitiesCallback
-from homeassistant.helpers.update_coordinator import CoordinatorEntity
 
 from .base import HKVWriteBaseEntityDescription
 from .const import DOMAIN
-from .coordinator import HKVCoordinator
+from .coordinator import HKVCoordinator, HKVKeyEntity
 
 _LOGGER = logging.getLogger(__name__)
 
@@ -26,9 +25,10 @@ async def async_setup_entry(hass: HomeAssistant, config_entry: ConfigEntry, asyn
     """Set up HKV switch devices."""
     _LOGGER.debug("attempting to setup switch entities")
     coordinator: HKVCoordinator = hass.data[DOMAIN][config_entry.entry_id]
-    descriptions = []
-    devices = coordinator.get_data()["devices"]
-    for dev_addr, dev_data in devices.items():
+
+    @callback
+    def node_entities(dev_addr, dev_data):
+        descriptions = []
         for name, val in dev_data.items():
             _LOGGER.debug(f"{name=}")
             _LOGGER.debug(f"{val=}")
@@ -40,21 +40,17 @@ async def async_setup_entry(hass: HomeAssistant, config_entry: ConfigEntry, asyn
                         name=f"Relais {i+1}",
                         slave=dev_addr,
                         keynum=i + 1,
-                        value_fn=lambda data, slave, key: data['devices'][slave][key.split('_')[0]][int(key.split('_')[1])],
                     ))
+        return [HKVSwitch(hass, coordinator, description) for description in descriptions]
 
-    entities = []
-    for description in descriptions:
-        entities.append(HKVSwitch(hass, coordinator, description))
     _LOGGER.debug("adding switches")
-    _LOGGER.debug(entities)
-    async_add_entities(entities)
+    coordinator.async_add_node_entities(config_entry, async_add_entities, node_entities)
 
 @dataclass
 class HKVEntityDescription(SwitchEntityDescription, HKVWriteBaseEntityDescription):
     """Describes HKV switch entity."""
 
-class HKVSwitch(CoordinatorEntity, SwitchEntity):
+class HKVSwitch(HKVKeyEntity, SwitchEntity):
     """Representation of an HKV switch."""
 
     def __init__(self, hass: HomeAssistant, coordinator: HKVCoordinator, description: HKVEntityDescription) -> None:
@@ -96,13 +92,7 @@ class HKVSwitch(CoordinatorEntity, SwitchEntity):
 
     @property
     def is_on(self) -> bool:
-        data = self.description.value_fn(self.coordinator.get_data(), self.description.slave, self.description.key)
-        return bool(data)
-
-    @callback
-    def _handle_coordinator_update(self) -> None:
-        """Handle updated data from the coordinator."""
-        self.async_write_ha_state()
+        return bool(self.hkv_value)
 
     @property
     def available(self) -> bool:
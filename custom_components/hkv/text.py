@@ -9,11 +9,10 @@ from homeassistant.components.text import TextEntity, TextEntityDescription, DOM
 from homeassistant.config_entries import ConfigEntry
 from homeassistant.core import HomeAssistant, callback
 from homeassistant.helpers.entity_platform import AddEntitiesCallback
-from homeassistant.helpers.update_coordinator import CoordinatorEntity
 from homeassistant.helpers import entity
 from homeassistant.helpers.entity import EntityCategory
 
-from .coordinator import HKVCoordinator
+from .coordinator import HKVCoordinator, HKVKeyEntity
 from .const import DOMAIN
 from .base import HKVBaseEntityDescription
 
@@ -28,9 +27,10 @@ async def async_setup_entry(hass: HomeAssistant, config_entry: ConfigEntry, asyn
     """Set up HKV text devices."""
     _LOGGER.debug("attempting to setup text entities")
     coordinator: HKVCoordinator = hass.data[DOMAIN][config_entry.entry_id]
-    descriptions = []
-    devices = coordinator.get_data()["devices"]
-    for dev_addr, dev_data in devices.items():
+
+    @callback
+    def node_entities(dev_addr, dev_data):
+        descriptions = []
         for name, val in dev_data.items():
             _LOGGER.debug(f"{name=}")
             _LOGGER.debug(f"{val=}")
@@ -43,18 +43,16 @@ async def async_setup_entry(hass: HomeAssistant, config_entry: ConfigEntry, asyn
                     mode=TextMode.TEXT,
                     entity_category=EntityCategory.DIAGNOSTIC,
                 ))
+        return [HKVText(hass, coordinator, description) for description in descriptions]
 
-    entities = []
-    for description in descriptions:
-        entities.append(HKVText(hass, coordinator, description))
     _LOGGER.debug("adding text entities")
-    async_add_entities(entities)
+    coordinator.async_add_node_entities(config_entry, async_add_entities, node_entities)
 
 @dataclass
 class HKVEntityDescription(TextEntityDescription, HKVBaseEntityDescription):
     """Describes HKV text entity."""
 
-class HKVText(CoordinatorEntity, TextEntity):
+class HKVText(HKVKeyEntity, TextEntity):
     """Representation of an HKV text."""
 
     def __init__(self, hass: HomeAssistant, coordinator: HKVCoordinator, description: HKVEntityDescription) -> None:
@@ -84,11 +82,6 @@ class HKVText(CoordinatorEntity, TextEntity):
             _LOGGER.info(self.coordinator.get_data())
             return False
 
-    @callback
-    def _handle_coordinator_update(self) -> None:
-        """Handle updated data from the coordinator."""
-        self.async_write_ha_state()
-
     @property
     def device_info(self) -> entity.DeviceInfo:
         """Return the device info."""